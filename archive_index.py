@@ -0,0 +1,118 @@
+import shlex
+
+# Строка, после которой в выводе 7z l -slt начинается список элементов архива
+_ENTRIES_START = '----------'
+
+
+class Entry:
+    """
+    Элемент архива из листинга 7z l -slt.
+    """
+
+    __slots__ = ('path', 'size', 'packed_size', 'crc', 'attributes', 'mtime', 'is_dir')
+
+    def __init__(self, path, size, packed_size, crc, attributes, mtime, is_dir):
+        self.path = path
+        self.size = size
+        self.packed_size = packed_size
+        self.crc = crc
+        self.attributes = attributes
+        self.mtime = mtime
+        self.is_dir = is_dir
+
+    def __repr__(self):
+        return 'Entry({!r}, size={}, crc={})'.format(self.path, self.size, self.crc)
+
+
+def _int(value):
+    return int(value) if value else None
+
+
+def _entry(fields):
+    attributes = fields.get('Attributes', '')
+    return Entry(fields['Path'], _int(fields.get('Size')), _int(fields.get('Packed Size')),
+                 fields.get('CRC') or None, attributes, fields.get('Modified') or None,
+                 fields.get('Folder') == '+' or attributes.startswith('D'))
+
+
+class ArchiveIndex:
+    """
+    Индекс элементов архива по пути для проверок наличия, размера и CRC.
+
+    Строится из потока строк вывода 7z l -slt без накопления всего вывода: в памяти хранятся
+    только компактные записи Entry.
+    """
+
+    def __init__(self, entries=()):
+        self._entries = {}
+        for entry in entries:
+            self._entries[entry.path] = entry
+
+    @classmethod
+    def parse(cls, lines):
+        """
+        Строит индекс по строкам вывода 7z l -slt (список или поток строк).
+        """
+        index = cls()
+        started = False
+        fields = {}
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not started:
+                started = line == _ENTRIES_START
+                continue
+            if not line:
+                if 'Path' in fields:
+                    index.add(_entry(fields))
+                fields = {}
+                continue
+            key, sep, value = line.partition(' = ')
+            if sep:
+                fields[key] = value
+            elif line.endswith(' ='):
+                fields[line[:-2]] = ''
+        if 'Path' in fields:
+            index.add(_entry(fields))
+        return index
+
+    def add(self, entry):
+        self._entries[entry.path] = entry
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def get(self, path):
+        """
+        Возвращает элемент по пути внутри архива или None.
+        """
+        return self._entries.get(path)
+
+    def files(self):
+        """
+        Возвращает пути файлов архива (без каталогов).
+        """
+        return [entry.path for entry in self._entries.values() if not entry.is_dir]
+
+
+def load_index(executor, archive):
+    """
+    Получает листинг архива на проверяемой машине одним запуском 7z l -slt и строит индекс по мере чтения вывода.
+
+    Параметры:
+    executor (Executor): Исполнитель команд на проверяемой машине.
+    archive (str): Путь к архиву.
+
+    Возвращает:
+    ArchiveIndex: Индекс элементов архива.
+    """
+    stream = executor.stream('7z l -slt {}'.format(shlex.quote(archive)))
+    index = ArchiveIndex.parse(stream)
+    if stream.exit_code != 0:
+        raise RuntimeError('7z l завершилась с кодом {}: {}'.format(stream.exit_code, archive))
+    return index
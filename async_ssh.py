@@ -0,0 +1,296 @@
+import asyncio
+import codecs
+import contextlib
+import functools
+import time
+import weakref
+
+import deadline
+import ssh_utils
+import timing
+from deadline import CommandTimeout
+from ssh_utils import PGID_MARKER, _OutputSearch, _kill_group, _killable, _matches, pool
+
+# Асинхронные варианты функций ssh_utils: много команд выполняются одновременно в одном цикле событий
+# поверх общих транспортов пула. Каналы читаются без потоков (loop.add_reader на fileno() канала),
+# в пуле потоков выполняются только блокирующие шаги paramiko: подключение, открытие канала и SFTP.
+
+# Одновременно открытых каналов на один транспорт: OpenSSH по умолчанию разрешает не больше 10 сессий
+# на соединение (MaxSessions), часть из них занимают агент файловых операций и сборщик загрузки
+MAX_CHANNELS = 8
+
+# Цикл событий -> (host, port, user) -> asyncio.Semaphore
+_semaphores = weakref.WeakKeyDictionary()
+
+# Цикл событий -> (host, port, user) -> asyncio.Lock: очередь на захват нескольких слотов семафора сразу
+_gates = weakref.WeakKeyDictionary()
+
+
+def _limit(host, port, user):
+    """
+    Возвращает семафор, ограничивающий число одновременных каналов к хосту в текущем цикле событий.
+    """
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    key = (host, port, user)
+    if key not in per_loop:
+        per_loop[key] = asyncio.Semaphore(MAX_CHANNELS)
+    return per_loop[key]
+
+
+@contextlib.asynccontextmanager
+async def _slots(host, port, user, count):
+    """
+    Занимает count слотов семафора хоста (по одному на каждый канал операции).
+
+    Несколько слотов захватываются по очереди под общей блокировкой: две операции, набравшие
+    по части слотов, не ждут друг друга бесконечно.
+    """
+    semaphore = _limit(host, port, user)
+    gate = _gates.setdefault(asyncio.get_running_loop(), {}).setdefault((host, port, user), asyncio.Lock())
+    taken = 0
+    try:
+        async with gate:
+            for _ in range(count):
+                await semaphore.acquire()
+                taken += 1
+        yield
+    finally:
+        for _ in range(taken):
+            semaphore.release()
+
+
+def _transfer_slots(workers):
+    """
+    Возвращает число потоков передачи и занимаемых ими слотов: каждый поток держит канал SFTP
+    и на время сверки SHA-256 дозагружаемого файла - еще один канал команды.
+    """
+    workers = max(1, min(workers, MAX_CHANNELS // 2))
+    return workers, 2 * workers
+
+
+async def _blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+def _open(transport, cmd):
+    channel = pool.open_session(transport, pool.auth_timeout)
+    channel.exec_command(cmd)
+    return channel
+
+
+class _Output:
+    """
+    Приемник вывода канала: декодирует порции stdout и stderr (инкрементально, как SSHStream) и передает
+    их в sink(stream, text). У команды с ограничением времени первая строка stderr - номер ее группы процессов
+    (см. ssh_utils._killable): она отделяется от вывода и сохраняется в pgid.
+    """
+
+    def __init__(self, sink, killable):
+        self.sink = sink
+        self.pgid = None
+        self._pgid_pending = killable
+        self._head = ''
+        self._decoders = {'out': codecs.getincrementaldecoder('utf-8')(),
+                          'err': codecs.getincrementaldecoder('utf-8')()}
+
+    def _strip_pgid(self, text):
+        self._head += text
+        if '\n' not in self._head:
+            return ''
+        line, _, rest = self._head.partition('\n')
+        self._pgid_pending = False
+        self._head = ''
+        if line.startswith(PGID_MARKER):
+            self.pgid = int(line[len(PGID_MARKER):])
+            return rest
+        return line + '\n' + rest
+
+    def feed(self, name, data, final=False):
+        text = self._decoders[name].decode(data, final=final)
+        if name == 'err' and self._pgid_pending:
+            text = self._strip_pgid(text)
+            if final and self._pgid_pending:
+                # Вывод закончился до перевода строки: остаток - обычный stderr
+                text, self._head, self._pgid_pending = self._head, '', False
+        if text:
+            self.sink(name, text)
+
+
+async def _read(channel, output, label, stall_timeout=None, chunk_size=32768):
+    """
+    Читает stdout и stderr канала в output до конца вывода, ожидая данные через цикл событий.
+    Если вывода нет дольше stall_timeout секунд, выбрасывается CommandTimeout (reason='stall').
+    """
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    # fileno() канала - канал уведомлений paramiko: готов к чтению, пока есть данные stdout/stderr или канал закрыт
+    fd = channel.fileno()
+    loop.add_reader(fd, ready.set)
+    readers = {'out': (channel.recv_ready, channel.recv), 'err': (channel.recv_stderr_ready, channel.recv_stderr)}
+    done = {'out': False, 'err': False}
+    try:
+        while not all(done.values()):
+            progressed = False
+            for name, (is_ready, recv) in readers.items():
+                # После EOF или закрытия канала recv не блокируется и возвращает остаток буфера, затем b''
+                if done[name] or not (is_ready() or channel.eof_received or channel.closed):
+                    continue
+                data = recv(chunk_size)
+                if data:
+                    output.feed(name, data)
+                else:
+                    output.feed(name, b'', final=True)
+                    done[name] = True
+                progressed = True
+            if not progressed:
+                ready.clear()
+                try:
+                    await asyncio.wait_for(ready.wait(), stall_timeout)
+                except asyncio.TimeoutError:
+                    raise CommandTimeout(label, stall_timeout, 'stall')
+    finally:
+        loop.remove_reader(fd)
+
+
+async def _execute(host, user, passwd, cmd, port, use_key, timeout, stall_timeout, label, sink):
+    """
+    Выполняет команду, передавая ее вывод порциями в sink(stream, text) (см. ssh_run).
+
+    Возвращает:
+    Код возврата (None, если канал закрыт без него).
+    """
+    label = label or cmd
+    timeout = deadline.remaining(timeout)
+    if timeout is not None and timeout <= 0:
+        raise CommandTimeout(label, 0.0)
+    killable = timeout is not None or stall_timeout is not None
+    template = timing.command_template(label)
+    output = _Output(sink, killable)
+    async with _limit(host, port, user):
+        transport = await _blocking(pool.get, host, user, passwd, port, use_key)
+        start = time.monotonic()
+        channel = await _blocking(_open, transport, _killable(cmd) if killable else cmd)
+        timing.recorder.record('exec', time.monotonic() - start, template)
+        try:
+            await asyncio.wait_for(_read(channel, output, label, stall_timeout), timeout)
+            if not channel.exit_status_ready():
+                # Код возврата приходит вслед за концом вывода
+                await _blocking(channel.status_event.wait, 5)
+        except (asyncio.TimeoutError, CommandTimeout) as e:
+            if output.pgid is not None:
+                await _blocking(_kill_group, transport, output.pgid)
+            if isinstance(e, CommandTimeout):
+                raise
+            raise CommandTimeout(label, timeout)
+        finally:
+            channel.close()
+        timing.recorder.record('read', time.monotonic() - start, template)
+    return channel.exit_status if channel.exit_status_ready() else None
+
+
+async def ssh_run(host, user, passwd, cmd, port=22, use_key=False, timeout=None, label=None, stall_timeout=None):
+    """
+    Асинхронно выполняет команду на удаленной машине.
+
+    Параметры:
+    host (str): Адрес хоста для подключения по SSH.
+    user (str): Имя пользователя для подключения.
+    passwd (str): Пароль для подключения.
+    cmd (str): Команда для выполнения на удаленной машине.
+    port (int): Порт для подключения по SSH. По умолчанию 22.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+    timeout (float): Допустимое время выполнения в секундах (урезается до срока теста). По умолчанию без ограничения.
+    label (str): Команда, по которой группируются замеры времени. По умолчанию cmd.
+    stall_timeout (float): Допустимое время без вывода в секундах. По умолчанию без ограничения.
+
+    Возвращает:
+    tuple: Код возврата (None, если канал закрыт без него) и полный вывод команды (stdout, затем stderr).
+    При истечении timeout или stall_timeout команда завершается вместе с дочерними процессами
+    и выбрасывается CommandTimeout.
+    """
+    parts = {'out': [], 'err': []}
+    exit_code = await _execute(host, user, passwd, cmd, port, use_key, timeout, stall_timeout, label,
+                               lambda name, text: parts[name].append(text))
+    return exit_code, ''.join(parts['out']) + ''.join(parts['err'])
+
+
+async def ssh_check(host, user, passwd, cmd, text, expect_success, port=22, use_key=False, timeout=None,
+                    stall_timeout=None, streams=('out', 'err')):
+    """
+    Асинхронно выполняет команду, ища текст в потоке вывода (как синхронная проверка: без накопления вывода,
+    в stdout и stderr отдельно), и проверяет код возврата.
+
+    Возвращает:
+    True, если текст найден в выводе из streams и код возврата соответствует expect_success, иначе False.
+    """
+    search = _OutputSearch(text, streams)
+    exit_code = await _execute(host, user, passwd, cmd, port, use_key, timeout, stall_timeout, None, search.feed)
+    return _matches(text if search.found else '', exit_code, text, expect_success)
+
+
+async def ssh_checkout(host, user, passwd, cmd, text, port=22, use_key=False, timeout=None, stall_timeout=None):
+    """
+    Асинхронный вариант ssh_utils.ssh_checkout.
+
+    Возвращает:
+    True, если текст найден в выводе команды и команда завершилась успешно (код возврата 0), иначе False.
+    """
+    return await ssh_check(host, user, passwd, cmd, text, True, port, use_key, timeout, stall_timeout)
+
+
+async def ssh_checkout_negative(host, user, passwd, cmd, text, port=22, use_key=False, timeout=None,
+                                stall_timeout=None):
+    """
+    Асинхронный вариант ssh_utils.ssh_checkout_negative.
+
+    Возвращает:
+    True, если текст найден в выводе команды и команда завершилась с ошибкой, иначе False.
+    """
+    return await ssh_check(host, user, passwd, cmd, text, False, port, use_key, timeout, stall_timeout)
+
+
+async def ssh_getout(host, user, passwd, cmd, port=22, use_key=False, timeout=None, stall_timeout=None):
+    """
+    Асинхронный вариант ssh_utils.ssh_getout.
+
+    Возвращает:
+    str: Полный вывод команды (stdout и stderr) в виде строки.
+    """
+    return (await ssh_run(host, user, passwd, cmd, port, use_key, timeout, stall_timeout=stall_timeout))[1]
+
+
+async def upload_files(host, user, passwd, local_path, remote_path, port=22, workers=4, use_key=False,
+                       stall_timeout=None):
+    """
+    Асинхронный вариант ssh_utils.upload_files: передача выполняется в пуле потоков,
+    не задерживая остальные операции цикла событий. Передача занимает по два слота семафора
+    хоста на поток (канал SFTP и канал команды sha256sum), число потоков не больше MAX_CHANNELS / 2.
+    """
+    workers, count = _transfer_slots(workers)
+    async with _slots(host, port, user, count):
+        return await _blocking(ssh_utils.upload_files, host, user, passwd, local_path, remote_path, port, workers,
+                               use_key, stall_timeout)
+
+
+async def download_files(host, user, passwd, remote_path, local_path, port=22, workers=4, use_key=False,
+                         stall_timeout=None):
+    """
+    Асинхронный вариант ssh_utils.download_files (слоты семафора занимаются так же, как в upload_files).
+    """
+    workers, count = _transfer_slots(workers)
+    async with _slots(host, port, user, count):
+        return await _blocking(ssh_utils.download_files, host, user, passwd, remote_path, local_path, port, workers,
+                               use_key, stall_timeout)
+
+
+def run_all(*aws):
+    """
+    Выполняет корутины одновременно в новом цикле событий (из синхронного кода: фикстур и тестов).
+
+    Возвращает:
+    list: Результаты в порядке аргументов.
+    """
+    async def main():
+        return await asyncio.gather(*aws)
+
+    return asyncio.run(main())
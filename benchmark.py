@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from cpu_sampler import _percentile
+
+# Версия формата файлов результатов и эталона (2: показатели 7z u считаются по объему измененных данных)
+SCHEMA_VERSION = 2
+
+# Операции 7z, для которых снимаются показатели
+OPERATIONS = ('a', 'x', 't', 'u')
+
+# Доля файлов набора, перезаписываемых перед 7z u (без изменений 7z u ничего не делает)
+UPDATE_FRACTION = 0.25
+
+
+def case_id(archive_type, size_mb, file_count, threads):
+    """
+    Возвращает идентификатор точки матрицы бенчмарка.
+    """
+    return '{}-{}mb-{}f-mmt{}'.format(archive_type, size_mb, file_count, threads)
+
+
+def operation_cmds(folder, archive_type, threads):
+    """
+    Команды 7z для каждой операции бенчмарка.
+
+    Параметры:
+    folder (str): Рабочий каталог бенчмарка на удаленной машине (в нем подкаталог src с данными).
+    archive_type (str): Тип архива (ключ -t).
+    threads (int): Количество потоков (ключ -mmt).
+
+    Возвращает:
+    dict: Операция -> команда.
+    """
+    archive = '{}/arx.{}'.format(folder, archive_type)
+    return {
+        'a': 'cd {}/src; rm -f {}; 7z a -t{} -mmt{} {} .'.format(folder, archive, archive_type, threads, archive),
+        'x': 'rm -rf {0}/ext; 7z x -mmt{1} {2} -o{0}/ext -y'.format(folder, threads, archive),
+        't': '7z t -mmt{} {}'.format(threads, archive),
+        'u': 'cd {}/src; 7z u -t{} -mmt{} {} .'.format(folder, archive_type, threads, archive),
+    }
+
+
+def update_setup(folder, file_count, file_size):
+    """
+    Команда, изменяющая данные перед 7z u: первые (по имени) UPDATE_FRACTION файлов каталога src
+    перезаписываются случайными данными того же размера и добавляется новый файл такого же размера.
+
+    Параметры:
+    folder (str): Рабочий каталог бенчмарка на удаленной машине (в нем подкаталог src с данными).
+    file_count (int): Количество файлов в наборе.
+    file_size (int): Размер файла набора в байтах.
+
+    Возвращает:
+    tuple: Команда и объем измененных данных в МБ (по нему считаются показатели 7z u).
+    """
+    changed = max(1, int(file_count * UPDATE_FRACTION))
+    cmd = ('cd {0}/src; find . -type f | sort | head -n {1} | while read f; do head -c {2} /dev/urandom > "$f"; done; '
+           'head -c {2} /dev/urandom > update-new.bin'.format(folder, changed, file_size))
+    return cmd, (changed + 1) * file_size / 1024.0 / 1024.0
+
+
+def metrics(usage, size_mb):
+    """
+    Переводит данные with_rusage в показатели бенчмарка.
+
+    Возвращает:
+    dict: mb_s (пропускная способность, МБ/с), cpu_s_per_mb (CPU-секунды на МБ), maxrss_kb (пиковая память).
+    """
+    cpu = usage['utime_s'] + usage['stime_s']
+    return {
+        'mb_s': size_mb / usage['wall_s'] if usage['wall_s'] > 0 else None,
+        'cpu_s_per_mb': cpu / size_mb,
+        'maxrss_kb': usage['maxrss_kb'],
+        'wall_s': usage['wall_s'],
+    }
+
+
+class BenchmarkRecorder:
+    """
+    Накопитель результатов бенчмарка за тестовую сессию.
+
+    Результаты сохраняются в JSON с номером версии формата, сравнение идет с эталонным файлом:
+    регрессией считается показатель (по умолчанию пропускная способность) ниже эталонного больше чем на margin (доля).
+    """
+
+    def __init__(self, results_dir, margin=0.1):
+        self.results_dir = results_dir
+        self.margin = margin
+        self.results = {}
+        self._lock = threading.Lock()
+        self.baseline = self._load(os.path.join(results_dir, 'baseline.json'))
+
+    @staticmethod
+    def _load(path):
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            content = json.load(f)
+        if content.get('version') != SCHEMA_VERSION:
+            return {}
+        return content['results']
+
+    def record(self, case, operation, values, metric='mb_s'):
+        """
+        Сохраняет показатели операции и возвращает описание регрессии или None.
+        metric - сравниваемый с эталоном показатель (чем больше, тем лучше): mb_s (МБ/с) или ops_s (операций/с).
+        """
+        with self._lock:
+            self.results.setdefault(case, {})[operation] = values
+        reference = self.baseline.get(case, {}).get(operation)
+        if not reference or not reference.get(metric) or values.get(metric) is None:
+            return None
+        limit = reference[metric] * (1 - self.margin)
+        if values[metric] < limit:
+            return '{} {}: {} {:.2f} < {:.2f} (эталон {:.2f}, допуск {:.0%})'.format(
+                case, operation, metric, values[metric], limit, reference[metric], self.margin)
+        return None
+
+    def save(self, host, update_baseline=False):
+        """
+        Записывает результаты сессии в results_dir/run-<время>.json и, при update_baseline, в baseline.json.
+
+        Возвращает:
+        str: Путь к файлу результатов или None, если результатов нет.
+        """
+        if not self.results:
+            return None
+        os.makedirs(self.results_dir, exist_ok=True)
+        content = {
+            'version': SCHEMA_VERSION,
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'host': host,
+            'results': self.results,
+        }
+        path = os.path.join(self.results_dir, 'run-{}.json'.format(datetime.now().strftime('%Y%m%d-%H%M%S')))
+        with open(path, 'w') as f:
+            json.dump(content, f, indent=2, sort_keys=True)
+        if update_baseline:
+            with open(os.path.join(self.results_dir, 'baseline.json'), 'w') as f:
+                json.dump(content, f, indent=2, sort_keys=True)
+        return path
+
+
+def harness_case_id(operation, payload_kb, concurrency):
+    """
+    Возвращает идентификатор точки матрицы бенчмарка обвязки.
+    """
+    return '{}-{}kb-c{}'.format(operation, payload_kb, concurrency)
+
+
+def measure(func, count, concurrency, payload_bytes=0):
+    """
+    Выполняет func(i) для i из range(count), не больше concurrency одновременно, и снимает показатели.
+
+    Возвращает:
+    dict: ops_s (операций в секунду), mb_s (МБ/с полезной нагрузки), p50_ms/p95_ms/p99_ms (задержка одной операции)
+          и wall_s (общее время).
+    """
+    def timed(i):
+        start = time.monotonic()
+        func(i)
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(count)))
+    wall = time.monotonic() - start
+    values = {
+        'ops_s': count / wall,
+        'mb_s': payload_bytes * count / wall / (1024 * 1024) if payload_bytes else None,
+        'wall_s': wall,
+    }
+    for q in (50, 95, 99):
+        values['p{}_ms'.format(q)] = _percentile(latencies, q) * 1000
+    return values
@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+
+import yaml
+
+import ssh_profiles
+from fleet import apply_host
+
+# Единая конфигурация тестов: config.yaml читается один раз на процесс, значения из переменных окружения
+# SEVENZIP_<КЛЮЧ> (например, SEVENZIP_IP=10.0.0.5, SEVENZIP_BACKEND=local) заменяют значения из файла,
+# результат проверяется по схеме. Процессы pytest-xdist получают уже проверенную конфигурацию
+# от главного процесса в переменной окружения CONFIG_ENV и не читают файл повторно.
+
+ENV_PREFIX = 'SEVENZIP_'
+CONFIG_ENV = 'SEVENZIP_CONFIG_JSON'
+
+# Обязательный ключ (значения по умолчанию нет)
+REQUIRED = object()
+
+# Схема: ключ -> (тип, значение по умолчанию); значение по умолчанию None означает необязательный ключ.
+# Кортеж типов допускает любой из них, значение приводится к первому (journal_priority: 3 и 'err' - строки)
+SCHEMA = {
+    'folder_in': (str, REQUIRED),
+    'folder_out': (str, REQUIRED),
+    'folder_ext': (str, REQUIRED),
+    'folder_ext2': (str, REQUIRED),
+    'count': (int, 3),
+    'ip': (str, REQUIRED),
+    'prt': (int, 22),
+    'user': (str, REQUIRED),
+    'passwd': (str, REQUIRED),
+    'use_key': (bool, False),
+    'ssh_profile': (str, 'default'),
+    'ssh_profiles': (dict, {}),
+    'pkgname': (str, 'p7zip-full'),
+    'type': (str, '7z'),
+    'required_packages': (list, ['p7zip-full']),
+    'corrupt_batches': (int, 4),
+    'backend': (str, 'ssh'),
+    'local_workers': (int, 4),
+    'journal_units': (list, []),
+    'journal_priority': ((str, int), None),
+    'cpu_sample_interval': (float, 0.5),
+    'proc_stats': (bool, False),
+    'bench': (dict, {}),
+    'dataset_root': (str, None),
+    'dataset_budget_mb': (int, 1024),
+    'dataset_seed': (int, 1),
+    'hosts': (list, []),
+    'inventory': (str, None),
+    'fleet_concurrency': (int, 4),
+    'fleet_per_host': (int, 1),
+    'fleet_reports': (str, 'fleet_reports'),
+    'log_dir': (str, None),
+    'timing_dir': (str, 'timing_results'),
+    'timing_top': (int, 10),
+    'result_cache': (dict, {}),
+    'connect_timeout': (float, 10),
+    'banner_timeout': (float, 15),
+    'auth_timeout': (float, 30),
+    'keepalive': (int, 15),
+    'io_timeout': (float, 120),
+    'command_timeout': (float, None),
+    'stall_timeout': (float, None),
+    'test_deadline': (float, None),
+}
+
+BACKENDS = ('ssh', 'local')
+
+# Ключи, значения которых должны быть положительными
+_POSITIVE = ('count', 'prt', 'local_workers', 'corrupt_batches', 'cpu_sample_interval', 'dataset_budget_mb',
+             'fleet_concurrency', 'fleet_per_host', 'connect_timeout', 'banner_timeout', 'auth_timeout',
+             'io_timeout', 'command_timeout', 'stall_timeout', 'test_deadline')
+
+
+class ConfigError(ValueError):
+    """
+    Ошибка конфигурации: отсутствует обязательный ключ, неизвестный ключ или значение неверного типа.
+    """
+
+
+class Config(dict):
+    """
+    Проверенная конфигурация тестов.
+
+    Словарь (data['ip'], data.get('count')), значения также доступны как атрибуты (data.ip).
+    Незаданные необязательные ключи в словаре отсутствуют (чтобы работали значения по умолчанию в data.get),
+    как атрибуты они равны None.
+    """
+
+    def __getattr__(self, name):
+        if name in self:
+            return self[name]
+        if name in SCHEMA:
+            return None
+        raise AttributeError(name)
+
+
+def _coerce(key, value, kind):
+    if isinstance(kind, tuple):
+        for option in kind:
+            try:
+                return kind[0](_coerce(key, value, option))
+            except ConfigError:
+                pass
+        raise ConfigError('{}: ожидается {}, получено {!r}'.format(
+            key, ' или '.join(option.__name__ for option in kind), value))
+    # Целое подходит там, где ожидается дробное; bool не считается числом
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, kind) and not (kind is int and isinstance(value, bool)):
+        return value
+    raise ConfigError('{}: ожидается {}, получено {!r}'.format(key, kind.__name__, value))
+
+
+def validate(data):
+    """
+    Проверяет конфигурацию по схеме и дополняет ее значениями по умолчанию.
+
+    Возвращает:
+    Config: Проверенная конфигурация.
+    """
+    unknown = sorted(set(data) - set(SCHEMA))
+    if unknown:
+        raise ConfigError('неизвестные ключи конфигурации: {}'.format(', '.join(unknown)))
+    result = Config()
+    for key, (kind, default) in SCHEMA.items():
+        value = data.get(key)
+        if value is None:
+            if default is REQUIRED:
+                raise ConfigError('{}: обязательный ключ не задан'.format(key))
+            if default is not None:
+                # Изменяемые значения по умолчанию копируются, чтобы не делить их между конфигурациями
+                result[key] = json.loads(json.dumps(default))
+            elif key in data:
+                result[key] = None
+            continue
+        result[key] = _coerce(key, value, kind)
+    for key in _POSITIVE:
+        if result.get(key) is not None and result[key] <= 0:
+            raise ConfigError('{}: значение должно быть положительным, получено {!r}'.format(key, result[key]))
+    if result['backend'] not in BACKENDS:
+        raise ConfigError('backend: ожидается одно из {}, получено {!r}'.format(', '.join(BACKENDS), result['backend']))
+    # Профили SSH проверяются все, а не только выбранный: их перебирает бенчмарк профилей
+    try:
+        for name in set(result['ssh_profiles']) | {result['ssh_profile']}:
+            ssh_profiles.get_profile(result, name)
+    except ValueError as e:
+        raise ConfigError('ssh_profiles: {}'.format(e))
+    return result
+
+
+def env_overrides(environ=None):
+    """
+    Возвращает значения из переменных окружения SEVENZIP_<КЛЮЧ>; значение разбирается как YAML
+    (SEVENZIP_PRT=2222 - число, SEVENZIP_REQUIRED_PACKAGES='[p7zip-full, zip]' - список).
+    Значения строковых ключей схемы берутся как есть: SEVENZIP_PASSWD=123456 - строка '123456'.
+    """
+    environ = os.environ if environ is None else environ
+    result = {}
+    for key, (kind, _) in SCHEMA.items():
+        name = ENV_PREFIX + key.upper()
+        if isinstance(kind, tuple):
+            kind = kind[0]
+        if name in environ:
+            result[key] = environ[name] if kind is str else yaml.safe_load(environ[name])
+    return result
+
+
+def load(path='config.yaml'):
+    """
+    Читает и проверяет конфигурацию: config.yaml, переменные окружения, параметры хоста парка (FLEET_HOST).
+    Если главный процесс pytest-xdist уже передал конфигурацию в CONFIG_ENV, файл не читается.
+
+    Возвращает:
+    Config: Проверенная конфигурация.
+    """
+    if os.environ.get(CONFIG_ENV):
+        return Config(json.loads(os.environ[CONFIG_ENV]))
+    with open(path) as f:
+        data = yaml.safe_load(f) or {}
+    data.update(env_overrides())
+    # Параметры хоста парка, если запуск выполняется через fleet.py
+    apply_host(data)
+    return validate(data)
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_config(path='config.yaml'):
+    """
+    Возвращает общую для процесса конфигурацию, загружая ее при первом обращении.
+    """
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = load(path)
+        return _config
+
+
+def export_config():
+    """
+    Передает конфигурацию дочерним процессам (pytest-xdist) через переменную окружения CONFIG_ENV.
+    """
+    os.environ[CONFIG_ENV] = json.dumps(get_config())
@@ -1,107 +1,588 @@
+import os
+import sys
 import pytest
-from ssh_utils import ssh_checkout
-import random, string
-import yaml
+from ssh_utils import pool
+from executors import get_executor
+import cpu_sampler
+import remote_agent
+import timing
+import deadline
+from deadline import CommandTimeout
+from provision import get_provisioner, package_lock
+from benchmark import BenchmarkRecorder
+from datasets import DatasetSpec, ensure_dataset, ensure_dataset_async
+from async_ssh import run_all
+from corrupt import CorruptVariant, make_variants
+from config import export_config, get_config
+import ssh_utils
+from ssh_profiles import get_host_keys, get_profile
+import result_cache
 from datetime import datetime
 
-# Чтение конфигурационного файла config.yaml
-with open('config.yaml') as f:
-    data = yaml.safe_load(f)
+# Конфигурация (config.yaml, переменные окружения SEVENZIP_*, параметры хоста парка) - общая для всех модулей
+data = get_config()
+# Исполнитель команд на проверяемой машине (ssh или local, ключ backend)
+ex = get_executor(data)
+# Ограничения времени подключения, обмена ключами, аутентификации и операций SFTP для пула SSH-сессий
+for name in ('connect_timeout', 'banner_timeout', 'auth_timeout', 'keepalive', 'io_timeout'):
+    if name in data:
+        setattr(pool, name, data[name])
+# Профиль подключения (ключ, алгоритмы, сжатие, известные ключи хостов) - ключ ssh_profile
+pool.profile = get_profile(data)
+
+
+def pytest_addoption(parser):
+    parser.addoption('--bench', action='store_true', default=False,
+                     help='запускать бенчмарки производительности 7z (маркер bench)')
+    parser.addoption('--bench-update-baseline', action='store_true', default=False,
+                     help='сохранить результаты бенчмарка как новый эталон')
+    parser.addoption('--result-cache', action='store_true', default=False,
+                     help='не выполнять тесты, прошедшие с теми же входными данными (кэш результатов)')
+    parser.addoption('--force-rerun', action='store_true', default=False,
+                     help='с --result-cache: выполнить все тесты, обновив кэш результатов')
+
+
+def pytest_configure(config):
+    # Главный процесс передает проверенную конфигурацию процессам pytest-xdist и один раз готовит SSH-ключ
+    if not hasattr(config, 'workerinput'):
+        export_config()
+        if data['use_key'] and data['backend'] == 'ssh':
+            ssh_utils.ensure_ssh_key()
+            ssh_utils.upload_ssh_key(data['ip'], data['user'], data['passwd'], data['prt'])
+    config.addinivalue_line('markers', 'bench: бенчмарк производительности, запускается с ключом --bench')
+    # Маркер pytest-xdist: тесты одной группы выполняются одним процессом (запуск с --dist loadgroup)
+    config.addinivalue_line('markers', 'xdist_group(name): выполнять тесты группы в одном процессе pytest-xdist')
+    config.addinivalue_line('markers', 'changes_packages: тест устанавливает или удаляет пакеты (сбрасывает кэш состояния пакетов)')
+    config.addinivalue_line('markers', 'deadline(seconds): срок выполнения всех команд теста (вместо test_deadline)')
+    config.addinivalue_line('markers', 'offline: тест не обращается к проверяемой машине')
+
+
+# Кэш результатов (--result-cache) и отпечатки тестов сессии: nodeid -> отпечаток, nodeid -> запись кэша
+_results = None
+_fingerprints = {}
+_cached = {}
+
+
+def _cache_inputs():
+    # Параметры тестов, от которых зависит их результат, кроме пакета, версии 7z и машины
+    return {
+        'files': _files_spec()._asdict(),
+        'subfolder': _subfolder_spec()._asdict(),
+        'type': data['type'],
+        'pkgname': data['pkgname'],
+        'required_packages': data['required_packages'],
+        'backend': data['backend'],
+    }
+
+
+def _apply_result_cache(config, items):
+    """
+    Считает отпечатки тестов и пропускает тесты, успешно прошедшие с тем же отпечатком (исход CACHED).
+    Тесты, устанавливающие или удаляющие пакеты, готовят машину для остальных, поэтому берутся из кэша,
+    только если из кэша берутся все остальные тесты.
+    """
+    global _results
+    settings = data.get('result_cache', {})
+    _results = result_cache.ResultCache(settings.get('path', 'result_cache/cache.json'),
+                                        settings.get('ttl_hours', 24) * 3600, settings.get('max_entries', 1000))
+    host = 'local' if data['backend'] == 'local' else '{}:{}'.format(data['ip'], data['prt'])
+    env = result_cache.environment(ex, data['pkgname'] + '.deb', host, _cache_inputs())
+    hits = {}
+    for item in items:
+        if 'bench' in item.keywords:
+            continue
+        fingerprint = result_cache.item_fingerprint(env, item, [sys.modules[__name__]])
+        _fingerprints[item.nodeid] = fingerprint
+        entry = None if config.getoption('--force-rerun') else _results.lookup(fingerprint)
+        if entry is not None:
+            hits[item.nodeid] = entry
+    runs = [item for item in items if item.nodeid in _fingerprints and item.nodeid not in hits]
+    if any(not item.get_closest_marker('changes_packages') for item in runs):
+        for item in items:
+            if item.get_closest_marker('changes_packages'):
+                hits.pop(item.nodeid, None)
+    for item in items:
+        entry = hits.get(item.nodeid)
+        if entry is not None:
+            _cached[item.nodeid] = entry
+            passed = datetime.fromtimestamp(entry['passed']).strftime('%Y-%m-%d %H:%M:%S')
+            item.add_marker(pytest.mark.skip(reason='результат из кэша: прошел {} за {:.1f}s'.format(
+                passed, entry['duration'])))
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--result-cache'):
+        _apply_result_cache(config, items)
+    # Бенчмарки долгие, поэтому без --bench они пропускаются
+    if config.getoption('--bench'):
+        return
+    skip = pytest.mark.skip(reason='бенчмарк: запуск с ключом --bench')
+    for item in items:
+        if 'bench' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    # Замеры удаленных операций (в том числе в фикстурах) относятся к выполняемому тесту
+    timing.recorder.test = item.nodeid
+    yield
+    timing.recorder.test = None
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    # Прерванная по сроку команда - отдельный исход, а не обычная ошибка проверки
+    if call.excinfo is not None and call.excinfo.errisinstance(CommandTimeout):
+        report.timeout = True
+    if item.nodeid in _cached:
+        report.cached = True
+    # Успешный прогон запоминается в кэше результатов, неудачный (в том числе в фикстурах) удаляет запись
+    fingerprint = _fingerprints.get(item.nodeid)
+    if fingerprint is not None and item.nodeid not in _cached:
+        if report.failed:
+            _results.discard(fingerprint)
+        elif report.when == 'call' and report.passed:
+            _results.store(fingerprint, item.nodeid, report.duration)
+
+
+def pytest_report_teststatus(report, config):
+    if report.failed and getattr(report, 'timeout', False):
+        return 'timeout', 'T', 'TIMEOUT'
+    if report.skipped and getattr(report, 'cached', False):
+        return 'cached', 'C', 'CACHED'
+
+
+def pytest_sessionfinish(session):
+    if _results is not None:
+        _results.save()
+    if not timing.recorder:
+        return
+    suffix = _worker_id(session.config)
+    timing.recorder.save(data.get('timing_dir', 'timing_results'), '' if suffix == 'master' else suffix)
+
+
+def pytest_terminal_summary(terminalreporter):
+    # Сводка по фазам удаленных операций и самые долгие шаблоны команд
+    # (при запуске через pytest-xdist замеры есть только в отчетах процессов)
+    if not timing.recorder:
+        return
+    terminalreporter.write_sep('-', 'время удаленных операций')
+    phases = timing.recorder.by_phase()
+    for phase in timing.PHASES:
+        if phase in phases:
+            terminalreporter.write_line(
+                '{:<11} n={count:<6} p50 {p50:.3f}s p95 {p95:.3f}s p99 {p99:.3f}s max {max:.3f}s '
+                'всего {total:.2f}s'.format(phase, **phases[phase]))
+    terminalreporter.write_line('самые долгие операции:')
+    for row in timing.recorder.by_template()[:data.get('timing_top', 10)]:
+        terminalreporter.write_line('{total:8.2f}s n={count:<5} p95 {p95:.3f}s {phase:<11} {template}'.format(**row))
+
+
+# Фикстура для накопления результатов бенчмарка и их сохранения в JSON
+@pytest.fixture(scope='session')
+def bench_recorder(request):
+    """
+    Отдает накопитель результатов бенчмарка и по окончании сессии сохраняет их
+    (и, с ключом --bench-update-baseline, обновляет эталон).
+    """
+    bench = data.get('bench', {})
+    recorder = BenchmarkRecorder(bench.get('results_dir', 'bench_results'), bench.get('margin', 0.1))
+    yield recorder
+    path = recorder.save(data['ip'], request.config.getoption('--bench-update-baseline'))
+    if path:
+        print('Результаты бенчмарка сохранены в {}'.format(path))
+
+
+# Фикстура срока выполнения теста
+@pytest.fixture(autouse=True)
+def test_deadline(request):
+    """
+    Ограничивает все команды теста (включая фикстуры) сроком из маркера deadline или параметра test_deadline;
+    по истечении срока команды завершаются на проверяемой машине и тест получает исход TIMEOUT.
+    """
+    marker = request.node.get_closest_marker('deadline')
+    deadline.set_test_deadline(marker.args[0] if marker else data.get('test_deadline'))
+    yield
+    deadline.set_test_deadline(None)
+
+
+# Фикстура для накопления результатов бенчмарка обвязки (test_harness.py)
+@pytest.fixture(scope='session')
+def harness_recorder(request):
+    """
+    Отдает накопитель результатов бенчмарка обвязки; результаты и эталон хранятся отдельно от бенчмарка 7z
+    (в подкаталоге harness каталога результатов), регрессией считается падение ops_s больше чем на bench.harness.margin.
+    """
+    bench = data.get('bench', {})
+    recorder = BenchmarkRecorder(os.path.join(bench.get('results_dir', 'bench_results'), 'harness'),
+                                 bench.get('harness', {}).get('margin', 0.3))
+    yield recorder
+    path = recorder.save('ssh_stub', request.config.getoption('--bench-update-baseline'))
+    if path:
+        print('Результаты бенчмарка обвязки сохранены в {}'.format(path))
+
+
+# Фикстура для накопления результатов бенчмарка профилей SSH (test_profiles.py)
+@pytest.fixture(scope='session')
+def profile_recorder(request):
+    """
+    Отдает накопитель результатов бенчмарка профилей SSH (подкаталог profiles каталога результатов);
+    регрессией считается падение показателя больше чем на bench.profiles.margin.
+    """
+    bench = data.get('bench', {})
+    recorder = BenchmarkRecorder(os.path.join(bench.get('results_dir', 'bench_results'), 'profiles'),
+                                 bench.get('profiles', {}).get('margin', 0.2))
+    yield recorder
+    path = recorder.save(data['ip'], request.config.getoption('--bench-update-baseline'))
+    if path:
+        print('Результаты бенчмарка профилей SSH сохранены в {}'.format(path))
+
+
+# Фикстура выбора профиля SSH на время теста
+@pytest.fixture()
+def ssh_profile():
+    """
+    Отдает функцию, переключающую пул SSH-сессий на профиль с указанным именем (с подготовкой ключа профиля
+    при use_key), и возвращает профиль из конфигурации после теста.
+    """
+    saved = pool.profile
+
+    def switch(name):
+        profile = get_profile(data, name)
+        if data['use_key']:
+            ssh_utils.ensure_ssh_key(profile)
+            ssh_utils.upload_ssh_key(data['ip'], data['user'], data['passwd'], data['prt'], profile)
+        pool.profile = profile
+        return profile
+
+    yield switch
+    pool.profile = saved
+
+
+# Фикстура локального SSH/SFTP-сервера для бенчмарка обвязки
+@pytest.fixture()
+def ssh_stub(tmp_path_factory):
+    """
+    Запускает StubServer (ssh_stub.py) с песочницей во временном каталоге и останавливает его после теста.
+    Заглушка своя у каждого теста (новый порт - новая сессия пула): объем данных одной сессии остается
+    ниже порога смены ключей paramiko, которую сервер и клиент в одном процессе под нагрузкой не проходят.
+    """
+    # Заглушка (и paramiko) загружается только для бенчмарка обвязки
+    from ssh_stub import StubServer
+    with StubServer(str(tmp_path_factory.mktemp('ssh_stub')), 'stub', 'stub') as stub:
+        # Ключ заглушки новый в каждом процессе: ему доверяем без записи в файл известных ключей
+        if pool.profile.known_hosts:
+            get_host_keys(pool.profile.known_hosts).trust(stub.host, stub.port, stub.host_key)
+        yield stub
+
+
+# Фикстура для закрытия пула SSH-сессий по окончании тестовой сессии
+@pytest.fixture(scope='session', autouse=True)
+def ssh_pool():
+    """
+    Отдает общий пул SSH-сессий и закрывает все его соединения после завершения тестов.
+    """
+    yield pool
+    pool.close_all()
+
+
+# Фикстура агента файловых операций на проверяемой машине
+@pytest.fixture(scope='session')
+def agent(ssh_pool):
+    """
+    Отдает агент файловых операций (один процесс на проверяемой машине на всю сессию) и завершает его после тестов.
+    """
+    yield remote_agent.get_agent(ex)
+    remote_agent.stop_all()
+
+
+# Фикстура проверки и установки пакетов на проверяемой машине
+@pytest.fixture(scope='session')
+def provision(ssh_pool):
+    """
+    Отдает общий для сессии Provisioner: состояние пакетов проверяется одним вызовом и кэшируется.
+    """
+    return get_provisioner(ex, data['passwd'], data.get('required_packages', ['p7zip-full']) + [data['pkgname']])
+
+
+def _deb_paths():
+    # Локальный файл проверяемого пакета и путь к нему на проверяемой машине
+    return data['pkgname'] + '.deb', '/home/{}/{}.deb'.format(data['user'], data['pkgname'])
+
+
+# Фикстура проверяемого пакета: от нее зависят все тесты, выполняющие 7z (через workspace)
+@pytest.fixture(scope='session')
+def package(provision):
+    """
+    Устанавливает проверяемый пакет (.deb), если он не установлен, и пакеты required_packages.
+    Тесты больше не полагаются на то, что пакет установил test_step1.
+    """
+    packages = data.get('required_packages', ['p7zip-full'])
+    with package_lock(ex, exclusive=True):
+        if not provision.installed(data['pkgname']):
+            assert provision.install_deb(*_deb_paths()), 'не удалось установить пакет {}'.format(data['pkgname'])
+        assert provision.ensure(packages), 'не удалось установить пакеты {}'.format(', '.join(packages))
+    return data['pkgname']
+
+
+# Фикстура для тестов, которым нужны установленные пакеты из required_packages
+@pytest.fixture()
+def required_packages(provision):
+    """
+    Устанавливает недостающие пакеты required_packages (при необходимости одной транзакцией apt-get).
+    """
+    packages = data.get('required_packages', ['p7zip-full'])
+    assert provision.ensure(packages), 'не удалось установить пакеты {}'.format(', '.join(packages))
+    return packages
+
+
+def _offline(request):
+    """
+    Проверяет, что тест не обращается к проверяемой машине: маркер offline или локальная заглушка ssh_stub.
+    """
+    return 'ssh_stub' in request.fixturenames or request.node.get_closest_marker('offline') is not None
+
+
+# Фикстура упорядочивания тестов, которые сами устанавливают или удаляют пакеты
+@pytest.fixture(autouse=True)
+def package_changes(request):
+    """
+    Тест с маркером changes_packages выполняется под исключительной блокировкой пакетов (во всех процессах pytest
+    на этой машине остальные тесты в это время не выполняются), после него кэш состояния пакетов сбрасывается,
+    а удаленный тестом проверяемый пакет устанавливается снова. Остальные тесты выполняются под совместной
+    блокировкой. Тесты без проверяемой машины (маркер offline, заглушка ssh_stub) ее пакеты не затрагивают.
+    """
+    if _offline(request):
+        yield
+        return
+    changes = request.node.get_closest_marker('changes_packages') is not None
+    with package_lock(ex, exclusive=changes):
+        yield
+        if changes:
+            provision = get_provisioner(ex, data['passwd'])
+            provision.invalidate()
+            if not provision.installed(data['pkgname']):
+                assert provision.install_deb(*_deb_paths()), 'не удалось восстановить пакет {}'.format(
+                    data['pkgname'])
+
+
+# Фикстура для фонового сбора загрузки процессора удаленной машины
+@pytest.fixture(scope='session')
+def cpu_monitor(ssh_pool):
+    """
+    Запускает сборщик загрузки процессора (/proc/stat через один канал исполнителя) на всю тестовую сессию.
+    """
+    yield cpu_sampler.get_sampler(ex, data.get('cpu_sample_interval', 0.5))
+    cpu_sampler.stop_all()
+
+
+# Фикстура для сбора статистики загрузки процессора за время теста
+@pytest.fixture(autouse=True)
+def cpu_window(request):
+    """
+    Отмечает начало теста в сборщике и после теста выводит максимальную, среднюю
+    и p95 загрузку процессора, сохраняя их в свойствах теста.
+    Тесты без проверяемой машины (маркер offline, заглушка ssh_stub) к ней не подключаются и загрузку не собирают.
+    """
+    if _offline(request):
+        yield None
+        return
+    cpu_monitor = request.getfixturevalue('cpu_monitor')
+    cpu_monitor.start_window()
+    yield cpu_monitor
+    stats = cpu_monitor.window_stats()
+    request.node.user_properties.append(('cpu', stats))
+    if stats['error']:
+        print('CPU: сбор загрузки остановлен ({})'.format(stats['error']))
+    if stats['samples']:
+        print('CPU: max {max:.1f}% mean {mean:.1f}% p95 {p95:.1f}% ({samples} замеров)'.format(**stats))
+
+
+# Фикстура для учета ресурсов, потребленных проверяемыми командами
+@pytest.fixture()
+def proc_stats(request):
+    """
+    Возвращает список для параметра stats методов check / getout исполнителя, если в config.yaml
+    включен proc_stats, иначе None. Собранные данные сохраняются в свойствах теста.
+    """
+    if not data.get('proc_stats'):
+        yield None
+        return
+    stats = []
+    yield stats
+    request.node.user_properties.append(('proc_stats', stats))
+    for usage in stats:
+        print('{cmd}: {wall_s:.2f}s user {utime_s:.2f}s sys {stime_s:.2f}s rss {maxrss_kb}KB '
+              'read {read_bytes}B write {write_bytes}B'.format(**usage))
+
+
+# Каталоги рабочего пространства из config.yaml
+FOLDERS = ('folder_in', 'folder_out', 'folder_ext', 'folder_ext2')
+
+
+def _worker_id(config):
+    """
+    Возвращает идентификатор процесса pytest-xdist (gw0, gw1, ...) или 'master' при обычном запуске.
+    """
+    return getattr(config, 'workerinput', {}).get('workerid', 'master')
+
+
+# Фикстура рабочего пространства процесса на удаленной машине
+@pytest.fixture(scope='session')
+def workspace(request, ssh_pool, package):
+    """
+    Создает отдельные для каждого процесса pytest каталоги folder_in / folder_out / folder_ext / folder_ext2
+    (к путям из config.yaml добавляется суффикс с идентификатором процесса pytest-xdist и PID: несколько
+    прогонов на одном хосте парка с per_host > 1 не делят каталоги) и удаляет их после тестов.
+
+    Возвращает:
+    dict: Имя каталога из config.yaml -> путь к каталогу процесса.
+    """
+    suffix = '{}-{}'.format(_worker_id(request.config), os.getpid())
+    paths = {name: '{}-{}'.format(data[name], suffix) for name in FOLDERS}
+    ex.check('mkdir -p {}'.format(' '.join(paths.values())), '')
+    yield paths
+    ex.check('rm -rf {}'.format(' '.join(paths.values())), '')
 
 
 # Фикстура для создания необходимых каталогов
 @pytest.fixture()
-def make_folders():
+def make_folders(workspace, agent):
     """
-    Создает необходимые каталоги на удаленной машине.
+    Создает необходимые каталоги на удаленной машине (если они были удалены во время теста).
     """
-    return ssh_checkout(
-        data['ip'], data['user'], data['passwd'],
-        'mkdir {} {} {} {}'.format(data['folder_in'], data['folder_out'], data['folder_ext'], data['folder_ext2']),
-        ''
-    )
+    return all(agent.batch([('mkdir', {'path': workspace[name]}) for name in FOLDERS]))
 
 
 # Фикстура для очистки каталогов на удаленной машине
 @pytest.fixture()
-def clear_folders():
+def clear_folders(workspace, agent):
+    """
+    Очищает содержимое каталогов рабочего пространства на удаленной машине.
+    """
+    return all(agent.batch([('remove', {'path': workspace[name], 'contents': True}) for name in FOLDERS]))
+
+
+def _dataset_args():
+    return data.get('dataset_root', '/home/{}/datasets'.format(data['user'])), data.get('dataset_budget_mb', 1024)
+
+
+def _dataset(spec, target):
     """
-    Очищает содержимое указанных каталогов на удаленной машине.
+    Создает набор данных из кэша на удаленной машине и копирует его в target одним вызовом.
     """
-    return ssh_checkout(
-        data['ip'], data['user'], data['passwd'],
-        'rm -rf {}/{}/* {}/* {}/* {}/*'.format(
-            data['folder_in'], data['folder_out'], data['folder_ext'], data['folder_ext2']
-        ),
-        ''
-    )
+    return ensure_dataset(ex, spec, *_dataset_args(), target)
+
+
+def _files_spec():
+    # Файлы по 1 МБ со случайным содержимым (make_files)
+    return DatasetSpec(seed=data.get('dataset_seed', 1), count=data['count'],
+                       size_min=1024 * 1024, size_max=1024 * 1024, compressibility=0.0, depth=0)
+
+
+def _subfolder_spec():
+    # Подкаталог с одним файлом (make_subfolder)
+    return DatasetSpec(seed=data.get('dataset_seed', 1) + 1, count=1,
+                       size_min=1024 * 1024, size_max=1024 * 1024, compressibility=0.0, depth=1)
+
+
+# Фикстура одновременного выполнения удаленных операций
+@pytest.fixture(scope='session')
+def aio():
+    """
+    Отдает async_ssh.run_all: независимые шаги подготовки и проверки (корутины ex.check_async, ex.getout_async и т.п.)
+    выполняются одновременно, а не по очереди.
+    """
+    return run_all
 
 
 # Фикстура для создания файлов на удаленной машине
 @pytest.fixture()
-def make_files():
+def make_files(workspace):
     """
-    Создает указанное количество случайных файлов на удаленной машине.
+    Создает указанное количество файлов по 1 МБ со случайным содержимым на удаленной машине.
+    Набор детерминирован зерном dataset_seed и переиспользуется из кэша между тестами и запусками.
     """
-    list_of_files = []
-    for i in range(data['count']):
-        filename = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-        if ssh_checkout(
-                data['ip'], data['user'], data['passwd'],
-                'cd {}; dd if=/dev/urandom of={} bs=1M count=1 iflag=fullblock'.format(data['folder_in'], filename),
-                ''
-        ):
-            list_of_files.append(filename)
-    return list_of_files
+    return _dataset(_files_spec(), workspace['folder_in'])['files']
 
 
 # Фикстура для создания подкаталога на удаленной машине
 @pytest.fixture()
-def make_subfolder():
-    """
-    Создает подкаталог и случайный файл в нем на удаленной машине.
-    """
-    testfilename = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-    subfoldername = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-    if not ssh_checkout(
-            data['ip'], data['user'], data['passwd'],
-            'cd {}; mkdir {}'.format(data['folder_in'], subfoldername),
-            ''
-    ):
-        return None, None
-    if not ssh_checkout(
-            data['ip'], data['user'], data['passwd'],
-            'cd {}/{}; dd if=/dev/urandom of={} bs=1M count=1 iflag=fullblock'.format(data['folder_in'], subfoldername,
-                                                                                      testfilename),
-            ''
-    ):
-        return subfoldername, None
-    else:
-        return subfoldername, testfilename
+def make_subfolder(workspace):
+    """
+    Создает подкаталог и файл со случайным содержимым в нем на удаленной машине.
+    """
+    subfoldername, testfilename = _dataset(_subfolder_spec(), workspace['folder_in'])['files'][0].split('/')
+    return subfoldername, testfilename
+
+
+def _make_arx(workspace, name):
+    """
+    Упаковывает folder_in в архив folder_out/<name>.7z и возвращает путь к архиву.
+    """
+    assert ex.check(
+        'cd {}; rm -f {}/{}.7z; 7z a {}/{}'.format(workspace['folder_in'], workspace['folder_out'], name,
+                                                   workspace['folder_out'], name),
+        'Everything is Ok'
+    ), 'не удалось создать архив {}'.format(name)
+    return '{}/{}.7z'.format(workspace['folder_out'], name)
+
+
+# Фикстура архива arx2.7z, который используют тесты проверки и обновления архива
+@pytest.fixture()
+def arx2(workspace, clear_folders, make_files):
+    """
+    Создает архив arx2.7z из файлов make_files и возвращает путь к нему.
+    """
+    return _make_arx(workspace, 'arx2')
+
+
+# Фикстура архива arx.7z с файлами и подкаталогом, который используют тесты удаления из архива
+@pytest.fixture()
+def arx(workspace, clear_folders, aio):
+    """
+    Создает архив arx.7z из файлов make_files и подкаталога make_subfolder и возвращает путь к нему.
+    Оба набора данных готовятся одновременно.
+    """
+    aio(*(ensure_dataset_async(ex, spec, *_dataset_args(), workspace['folder_in'])
+          for spec in (_files_spec(), _subfolder_spec())))
+    return _make_arx(workspace, 'arx')
 
 
 # Фикстура для создания поврежденного архива на удаленной машине
 @pytest.fixture()
-def make_bad_arx():
+def make_bad_arx(workspace, agent):
     """
     Создает поврежденный архив на удаленной машине и удаляет его после использования.
     """
-    ssh_checkout(
-        data['ip'], data['user'], data['passwd'],
-        'cd {}; 7z a {}/arxbad -t{}'.format(data['folder_in'], data['folder_out'], data['type']),
-        'Everything is Ok'
-    )
-    ssh_checkout(
-        data['ip'], data['user'], data['passwd'],
-        'truncate -s 1 {}/arxbad.{}'.format(data['folder_out'], data['type']),
-        'Everything is Ok'
-    )
+    source = '{}/arxsrc.{}'.format(workspace['folder_out'], data['type'])
+    ex.check('cd {}; 7z a {} -t{}'.format(workspace['folder_in'], source, data['type']), 'Everything is Ok')
+    # Архив, обрезанный до 1 байта, строится из корректного одним вызовом
+    make_variants(ex, source, workspace['folder_out'], [CorruptVariant('arxbad', 'truncate', 'header', offset=1)])
     yield 'arxbad'
-    ssh_checkout(
-        data['ip'], data['user'], data['passwd'],
-        'rm -f {}/arxbad.{}'.format(data['folder_out'], data['type']),
-        ''
-    )
+    agent.batch([('remove', {'path': source}),
+                 ('remove', {'path': '{}/arxbad.{}'.format(workspace['folder_out'], data['type'])})])
+
+
+# Фикстура набора поврежденных архивов для негативных тестов
+@pytest.fixture()
+def corrupt_archives(workspace, agent):
+    """
+    Создает из одного корректного архива поврежденные копии (обрезка и инверсия бита в заголовке, данных
+    и конечном заголовке, порча CRC) одним удаленным вызовом и удаляет их после теста.
+
+    Возвращает:
+    dict: Имя варианта -> путь, смещение повреждения и размер файла (см. corrupt.make_variants).
+    """
+    source = '{}/arxsrc.{}'.format(workspace['folder_out'], data['type'])
+    outdir = '{}/corrupt'.format(workspace['folder_out'])
+    ex.check('cd {}; 7z a {} -t{}'.format(workspace['folder_in'], source, data['type']), 'Everything is Ok')
+    yield make_variants(ex, source, outdir)
+    extracted = '{}/corrupt'.format(workspace['folder_ext'])
+    agent.batch([('remove', {'path': path}) for path in (source, outdir, extracted)])
 
 
 # Фикстура для вывода времени начала и окончания теста
@@ -0,0 +1,152 @@
+import json
+import shlex
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Вариант повреждения архива:
+# kind - 'truncate' (обрезка), 'flip' (инверсия бита) или 'crc' (порча 4 байт: в header и footer - поля контрольной
+# суммы заголовка, в stream - упакованных данных, чтобы не сошлась контрольная сумма распакованных данных),
+# region - область архива: 'header' (сигнатурный заголовок), 'stream' (упакованные данные), 'footer' (конечный заголовок),
+# offset - явное смещение (отрицательное - от конца файла) вместо середины области, bit - номер инвертируемого бита
+CorruptVariant = namedtuple('CorruptVariant', ['name', 'kind', 'region', 'offset', 'bit'], defaults=(None, 0))
+
+DEFAULT_VARIANTS = (
+    CorruptVariant('truncate_header', 'truncate', 'header'),
+    CorruptVariant('truncate_stream', 'truncate', 'stream'),
+    CorruptVariant('truncate_footer', 'truncate', 'footer'),
+    CorruptVariant('flip_header', 'flip', 'header'),
+    CorruptVariant('flip_stream', 'flip', 'stream'),
+    CorruptVariant('flip_footer', 'flip', 'footer'),
+    CorruptVariant('crc_mismatch', 'crc', 'header'),
+    CorruptVariant('crc_stream', 'crc', 'stream'),
+    CorruptVariant('crc_footer', 'crc', 'footer'),
+)
+
+# Результат проверки варианта: op - операция 7z ('t' или 'e'), detected - 7z завершилась с ошибкой,
+# elapsed - время до ответа 7z в секундах
+Detection = namedtuple('Detection', ['name', 'kind', 'region', 'op', 'detected', 'elapsed', 'output'])
+
+# Все варианты строятся на проверяемой машине одним вызовом python3: исходный архив читается один раз,
+# границы областей для 7z берутся из сигнатурного заголовка (смещение и размер конечного заголовка),
+# для других форматов - приблизительно (первые и последние 32 байта)
+_CORRUPT_SCRIPT = r'''
+import json, os, struct, sys
+source, outdir, variants = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+with open(source, 'rb') as f:
+    data = f.read()
+size = len(data)
+if data[:6] == b'7z\xbc\xaf\x27\x1c' and size >= 32:
+    next_offset, next_size = struct.unpack('<QQ', data[12:28])
+    end = min(size, 32 + next_offset)
+    regions = {'header': (0, 32), 'stream': (32, end), 'footer': (end, min(size, end + next_size))}
+    # CRC стартового заголовка и CRC конечного заголовка (поле NextHeaderCRC стартового заголовка)
+    crc_offsets = {'header': 8, 'footer': 28}
+else:
+    edge = min(32, size // 3)
+    regions = {'header': (0, edge), 'stream': (edge, size - edge), 'footer': (size - edge, size)}
+    # CRC-32 файла в локальном заголовке ZIP и в записи центрального каталога
+    central = data.rfind(b'PK\x01\x02')
+    crc_offsets = {'header': 14, 'footer': central + 16 if central >= 0 else size - 4}
+os.makedirs(outdir, exist_ok=True)
+ext = os.path.splitext(source)[1]
+result = {}
+for variant in variants:
+    begin, end = regions[variant['region']]
+    if end <= begin:
+        begin, end = 0, size
+    offset = variant['offset']
+    if offset is None:
+        offset = (begin + end) // 2
+        if variant['kind'] == 'crc':
+            # В упакованных данных портятся 4 байта из середины области
+            offset = crc_offsets.get(variant['region'], min(offset, max(0, end - 4)))
+    elif offset < 0:
+        offset += size
+    body = bytearray(data)
+    if variant['kind'] == 'truncate':
+        del body[offset:]
+    elif variant['kind'] == 'flip':
+        body[offset] ^= 1 << variant['bit']
+    else:
+        body[offset:offset + 4] = bytes(b ^ 0xFF for b in body[offset:offset + 4])
+    path = os.path.join(outdir, variant['name'] + ext)
+    with open(path, 'wb') as f:
+        f.write(body)
+    result[variant['name']] = {'path': path, 'offset': offset, 'size': len(body)}
+print(json.dumps(result))
+'''
+
+
+def make_variants(executor, archive, outdir, variants=DEFAULT_VARIANTS):
+    """
+    Строит поврежденные копии корректного архива одним вызовом на проверяемой машине.
+
+    Параметры:
+    executor (Executor): Исполнитель команд на проверяемой машине.
+    archive (str): Путь к корректному архиву.
+    outdir (str): Каталог для поврежденных копий.
+    variants (tuple): Варианты повреждений (CorruptVariant).
+
+    Возвращает:
+    dict: Имя варианта -> словарь с путем к файлу ('path'), смещением повреждения ('offset') и размером ('size').
+    При ошибке скрипта (например, архив не найден) выбрасывается CommandError с его stderr.
+    """
+    spec = json.dumps([variant._asdict() for variant in variants])
+    cmd = 'python3 -c {} {} {} {}'.format(shlex.quote(_CORRUPT_SCRIPT), shlex.quote(archive),
+                                          shlex.quote(outdir), shlex.quote(spec))
+    return executor.run_json(cmd, label='corrupt variants {}'.format(archive))
+
+
+def check_variants(executor, variants, paths, extract_dir, ops=('t', 'e'), batches=4):
+    """
+    Проверяет, что 7z обнаруживает повреждение каждого варианта.
+
+    Проверки делятся на batches пакетов, пакеты выполняются параллельно (каждый - одним обращением).
+
+    Параметры:
+    executor (Executor): Исполнитель команд на проверяемой машине.
+    variants (tuple): Варианты повреждений (CorruptVariant).
+    paths (dict): Результат make_variants.
+    extract_dir (str): Каталог для распаковки (для операции 'e' - подкаталог на каждый вариант).
+    ops (tuple): Операции 7z: 't' - проверка целостности, 'e' - распаковка.
+    batches (int): Количество параллельных пакетов.
+
+    Возвращает:
+    list: Detection в порядке вариантов и операций.
+    """
+    cases = []
+    for variant in variants:
+        path = shlex.quote(paths[variant.name]['path'])
+        for op in ops:
+            if op == 'e':
+                cmd = '7z e {} -o{} -y'.format(path, shlex.quote('{}/{}'.format(extract_dir, variant.name)))
+            else:
+                cmd = '7z {} {}'.format(op, path)
+            cases.append((variant, op, cmd))
+    # Повреждение обнаружено, если 7z завершилась с ошибкой (ожидаемый текст не задан)
+    chunks = [cases[i::batches] for i in range(max(1, batches))]
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        results = list(pool.map(lambda chunk: executor.batch([(cmd, '', False) for _, _, cmd in chunk]), chunks))
+    detections = {}
+    for chunk, chunk_results in zip(chunks, results):
+        for (variant, op, _), result in zip(chunk, chunk_results):
+            detections[(variant.name, op)] = Detection(variant.name, variant.kind, variant.region, op,
+                                                       result.matched, result.elapsed, result.stdout + result.stderr)
+    return [detections[(variant.name, op)] for variant, op, _ in cases]
+
+
+def summarize(detections):
+    """
+    Сводка по классам повреждений (kind/region) и операциям.
+
+    Возвращает:
+    dict: 'kind/region' -> операция -> {'detected': обнаружены все варианты класса, 'latency': максимальное время}.
+    """
+    summary = {}
+    for detection in detections:
+        entry = summary.setdefault('{}/{}'.format(detection.kind, detection.region), {}).setdefault(
+            detection.op, {'detected': True, 'latency': 0.0})
+        entry['detected'] = entry['detected'] and detection.detected
+        if detection.elapsed is not None:
+            entry['latency'] = max(entry['latency'], detection.elapsed)
+    return summary
@@ -0,0 +1,164 @@
+import math
+import threading
+import time
+from array import array
+
+# Удаленный цикл чтения /proc/stat: завершается сам, как только канал закрыт и запись в него не удается
+SAMPLER_CMD = "while grep '^cpu' /proc/stat && echo; do sleep {interval}; done"
+
+
+def _percentile(values, percent):
+    """
+    Возвращает перцентиль (метод ближайшего ранга) для непустой последовательности.
+    """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class CpuSampler:
+    """
+    Фоновый сборщик загрузки процессора удаленной машины.
+
+    Читает /proc/stat через одну долгоживущую команду (для SSH - один канал) с заданной частотой и хранит
+    компактный временной ряд загрузки (array) для общего счетчика 'cpu' и каждого ядра.
+    Для статистики по тесту достаточно вызвать start_window() в начале теста
+    и window_stats() в конце - без запуска дополнительных процессов на удаленной машине.
+    Если команда сбора завершилась раньше stop(), причина сохраняется в error и выводится.
+    """
+
+    def __init__(self, executor, interval=0.5):
+        self.executor = executor
+        self.interval = interval
+        self._series = {}
+        self._times = array('d')
+        self._window = 0
+        self._lock = threading.Lock()
+        self._stream = None
+        self._thread = None
+        self._stopping = False
+        self.error = None
+
+    def start(self):
+        """
+        Запускает сбор в фоновом потоке.
+        """
+        self._stream = self.executor.stream(SAMPLER_CMD.format(interval=self.interval), use_deadline=False)
+        self._thread = threading.Thread(target=self._run, name='cpu-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Останавливает сбор и закрывает канал.
+        """
+        if self._stream is not None:
+            self._stopping = True
+            self._stream.close()
+            self._thread.join()
+            self._stream = None
+
+    @staticmethod
+    def _ticks(fields):
+        # cpu user nice system idle iowait irq softirq steal ...; остальные строки (например, сообщения
+        # оболочки в stderr) пропускаются
+        if not fields[0].startswith('cpu') or len(fields) < 6:
+            return None
+        try:
+            return [int(v) for v in fields[1:9]]
+        except ValueError:
+            return None
+
+    def _run(self):
+        stream = self._stream
+        previous = {}
+        block = {}
+        try:
+            for line in stream:
+                fields = line.split()
+                if not fields:
+                    self._add_sample(previous, block)
+                    previous, block = block, {}
+                    continue
+                ticks = self._ticks(fields)
+                if ticks is not None:
+                    block[fields[0]] = (sum(ticks), ticks[3] + ticks[4])
+        except Exception as e:
+            if not self._stopping:
+                self.error = 'ошибка чтения: {}'.format(e)
+        else:
+            if not self._stopping:
+                self.error = 'команда сбора завершилась (код возврата {})'.format(stream.exit_code)
+        if self.error is not None:
+            print('Сбор загрузки процессора остановлен: {}'.format(self.error))
+
+    def _add_sample(self, previous, block):
+        if not previous:
+            return
+        with self._lock:
+            self._times.append(time.monotonic())
+            for name, (total, idle) in block.items():
+                prev_total, prev_idle = previous.get(name, (total, idle))
+                delta = total - prev_total
+                usage = 100.0 * (delta - (idle - prev_idle)) / delta if delta > 0 else 0.0
+                series = self._series.setdefault(name, array('f', [0.0] * (len(self._times) - 1)))
+                series.append(usage)
+
+    def start_window(self):
+        """
+        Отмечает начало окна статистики (начало теста).
+        """
+        with self._lock:
+            self._window = len(self._times)
+
+    def window_stats(self):
+        """
+        Возвращает статистику загрузки процессора с начала текущего окна.
+
+        Возвращает:
+        dict: Ключи 'max', 'mean', 'p95' (общая загрузка в процентах, None при отсутствии замеров),
+              'samples' (количество замеров), 'cores' - максимальная загрузка каждого ядра
+              и 'error' - причина остановки сбора (None, если сбор идет).
+        """
+        error = self.error
+        with self._lock:
+            total = self._series.get('cpu', array('f'))[self._window:]
+            cores = {name: max(series[self._window:])
+                     for name, series in self._series.items()
+                     if name != 'cpu' and len(series) > self._window}
+        if not total:
+            return {'max': None, 'mean': None, 'p95': None, 'samples': 0, 'cores': cores, 'error': error}
+        return {
+            'max': max(total),
+            'mean': sum(total) / len(total),
+            'p95': _percentile(total, 95),
+            'samples': len(total),
+            'cores': cores,
+            'error': error,
+        }
+
+
+_samplers = {}
+_samplers_lock = threading.Lock()
+
+
+def get_sampler(executor, interval=0.5):
+    """
+    Возвращает запущенный сборщик для исполнителя, создавая его при первом обращении.
+    """
+    with _samplers_lock:
+        sampler = _samplers.get(executor.key)
+        if sampler is None:
+            sampler = CpuSampler(executor, interval)
+            sampler.start()
+            _samplers[executor.key] = sampler
+        return sampler
+
+
+def stop_all():
+    """
+    Останавливает все запущенные сборщики.
+    """
+    with _samplers_lock:
+        for sampler in _samplers.values():
+            sampler.stop()
+        _samplers.clear()
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import shlex
+from collections import namedtuple
+
+# Описание набора тестовых данных:
+# seed - зерно генератора, count - количество файлов, size_min/size_max - диапазон размеров файла в байтах,
+# compressibility - доля нулевых байт в файле (0 - случайные данные, 1 - одни нули),
+# depth - глубина вложенности каталогов (файлы распределяются по уровням 0..depth)
+DatasetSpec = namedtuple('DatasetSpec', ['seed', 'count', 'size_min', 'size_max', 'compressibility', 'depth'])
+
+# Генератор выполняется на проверяемой машине одним вызовом python3:
+# если дерево с таким ключом уже собрано (есть .complete), оно переиспользуется,
+# иначе строится заново; затем при превышении бюджета удаляются давно не использованные деревья
+# и, при необходимости, дерево копируется в целевой каталог.
+_GENERATOR_SCRIPT = r'''
+import fcntl, json, os, random, shutil, string, sys, time
+root, key, spec, budget, target = sys.argv[1], sys.argv[2], json.loads(sys.argv[3]), int(sys.argv[4]), sys.argv[5]
+os.makedirs(root, exist_ok=True)
+# Кэш общий для всех процессов (в том числе pytest-xdist), поэтому работа с ним идет под блокировкой
+lock = open(os.path.join(root, '.lock'), 'w')
+fcntl.flock(lock, fcntl.LOCK_EX)
+path = os.path.join(root, key)
+done = os.path.join(path, '.complete')
+reused = os.path.exists(done)
+if not reused:
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    rng = random.Random(spec['seed'])
+    alphabet = string.ascii_uppercase + string.digits
+    used = set()
+    def name():
+        while True:
+            value = ''.join(rng.choices(alphabet, k=5))
+            if value not in used:
+                used.add(value)
+                return value
+    chain = [name() for _ in range(spec['depth'])]
+    files = []
+    block = 1024 * 1024
+    for i in range(spec['count']):
+        level = spec['depth'] - i % (spec['depth'] + 1)
+        rel = os.path.join(*(chain[:level] + [name()]))
+        os.makedirs(os.path.join(path, os.path.dirname(rel)), exist_ok=True)
+        size = rng.randint(spec['size_min'], spec['size_max'])
+        noise = int(size * (1 - spec['compressibility']))
+        with open(os.path.join(path, rel), 'wb') as f:
+            left = noise
+            while left > 0:
+                n = min(block, left)
+                f.write(rng.getrandbits(8 * n).to_bytes(n, 'little'))
+                left -= n
+            left = size - noise
+            while left > 0:
+                n = min(block, left)
+                f.write(bytes(n))
+                left -= n
+        files.append(rel)
+    with open(os.path.join(path, '.manifest'), 'w') as f:
+        f.write('\n'.join(files))
+    open(done, 'w').close()
+os.utime(done)
+with open(os.path.join(path, '.manifest')) as f:
+    files = [line for line in f.read().split('\n') if line]
+def tree_size(p):
+    return sum(os.path.getsize(os.path.join(d, n)) for d, _, names in os.walk(p) for n in names)
+trees = []
+for entry in os.listdir(root):
+    marker = os.path.join(root, entry, '.complete')
+    if entry != key and os.path.exists(marker):
+        trees.append((os.path.getmtime(marker), os.path.join(root, entry)))
+total = tree_size(path) + sum(tree_size(p) for _, p in trees)
+evicted = []
+for _, p in sorted(trees):
+    if total <= budget:
+        break
+    total -= tree_size(p)
+    shutil.rmtree(p, ignore_errors=True)
+    evicted.append(p)
+if target:
+    os.makedirs(target, exist_ok=True)
+    for rel in files:
+        os.makedirs(os.path.join(target, os.path.dirname(rel)), exist_ok=True)
+        shutil.copyfile(os.path.join(path, rel), os.path.join(target, rel))
+print(json.dumps({'path': path, 'files': files, 'reused': reused, 'evicted': evicted}))
+'''
+
+
+def spec_hash(spec):
+    """
+    Возвращает ключ набора данных - хэш содержимого его описания.
+    """
+    return hashlib.sha256(json.dumps(spec._asdict(), sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _generator_cmd(spec, root, budget_mb, target):
+    return 'python3 -c {} {} {} {} {} {}'.format(
+        shlex.quote(_GENERATOR_SCRIPT), shlex.quote(root), spec_hash(spec),
+        shlex.quote(json.dumps(spec._asdict())), budget_mb * 1024 * 1024, shlex.quote(target))
+
+
+def ensure_dataset(executor, spec, root, budget_mb=1024, target=''):
+    """
+    Создает (или переиспользует уже созданный) набор данных на проверяемой машине одним вызовом.
+
+    Параметры:
+    executor (Executor): Исполнитель команд на проверяемой машине.
+    spec (DatasetSpec): Описание набора данных.
+    root (str): Каталог кэша наборов данных на удаленной машине.
+    budget_mb (int): Бюджет дискового пространства кэша в МБ; при превышении удаляются давно не использованные наборы.
+    target (str): Каталог, в который нужно скопировать дерево набора. По умолчанию не копируется.
+
+    Возвращает:
+    dict: Ключи 'path' (каталог набора в кэше), 'files' (относительные пути файлов),
+          'reused' (набор взят из кэша) и 'evicted' (удаленные из кэша наборы).
+    При ошибке генератора выбрасывается CommandError с его stderr.
+    """
+    return executor.run_json(_generator_cmd(spec, root, budget_mb, target), label='dataset generator {}'.format(root))
+
+
+async def ensure_dataset_async(executor, spec, root, budget_mb=1024, target=''):
+    """
+    Асинхронный вариант ensure_dataset (несколько наборов готовятся одновременно, см. async_ssh.run_all).
+    """
+    return await executor.run_json_async(_generator_cmd(spec, root, budget_mb, target),
+                                         label='dataset generator {}'.format(root))
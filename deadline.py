@@ -0,0 +1,88 @@
+import threading
+import time
+
+
+class CommandTimeout(Exception):
+    """
+    Команда не завершилась за отведенное время (reason='deadline') или перестала выводить данные (reason='stall').
+    Удаленная группа процессов команды к этому моменту уже завершена.
+    """
+
+    def __init__(self, cmd, seconds, reason='deadline'):
+        self.cmd = cmd
+        self.seconds = seconds
+        self.reason = reason
+        what = 'нет вывода' if reason == 'stall' else 'превышено время'
+        super().__init__('{} ({:.1f}s): {}'.format(what, seconds, cmd))
+
+
+# Срок окончания текущего теста (time.monotonic()) или None; задается фикстурой conftest
+_test_deadline = None
+_lock = threading.Lock()
+
+
+def set_test_deadline(seconds):
+    """
+    Задает срок для всех команд текущего теста: через seconds секунд от текущего момента (None - без срока).
+    """
+    global _test_deadline
+    with _lock:
+        _test_deadline = None if seconds is None else time.monotonic() + seconds
+
+
+def remaining(timeout=None):
+    """
+    Возвращает время, отведенное команде: меньшее из timeout и остатка срока теста (None - без ограничения).
+    """
+    with _lock:
+        test_deadline = _test_deadline
+    if test_deadline is None:
+        return timeout
+    left = test_deadline - time.monotonic()
+    return left if timeout is None else min(timeout, left)
+
+
+class Watchdog:
+    """
+    Отслеживание срока выполнения команды и простоя ее вывода.
+
+    Параметры:
+    cmd (str): Команда (для сообщения об ошибке).
+    timeout (float): Допустимое время выполнения в секундах (None - без ограничения).
+    stall_timeout (float): Допустимое время без вывода в секундах (None - без ограничения).
+    """
+
+    def __init__(self, cmd, timeout=None, stall_timeout=None):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        now = time.monotonic()
+        self.started = now
+        self.last_output = now
+
+    def output(self):
+        """
+        Отмечает получение вывода.
+        """
+        self.last_output = time.monotonic()
+
+    def wait_time(self, limit):
+        """
+        Возвращает, сколько можно ждать данных (не больше limit), чтобы не пропустить срок.
+        """
+        now = time.monotonic()
+        for start, seconds in ((self.started, self.timeout), (self.last_output, self.stall_timeout)):
+            if seconds is not None:
+                limit = min(limit, max(0.0, start + seconds - now))
+        return limit
+
+    def expired(self):
+        """
+        Возвращает CommandTimeout, если срок выполнения или простоя истек, иначе None.
+        """
+        now = time.monotonic()
+        if self.timeout is not None and now - self.started >= self.timeout:
+            return CommandTimeout(self.cmd, self.timeout, 'deadline')
+        if self.stall_timeout is not None and now - self.last_output >= self.stall_timeout:
+            return CommandTimeout(self.cmd, self.stall_timeout, 'stall')
+        return None
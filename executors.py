@@ -0,0 +1,450 @@
+import asyncio
+import codecs
+import functools
+import json
+import os
+import selectors
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ssh_utils
+import async_ssh
+import deadline
+import timing
+from deadline import CommandTimeout, Watchdog
+from ssh_utils import BatchResult, TransferStats, _lines, _matches, _stream_check, _stream_run
+
+
+class CommandError(Exception):
+    """
+    Вспомогательная команда на проверяемой машине завершилась с ошибкой (в сообщении - код возврата и stderr).
+    """
+
+
+class Executor:
+    """
+    Общий интерфейс выполнения команд и передачи файлов.
+
+    Проверки (check, check_negative) и получение вывода (run, getout) построены поверх stream(),
+    поэтому одинаково работают для любого способа запуска: бэкенду достаточно реализовать
+    stream, batch, put и get.
+    """
+
+    # Ключ исполнителя: по нему разделяются курсоры журнала, сборщики загрузки и т.п.
+    key = None
+    # Допустимое время выполнения команды и время без вывода в секундах по умолчанию (None - без ограничения)
+    timeout = None
+    stall_timeout = None
+
+    def _limits(self, timeout, use_deadline):
+        """
+        Возвращает пару (timeout, stall_timeout) для команды: явный timeout или timeout исполнителя,
+        урезанный до остатка срока текущего теста. use_deadline=False - без ограничений (фоновые команды).
+        """
+        if not use_deadline:
+            return timeout, None
+        return deadline.remaining(self.timeout if timeout is None else timeout), self.stall_timeout
+
+    def stream(self, cmd, label=None, timeout=None, use_deadline=True):
+        """
+        Запускает команду и возвращает поток ее вывода (chunks(), итерация по строкам, exit_code).
+        label - команда, по которой группируются замеры времени, если cmd - обертка над ней.
+        timeout - допустимое время выполнения в секундах (по умолчанию timeout исполнителя);
+        при его истечении, простое вывода дольше stall_timeout или окончании срока теста команда
+        завершается вместе с дочерними процессами и выбрасывается CommandTimeout.
+        use_deadline=False - команда не ограничивается сроками (долгоживущие фоновые команды).
+        """
+        raise NotImplementedError
+
+    def run(self, cmd, stats=None, label=None, timeout=None, streams=('out', 'err')):
+        """
+        Выполняет команду.
+
+        Параметры:
+        cmd (str): Команда для выполнения.
+        stats (list): Если передан, в него добавляются данные о потребленных командой ресурсах (см. with_rusage).
+        label (str): Название команды для замеров времени (например, для длинных скриптов). По умолчанию cmd.
+        timeout (float): Допустимое время выполнения в секундах. По умолчанию timeout исполнителя.
+        streams (tuple): Потоки вывода, попадающие в результат: 'out' (stdout) и/или 'err' (stderr).
+
+        Возвращает:
+        tuple: Код возврата и вывод команды (по умолчанию stdout, затем stderr) в виде строки.
+        """
+        return _stream_run(lambda command, name: self.stream(command, label=name, timeout=timeout), cmd, stats, label,
+                           streams)
+
+    def getout(self, cmd, stats=None, label=None, timeout=None, streams=('out', 'err')):
+        """
+        Выполняет команду и возвращает ее вывод (по умолчанию stdout и stderr) в виде строки.
+        """
+        return self.run(cmd, stats, label, timeout, streams)[1]
+
+    def run_json(self, cmd, label=None, timeout=None):
+        """
+        Выполняет вспомогательную команду (скрипт python3 на проверяемой машине), которая печатает результат
+        последней строкой stdout в формате JSON.
+
+        Возвращает:
+        Разобранный результат. Если команда завершилась с ошибкой или не напечатала результат,
+        выбрасывается CommandError с кодом возврата и stderr команды.
+        """
+        stream = self.stream(cmd, label=label or cmd, timeout=timeout)
+        parts = {'out': [], 'err': []}
+        for name, chunk in stream.chunks():
+            parts[name].append(chunk)
+        out, err = ''.join(parts['out']).strip(), ''.join(parts['err']).strip()
+        if stream.exit_code != 0 or not out:
+            raise CommandError('{}: код возврата {}, stderr: {}'.format(label or cmd, stream.exit_code, err or '(пусто)'))
+        return json.loads(out.splitlines()[-1])
+
+    def _check(self, cmd, text, expect_success, stats, timeout, streams):
+        return _stream_check(lambda command, label: self.stream(command, label=label, timeout=timeout),
+                             cmd, text, expect_success, stats, streams)
+
+    def check(self, cmd, text, stats=None, timeout=None, streams=('out', 'err')):
+        """
+        Возвращает True, если текст найден в выводе команды (по умолчанию в stdout или stderr)
+        и команда завершилась успешно (код возврата 0).
+        """
+        return self._check(cmd, text, True, stats, timeout, streams)
+
+    def check_negative(self, cmd, text, stats=None, timeout=None, streams=('out', 'err')):
+        """
+        Возвращает True, если текст найден в выводе команды и команда завершилась с ошибкой.
+        """
+        return self._check(cmd, text, False, stats, timeout, streams)
+
+    async def _in_thread(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def run_async(self, cmd, label=None, timeout=None):
+        """
+        Асинхронный вариант run (для одновременного выполнения многих команд в одном цикле событий,
+        см. async_ssh.run_all). По умолчанию run выполняется в пуле потоков цикла событий.
+        """
+        return await self._in_thread(self.run, cmd, label=label, timeout=timeout)
+
+    async def getout_async(self, cmd, label=None, timeout=None):
+        """
+        Асинхронный вариант getout.
+        """
+        return (await self.run_async(cmd, label, timeout))[1]
+
+    async def run_json_async(self, cmd, label=None, timeout=None):
+        """
+        Асинхронный вариант run_json (в пуле потоков цикла событий).
+        """
+        return await self._in_thread(self.run_json, cmd, label=label, timeout=timeout)
+
+    async def check_async(self, cmd, text, timeout=None, streams=('out', 'err')):
+        """
+        Асинхронный вариант check (поиск текста в потоке вывода тот же). По умолчанию check выполняется
+        в пуле потоков цикла событий.
+        """
+        return await self._in_thread(self.check, cmd, text, timeout=timeout, streams=streams)
+
+    async def check_negative_async(self, cmd, text, timeout=None, streams=('out', 'err')):
+        """
+        Асинхронный вариант check_negative.
+        """
+        return await self._in_thread(self.check_negative, cmd, text, timeout=timeout, streams=streams)
+
+    async def put_async(self, local_path, remote_path):
+        """
+        Асинхронный вариант put.
+        """
+        return await self._in_thread(self.put, local_path, remote_path)
+
+    async def get_async(self, remote_path, local_path):
+        """
+        Асинхронный вариант get.
+        """
+        return await self._in_thread(self.get, remote_path, local_path)
+
+    def spawn(self, cmd):
+        """
+        Запускает долгоживущую команду с открытыми stdin и stdout (интерфейс subprocess.Popen: stdin, stdout, kill, wait).
+        """
+        raise NotImplementedError
+
+    def batch(self, checks, timeout=None):
+        """
+        Выполняет пакет проверок (cmd, text, expect_success) и возвращает список BatchResult.
+        timeout - допустимое время выполнения пакета в секундах (по умолчанию ограничен только сроком теста).
+        """
+        raise NotImplementedError
+
+    def put(self, local_path, remote_path):
+        """
+        Передает файл или каталог на машину, где выполняются команды.
+        """
+        raise NotImplementedError
+
+    def get(self, remote_path, local_path):
+        """
+        Забирает файл или каталог с машины, где выполняются команды.
+        """
+        raise NotImplementedError
+
+
+class SSHExecutor(Executor):
+    """
+    Исполнитель на удаленной машине через пуловые SSH-сессии ssh_utils.
+    use_key - подключение по SSH-ключу профиля пула (ssh_utils.pool.profile) вместо пароля.
+    """
+
+    def __init__(self, host, user, passwd, port=22, use_key=False):
+        self.host = host
+        self.user = user
+        self.passwd = passwd
+        self.port = port
+        self.use_key = use_key
+        self.key = ('ssh', host, port, user)
+
+    def stream(self, cmd, label=None, timeout=None, use_deadline=True):
+        timeout, stall_timeout = self._limits(timeout, use_deadline)
+        return ssh_utils.ssh_stream(self.host, self.user, self.passwd, cmd, self.port, self.use_key, label=label,
+                                    timeout=timeout, stall_timeout=stall_timeout)
+
+    async def run_async(self, cmd, label=None, timeout=None):
+        # Каналы читаются в цикле событий, без потока на команду
+        timeout, stall_timeout = self._limits(timeout, True)
+        return await async_ssh.ssh_run(self.host, self.user, self.passwd, cmd, self.port, self.use_key,
+                                       timeout=timeout, label=label, stall_timeout=stall_timeout)
+
+    async def _check_async(self, cmd, text, expect_success, timeout, streams):
+        timeout, stall_timeout = self._limits(timeout, True)
+        return await async_ssh.ssh_check(self.host, self.user, self.passwd, cmd, text, expect_success, self.port,
+                                         self.use_key, timeout, stall_timeout, streams)
+
+    async def check_async(self, cmd, text, timeout=None, streams=('out', 'err')):
+        return await self._check_async(cmd, text, True, timeout, streams)
+
+    async def check_negative_async(self, cmd, text, timeout=None, streams=('out', 'err')):
+        return await self._check_async(cmd, text, False, timeout, streams)
+
+    async def put_async(self, local_path, remote_path):
+        return await async_ssh.upload_files(self.host, self.user, self.passwd, local_path, remote_path, self.port,
+                                            use_key=self.use_key, stall_timeout=self.stall_timeout)
+
+    async def get_async(self, remote_path, local_path):
+        return await async_ssh.download_files(self.host, self.user, self.passwd, remote_path, local_path, self.port,
+                                              use_key=self.use_key, stall_timeout=self.stall_timeout)
+
+    def spawn(self, cmd):
+        return ssh_utils.ssh_process(self.host, self.user, self.passwd, cmd, self.port, self.use_key)
+
+    def batch(self, checks, timeout=None):
+        return ssh_utils.ssh_batch(self.host, self.user, self.passwd, checks, self.port, self.use_key,
+                                   timeout=deadline.remaining(timeout))
+
+    def put(self, local_path, remote_path):
+        return ssh_utils.upload_files(self.host, self.user, self.passwd, local_path, remote_path, self.port,
+                                      use_key=self.use_key, stall_timeout=self.stall_timeout)
+
+    def get(self, remote_path, local_path):
+        return ssh_utils.download_files(self.host, self.user, self.passwd, remote_path, local_path, self.port,
+                                        use_key=self.use_key, stall_timeout=self.stall_timeout)
+
+
+class LocalStream:
+    """
+    Потоковое чтение вывода локального процесса: stdout и stderr читаются одновременно
+    по мере поступления, как в SSHStream.
+    """
+
+    def __init__(self, process, chunk_size=32768, template=None, watchdog=None):
+        self.process = process
+        self.chunk_size = chunk_size
+        self.exit_code = None
+        self.template = template
+        self.watchdog = watchdog
+        self._started = time.monotonic()
+        self._closed = False
+
+    def chunks(self):
+        """
+        Генератор порций вывода: пары (stream, text), где stream - 'out' или 'err'.
+        """
+        selector = selectors.DefaultSelector()
+        selector.register(self.process.stdout, selectors.EVENT_READ, 'out')
+        selector.register(self.process.stderr, selectors.EVENT_READ, 'err')
+        decoders = {'out': codecs.getincrementaldecoder('utf-8')(),
+                    'err': codecs.getincrementaldecoder('utf-8')()}
+        first_byte = False
+        try:
+            while selector.get_map():
+                if self.watchdog is not None:
+                    error = self.watchdog.expired()
+                    if error is not None:
+                        self.close()
+                        raise error
+                events = selector.select(None if self.watchdog is None else self.watchdog.wait_time(1.0))
+                for key, _ in events:
+                    data = os.read(key.fileobj.fileno(), self.chunk_size)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        continue
+                    if self.watchdog is not None:
+                        self.watchdog.output()
+                    if not first_byte and self.template is not None:
+                        timing.recorder.record('first_byte', time.monotonic() - self._started, self.template)
+                    first_byte = True
+                    text = decoders[key.data].decode(data)
+                    if text:
+                        yield key.data, text
+            for name, decoder in decoders.items():
+                text = decoder.decode(b'', final=True)
+                if text:
+                    yield name, text
+            self.exit_code = self.process.wait()
+            if self.template is not None and not self._closed:
+                timing.recorder.record('read', time.monotonic() - self._started, self.template)
+        finally:
+            selector.close()
+            self.close()
+            # Каналы закрываются только здесь: закрытие из другого потока во время select() его не прерывает
+            self.process.stdout.close()
+            self.process.stderr.close()
+
+    def __iter__(self):
+        return _lines(self.chunks())
+
+    def close(self):
+        self._closed = True
+        if self.process.poll() is None:
+            # Команда запущена в своей группе процессов: завершаются и оболочка, и ее дочерние процессы,
+            # иначе они держат открытыми каналы stdout/stderr
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalProcess(subprocess.Popen):
+    """
+    Долгоживущая локальная команда в своей группе процессов: kill завершает и оболочку, и ее дочерние процессы
+    (иначе они держат открытым stdout и чтение из него не прерывается).
+    """
+
+    def kill(self):
+        if self.poll() is None:
+            os.killpg(self.pid, signal.SIGKILL)
+
+
+class LocalExecutor(Executor):
+    """
+    Исполнитель на локальной машине через subprocess - без SSH-обертки, шифрования и копирования по SFTP.
+    Пакеты команд выполняются параллельно в ограниченном пуле потоков.
+    """
+
+    key = ('local',)
+
+    def __init__(self, workers=4):
+        self.workers = workers
+
+    def stream(self, cmd, label=None, timeout=None, use_deadline=True):
+        timeout, stall_timeout = self._limits(timeout, use_deadline)
+        watchdog = None
+        if timeout is not None or stall_timeout is not None:
+            if timeout is not None and timeout <= 0:
+                raise CommandTimeout(label or cmd, 0.0)
+            watchdog = Watchdog(label or cmd, timeout, stall_timeout)
+        template = timing.command_template(label or cmd)
+        with timing.recorder.timed('exec', template):
+            process = subprocess.Popen(cmd, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, start_new_session=True)
+        return LocalStream(process, template=template, watchdog=watchdog)
+
+    def spawn(self, cmd):
+        return LocalProcess(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+    def run_many(self, cmds, stats=None):
+        """
+        Выполняет команды параллельно (не больше workers одновременно).
+
+        Возвращает:
+        list: Пары (код возврата, вывод) в порядке команд.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(lambda cmd: self.run(cmd, stats), cmds))
+
+    def batch(self, checks, timeout=None):
+        timeout = deadline.remaining(timeout)
+        batch_deadline = None if timeout is None else time.monotonic() + timeout
+
+        def run(check):
+            cmd, text, expect_success = check
+            start = time.monotonic()
+            process = subprocess.Popen(cmd, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, start_new_session=True)
+            try:
+                out, err = process.communicate(
+                    timeout=None if batch_deadline is None else max(0.0, batch_deadline - start))
+            except subprocess.TimeoutExpired:
+                # Как в LocalStream.close: завершается вся группа процессов команды
+                os.killpg(process.pid, signal.SIGKILL)
+                process.communicate()
+                raise CommandTimeout(cmd, time.monotonic() - start)
+            elapsed = time.monotonic() - start
+            stdout = out.decode('utf-8')
+            stderr = err.decode('utf-8')
+            return BatchResult(cmd, process.returncode, stdout, stderr,
+                               _matches(stdout + stderr, process.returncode, text, expect_success), elapsed)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(run, checks))
+
+    @staticmethod
+    def _copy(source, target):
+        start = time.monotonic()
+        if os.path.exists(target) and os.path.samefile(source, target):
+            return TransferStats(1, 1, 0, time.monotonic() - start)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, dirs_exist_ok=True)
+            sizes = [os.path.getsize(os.path.join(d, n)) for d, _, names in os.walk(source) for n in names]
+        else:
+            shutil.copyfile(source, target)
+            sizes = [os.path.getsize(source)]
+        return TransferStats(len(sizes), 0, sum(sizes), time.monotonic() - start)
+
+    def put(self, local_path, remote_path):
+        return self._copy(local_path, remote_path)
+
+    def get(self, remote_path, local_path):
+        return self._copy(remote_path, local_path)
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(data):
+    """
+    Возвращает исполнитель для хоста из конфигурации: backend: local - локальный subprocess,
+    backend: ssh (по умолчанию) - SSH к ip/prt с user/passwd. Исполнители кэшируются.
+    Ограничения команд по умолчанию берутся из command_timeout и stall_timeout.
+    """
+    with _executors_lock:
+        if data.get('backend', 'ssh') == 'local':
+            key = ('local',)
+            if key not in _executors:
+                _executors[key] = LocalExecutor(data.get('local_workers', 4))
+        else:
+            key = ('ssh', data['ip'], data.get('prt', 22), data['user'])
+            if key not in _executors:
+                _executors[key] = SSHExecutor(data['ip'], data['user'], data['passwd'], data.get('prt', 22),
+                                              data.get('use_key', False))
+        executor = _executors[key]
+        executor.timeout = data.get('command_timeout')
+        executor.stall_timeout = data.get('stall_timeout')
+        return executor
@@ -0,0 +1,174 @@
+# Запуск тестов на парке хостов.
+#
+# Список хостов задается в config.yaml ключом hosts (или файлом inventory). Для каждого хоста
+# сценарии (файлы тестов) запускаются отдельным процессом pytest с переменной окружения FLEET_HOST,
+# по которой apply_host подставляет параметры хоста в конфигурацию. Одновременно выполняется
+# не больше fleet_concurrency запусков всего и не больше fleet_per_host на один хост.
+#
+# Пример: python fleet.py --concurrency 8 test_positive.py test_negative.py
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+import yaml
+
+import config
+# Ключи конфигурации, которые можно переопределить для отдельного хоста
+HOST_KEYS = ('ip', 'prt', 'user', 'passwd', 'backend')
+
+DEFAULT_FLOWS = ('test_positive.py', 'test_negative.py')
+
+
+def load_hosts(data):
+    """
+    Возвращает список хостов парка из config.yaml (ключ hosts) или из inventory-файла.
+
+    Каждый хост - словарь с ключом name и параметрами подключения; отсутствующие параметры
+    берутся из основной конфигурации. Если парк не задан, возвращается один основной хост.
+    """
+    hosts = data.get('hosts') or []
+    if data.get('inventory'):
+        with open(data['inventory']) as f:
+            inventory = yaml.safe_load(f) or []
+        hosts = inventory.get('hosts', []) if isinstance(inventory, dict) else inventory
+    if not hosts:
+        hosts = [{}]
+    result = []
+    for host in hosts:
+        entry = {key: data.get(key) for key in HOST_KEYS}
+        entry.update(host)
+        entry.setdefault('name', entry['ip'])
+        result.append(entry)
+    return result
+
+
+def apply_host(data):
+    """
+    Подставляет в конфигурацию параметры хоста, выбранного переменной окружения FLEET_HOST.
+    Логи такого запуска пишутся в отдельный каталог fleet_reports/<имя хоста>.
+    """
+    name = os.environ.get('FLEET_HOST')
+    if not name:
+        return data
+    for host in load_hosts(data):
+        if host['name'] == name:
+            data.update({key: value for key, value in host.items() if key != 'name'})
+            data['log_dir'] = os.path.join(data.get('fleet_reports', 'fleet_reports'), name)
+            os.makedirs(data['log_dir'], exist_ok=True)
+            return data
+    raise ValueError('хост {} не найден в конфигурации'.format(name))
+
+
+def _junit_summary(path):
+    """
+    Возвращает сводку отчета junitxml: количество тестов, падений, ошибок, пропусков и время.
+    """
+    summary = {'tests': 0, 'failures': 0, 'errors': 0, 'skipped': 0, 'time': 0.0}
+    if not os.path.exists(path):
+        summary['errors'] = 1
+        return summary
+    for suite in ET.parse(path).getroot().iter('testsuite'):
+        for key in ('tests', 'failures', 'errors', 'skipped'):
+            summary[key] += int(suite.get(key, 0))
+        summary['time'] += float(suite.get('time', 0))
+    return summary
+
+
+def run_fleet(data, flows=DEFAULT_FLOWS, concurrency=4, per_host=1, pytest_args=()):
+    """
+    Запускает сценарии на всех хостах парка с ограничением параллельности.
+
+    Параметры:
+    data (dict): Конфигурация из config.yaml.
+    flows (tuple): Файлы тестов, которые выполняются на каждом хосте (в этом порядке при per_host=1).
+    concurrency (int): Максимальное число одновременных запусков pytest на весь парк.
+    per_host (int): Максимальное число одновременных запусков pytest на один хост.
+    pytest_args (tuple): Дополнительные аргументы pytest.
+
+    Возвращает:
+    dict: Отчет по парку: результаты по каждому хосту и сценарию и общая сводка.
+    """
+    reports = data.get('fleet_reports', 'fleet_reports')
+    limit = threading.BoundedSemaphore(concurrency)
+    results = {}
+    lock = threading.Lock()
+
+    def run_flow(host, flow):
+        folder = os.path.join(reports, host['name'])
+        os.makedirs(folder, exist_ok=True)
+        junit = os.path.join(folder, os.path.splitext(os.path.basename(flow))[0] + '.xml')
+        env = dict(os.environ, FLEET_HOST=host['name'])
+        with limit:
+            start = time.monotonic()
+            with open(os.path.join(folder, os.path.basename(flow) + '.log'), 'w') as log:
+                code = subprocess.call([sys.executable, '-m', 'pytest', flow, '-q', '--junitxml', junit]
+                                       + list(pytest_args), env=env, stdout=log, stderr=subprocess.STDOUT)
+            elapsed = time.monotonic() - start
+        summary = _junit_summary(junit)
+        summary.update({'exit_code': code, 'wall': elapsed})
+        with lock:
+            results.setdefault(host['name'], {})[flow] = summary
+
+    def lane(host, queue):
+        while True:
+            with lock:
+                if not queue:
+                    return
+                flow = queue.pop(0)
+            run_flow(host, flow)
+
+    start = time.monotonic()
+    threads = []
+    for host in load_hosts(data):
+        queue = list(flows)
+        for _ in range(max(1, per_host)):
+            threads.append(threading.Thread(target=lane, args=(host, queue)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = {'hosts': len(results), 'failed_hosts': [], 'tests': 0, 'failures': 0, 'errors': 0,
+             'skipped': 0, 'wall': time.monotonic() - start}
+    for name, flows_result in sorted(results.items()):
+        failed = False
+        for summary in flows_result.values():
+            for key in ('tests', 'failures', 'errors', 'skipped'):
+                total[key] += summary[key]
+            failed = failed or summary['exit_code'] != 0
+        if failed:
+            total['failed_hosts'].append(name)
+    report = {'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'hosts': results, 'total': total}
+    os.makedirs(reports, exist_ok=True)
+    with open(os.path.join(reports, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return report
+
+
+def main():
+    data = config.get_config()
+    parser = argparse.ArgumentParser(description='Запуск тестов на парке хостов')
+    parser.add_argument('flows', nargs='*', default=list(DEFAULT_FLOWS), help='файлы тестов')
+    parser.add_argument('--concurrency', type=int, default=data.get('fleet_concurrency', 4),
+                        help='максимум одновременных запусков на весь парк')
+    parser.add_argument('--per-host', type=int, default=data.get('fleet_per_host', 1),
+                        help='максимум одновременных запусков на один хост')
+    args, pytest_args = parser.parse_known_args()
+    report = run_fleet(data, args.flows, args.concurrency, args.per_host, pytest_args)
+    for name, flows_result in sorted(report['hosts'].items()):
+        for flow, summary in sorted(flows_result.items()):
+            print('{:<20} {:<20} tests {tests:<4} failures {failures:<4} errors {errors:<4} {wall:.1f}s'.format(
+                name, flow, **summary))
+    total = report['total']
+    print('Итого: хостов {hosts}, тестов {tests}, падений {failures}, ошибок {errors}, {wall:.1f}s'.format(**total))
+    return 1 if total['failed_hosts'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import gzip
+import shlex
+import threading
+
+CURSOR_PREFIX = '-- cursor: '
+
+
+class JournalCollector:
+    """
+    Инкрементальный сбор системного журнала с проверяемой машины.
+
+    После каждого сбора запоминается курсор journalctl (--show-cursor), и следующий сбор
+    для того же исполнителя и тех же фильтров забирает только новые записи (--after-cursor).
+    Записи читаются потоком и сразу пишутся на диск в gzip, фильтрация по юнитам
+    и приоритету выполняется на стороне journalctl.
+    """
+
+    def __init__(self):
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _command(since, cursor, units, priority):
+        parts = ['journalctl', '--no-pager', '--show-cursor']
+        if cursor:
+            parts.append('--after-cursor={}'.format(shlex.quote(cursor)))
+        else:
+            parts.append('--since {}'.format(shlex.quote(since)))
+        for unit in units:
+            parts.append('-u {}'.format(shlex.quote(unit)))
+        if priority is not None:
+            parts.append('-p {}'.format(shlex.quote(str(priority))))
+        return ' '.join(parts)
+
+    def collect(self, executor, since, path, units=None, priority=None):
+        """
+        Сохраняет новые записи журнала в сжатый файл.
+
+        Параметры:
+        executor (Executor): Исполнитель команд на проверяемой машине.
+        since (str): Время начала логирования, используется, пока курсор для хоста неизвестен.
+        path (str): Имя файла для сохранения лога (gzip).
+        units (list): Юниты systemd для фильтрации (-u). По умолчанию без фильтра.
+        priority (str): Максимальный приоритет записей (-p). По умолчанию без фильтра.
+
+        Возвращает:
+        int: Количество сохраненных строк журнала.
+        """
+        units = tuple(units or ())
+        key = (executor.key, units, priority)
+        with self._lock:
+            cursor = self._cursors.get(key)
+        count = 0
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for line in executor.stream(self._command(since, cursor, units, priority)):
+                if line.startswith(CURSOR_PREFIX):
+                    cursor = line[len(CURSOR_PREFIX):].strip()
+                    continue
+                f.write(line)
+                count += 1
+        if cursor:
+            with self._lock:
+                self._cursors[key] = cursor
+        return count
+
+
+# Общий сборщик журнала: курсоры сохраняются между тестами всех модулей
+collector = JournalCollector()
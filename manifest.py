@@ -0,0 +1,78 @@
+import shlex
+
+# Названия алгоритмов для ключа 7z -scrc<method> и для манифеста агента
+_7Z_METHODS = {'crc32': 'CRC32', 'crc64': 'CRC64', 'sha1': 'SHA1', 'sha256': 'SHA256'}
+
+
+def hash_cmd(files, algos=('crc32', 'sha256')):
+    """
+    Возвращает команду 7z h, которая за один запуск считает хэши всех файлов выбранными алгоритмами.
+    """
+    return '7z h {} {}'.format(' '.join('-scrc' + _7Z_METHODS[algo] for algo in algos),
+                               ' '.join(shlex.quote(name) for name in files))
+
+
+def parse_7z_hashes(text):
+    """
+    Разбирает таблицу вывода 7z h.
+
+    Колонки определяются по строке-разделителю из дефисов под заголовком, поэтому имена файлов
+    с пробелами разбираются корректно.
+
+    Параметры:
+    text (str): Вывод команды 7z h.
+
+    Возвращает:
+    dict: Имя файла -> словарь с размером ('size') и хэшами (ключи crc32, sha256, ... в нижнем регистре,
+          значения в верхнем регистре). Каталоги (без хэшей) пропускаются.
+    """
+    lines = text.splitlines()
+    separators = [i for i, line in enumerate(lines) if line.startswith('-') and set(line) <= {'-', ' '}]
+    if len(separators) < 2 or separators[0] == 0:
+        return {}
+    first, second = separators[:2]
+    spans = []
+    start = None
+    for i, char in enumerate(lines[first] + ' '):
+        if char == '-' and start is None:
+            start = i
+        elif char != '-' and start is not None:
+            spans.append((start, i))
+            start = None
+    header = lines[first - 1]
+    names = [header[begin:end].strip().lower() for begin, end in spans[:-1]]
+    result = {}
+    for line in lines[first + 1:second]:
+        fields = {name: line[begin:end].strip() for name, (begin, end) in zip(names, spans)}
+        name = line[spans[-1][0]:].strip()
+        if not name or not all(fields[algo] for algo in names if algo != 'size'):
+            continue
+        entry = {algo: value.upper() for algo, value in fields.items() if algo != 'size'}
+        entry['size'] = int(fields['size']) if fields.get('size') else None
+        result[name] = entry
+    return result
+
+
+def compare_manifests(expected, actual, algos=('crc32', 'sha256')):
+    """
+    Сравнивает два манифеста (имя файла -> словарь хэшей и размера).
+
+    Возвращает:
+    list: Описания расхождений: отсутствующие и лишние файлы, отличающиеся хэши и размеры.
+          Пустой список, если манифесты совпадают.
+    """
+    problems = []
+    for name in sorted(set(expected) | set(actual)):
+        if name not in actual:
+            problems.append('{}: нет во втором манифесте'.format(name))
+            continue
+        if name not in expected:
+            problems.append('{}: нет в первом манифесте'.format(name))
+            continue
+        for key in tuple(algos) + ('size',):
+            left, right = expected[name].get(key), actual[name].get(key)
+            if left is None or right is None:
+                continue
+            if str(left).upper() != str(right).upper():
+                problems.append('{}: {} {} != {}'.format(name, key, left, right))
+    return problems
@@ -0,0 +1,138 @@
+import fcntl
+import os
+import re
+import shlex
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Состояние всех пакетов запрашивается одним вызовом dpkg-query; для неизвестных пакетов
+# dpkg-query пишет ошибку в stderr, такие пакеты считаются не установленными
+_PROBE_CMD = "dpkg-query -W -f='${{Package}}\\t${{Status}}\\n' {} 2>/dev/null"
+
+INSTALLED = 'install ok installed'
+
+
+class Provisioner:
+    """
+    Проверка и установка пакетов на проверяемой машине.
+
+    Состояние пакетов запрашивается одним удаленным вызовом и кэшируется на всю сессию;
+    кэш сбрасывается (invalidate) тестами, которые сами устанавливают или удаляют пакеты.
+    Недостающие пакеты ставятся одной транзакцией apt-get.
+    """
+
+    def __init__(self, executor, passwd, packages=()):
+        self.executor = executor
+        self.passwd = passwd
+        self.packages = set(packages)
+        self._state = None
+        self._lock = threading.RLock()
+
+    def state(self, packages=()):
+        """
+        Возвращает состояние пакетов: имя пакета -> статус dpkg ('install ok installed', ...).
+        Пакеты, которых нет в базе dpkg, в словарь не попадают.
+        """
+        with self._lock:
+            if self._state is None or not self.packages.issuperset(packages):
+                self.packages.update(packages)
+                names = ' '.join(shlex.quote(p) for p in sorted(self.packages))
+                out = self.executor.getout(_PROBE_CMD.format(names))
+                state = {}
+                for line in out.splitlines():
+                    name, _, status = line.partition('\t')
+                    if status:
+                        state[name] = status
+                self._state = state
+            return self._state
+
+    def installed(self, package):
+        """
+        Возвращает True, если пакет установлен (по кэшированному состоянию).
+        """
+        return self.state((package,)).get(package) == INSTALLED
+
+    def ensure(self, packages):
+        """
+        Устанавливает недостающие пакеты одной транзакцией (apt-get update и apt-get install).
+
+        Параметры:
+        packages (list): Имена пакетов.
+
+        Возвращает:
+        bool: True, если после выполнения установлены все пакеты.
+        """
+        with self._lock:
+            state = self.state(packages)
+            missing = [p for p in packages if state.get(p) != INSTALLED]
+            if not missing:
+                return True
+            script = 'apt-get update && apt-get install -y {}'.format(' '.join(shlex.quote(p) for p in missing))
+            # Пароль не должен попасть в замеры времени: шаблон команды строится по label
+            self.executor.getout('echo {} | sudo -S sh -c {}'.format(shlex.quote(self.passwd), shlex.quote(script)),
+                                 label='sudo apt-get install {}'.format(' '.join(missing)))
+            self.invalidate()
+            state = self.state(packages)
+            return all(state.get(p) == INSTALLED for p in packages)
+
+    def install_deb(self, local_path, remote_path):
+        """
+        Передает пакет .deb на проверяемую машину и устанавливает его через dpkg -i.
+
+        Параметры:
+        local_path (str): Путь к локальному файлу пакета.
+        remote_path (str): Путь к файлу пакета на проверяемой машине.
+
+        Возвращает:
+        bool: True, если dpkg завершился успешно.
+        """
+        with self._lock:
+            self.executor.put(local_path, remote_path)
+            exit_code, _ = self.executor.run('echo {} | sudo -S dpkg -i {}'.format(shlex.quote(self.passwd),
+                                                                                 shlex.quote(remote_path)),
+                                             label='sudo dpkg -i {}'.format(remote_path))
+            self.invalidate()
+            return exit_code == 0
+
+    def invalidate(self):
+        """
+        Сбрасывает кэш состояния пакетов: следующий запрос выполнит проверку заново.
+        """
+        with self._lock:
+            self._state = None
+
+
+@contextmanager
+def package_lock(executor, exclusive):
+    """
+    Блокировка состояния пакетов проверяемой машины, общая для всех процессов pytest на этой машине
+    (процессов pytest-xdist и параллельных запусков fleet.py на один хост).
+
+    Тесты, устанавливающие или удаляющие пакеты, берут ее исключительно (exclusive=True),
+    остальные тесты - совместно: пакеты не меняются, пока на машине выполняются команды 7z.
+    """
+    name = re.sub(r'[^\w.-]', '_', '-'.join(str(part) for part in executor.key))
+    path = os.path.join(tempfile.gettempdir(), 'sevenzip-packages-{}.lock'.format(name))
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_provisioners = {}
+_provisioners_lock = threading.Lock()
+
+
+def get_provisioner(executor, passwd, packages=()):
+    """
+    Возвращает общий для сессии Provisioner исполнителя, создавая его при первом обращении.
+    """
+    with _provisioners_lock:
+        provisioner = _provisioners.get(executor.key)
+        if provisioner is None:
+            provisioner = Provisioner(executor, passwd, packages)
+            _provisioners[executor.key] = provisioner
+        return provisioner
@@ -0,0 +1,274 @@
+import json
+import shlex
+import threading
+
+import deadline
+import timing
+from deadline import CommandTimeout
+
+# Агент выполняется на проверяемой машине одним долгоживущим процессом python3 и отвечает
+# на запросы JSON-lines: одна строка запроса {"op": ..., "args": {...}} - одна строка ответа
+# {"ok": true, "result": ...} или {"ok": false, "error": ...}. Запрос op=batch содержит список
+# запросов в ключе "calls" и выполняется за один обмен. Завершается, когда закрыт stdin.
+_AGENT_SCRIPT = r'''
+import glob, hashlib, json, os, shutil, stat, sys, zlib
+from concurrent.futures import ThreadPoolExecutor
+
+def op_stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return {'size': st.st_size, 'mode': st.st_mode, 'mtime': st.st_mtime, 'isdir': stat.S_ISDIR(st.st_mode)}
+
+def op_listdir(path):
+    return sorted(os.listdir(path))
+
+def op_exists(path):
+    return os.path.exists(path)
+
+def op_hash(path, algos=('crc32',)):
+    crc = 0
+    digests = {name: hashlib.new(name) for name in algos if name != 'crc32'}
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            if 'crc32' in algos:
+                crc = zlib.crc32(block, crc)
+            for digest in digests.values():
+                digest.update(block)
+    result = {name: digest.hexdigest() for name, digest in digests.items()}
+    if 'crc32' in algos:
+        result['crc32'] = '{:08X}'.format(crc)
+    return result
+
+def op_manifest(root, files=None, algos=('crc32', 'sha256'), workers=0):
+    # Каждый файл читается один раз; zlib и hashlib отпускают GIL на больших блоках,
+    # поэтому файлы обрабатываются параллельно на нескольких ядрах
+    if files is None:
+        files = sorted(os.path.relpath(os.path.join(d, n), root) for d, _, names in os.walk(root) for n in names)
+    def entry(rel):
+        path = os.path.join(root, rel)
+        result = op_hash(path, algos)
+        result['size'] = os.path.getsize(path)
+        return rel, result
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        return dict(pool.map(entry, files))
+
+def op_mkdir(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+def op_truncate(path, size):
+    os.truncate(path, size)
+    return True
+
+def op_remove(path, contents=False):
+    targets = glob.glob(os.path.join(glob.escape(path), '*')) if contents else [path]
+    for target in targets:
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target, ignore_errors=True)
+        elif os.path.lexists(target):
+            os.remove(target)
+    return True
+
+OPS = {name[3:]: value for name, value in globals().items() if name.startswith('op_')}
+
+def handle(request):
+    try:
+        if request['op'] == 'batch':
+            return {'ok': True, 'result': [handle(call) for call in request['calls']]}
+        return {'ok': True, 'result': OPS[request['op']](**request.get('args', {}))}
+    except Exception as e:
+        return {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    sys.stdout.write(json.dumps(handle(json.loads(line))) + '\n')
+    sys.stdout.flush()
+'''
+
+AGENT_CMD = 'python3 -u -c {}'.format(shlex.quote(_AGENT_SCRIPT))
+
+
+class AgentError(Exception):
+    """
+    Ошибка выполнения запроса агентом (или агент завершился).
+    """
+
+
+class RemoteAgent:
+    """
+    Клиент агента файловых операций на проверяемой машине.
+
+    Агент запускается один раз (для SSH - в одном канале) и обслуживает запросы stat, listdir, exists,
+    hash, manifest, mkdir, truncate и remove без запуска оболочки на каждую операцию. Несколько запросов
+    можно отправить одним пакетом (batch). Запросы из разных потоков выполняются по очереди.
+    Ответ ожидается не дольше timeout исполнителя (урезанного до срока теста): по истечении агент
+    завершается и выбрасывается CommandTimeout.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self._process = None
+        self._lock = threading.Lock()
+
+    def _request(self, request):
+        label = 'agent {}'.format(request['op'])
+        timeout = deadline.remaining(self.executor.timeout)
+        if timeout is not None and timeout <= 0:
+            raise CommandTimeout(label, 0.0)
+        expired = threading.Event()
+        with self._lock, timing.recorder.timed('rpc', label):
+            if self._process is None:
+                self._process = self.executor.spawn(AGENT_CMD)
+            process = self._process
+            timer = None
+            if timeout is not None:
+                # Завершение зависшего агента прерывает ожидание ответа: readline возвращает конец вывода
+                def stop():
+                    expired.set()
+                    process.kill()
+
+                timer = threading.Timer(timeout, stop)
+                timer.daemon = True
+                timer.start()
+            try:
+                process.stdin.write((json.dumps(request) + '\n').encode('utf-8'))
+                process.stdin.flush()
+                line = process.stdout.readline()
+            except OSError:
+                line = b''
+            finally:
+                if timer is not None:
+                    timer.cancel()
+        if expired.is_set():
+            self.close()
+            raise CommandTimeout(label, timeout)
+        if not line:
+            self.close()
+            raise AgentError('агент завершился, не ответив на запрос {}'.format(request['op']))
+        return json.loads(line)
+
+    @staticmethod
+    def _result(response):
+        if not response['ok']:
+            raise AgentError(response['error'])
+        return response['result']
+
+    def call(self, op, **args):
+        """
+        Выполняет одну операцию агента и возвращает ее результат.
+        """
+        return self._result(self._request({'op': op, 'args': args}))
+
+    def batch(self, calls):
+        """
+        Выполняет пакет операций за один обмен с агентом.
+
+        Параметры:
+        calls (list): Пары (op, args), где args - словарь аргументов операции.
+
+        Возвращает:
+        list: Результаты операций в порядке запросов.
+        """
+        responses = self._result(self._request({'op': 'batch',
+                                                'calls': [{'op': op, 'args': args} for op, args in calls]}))
+        return [self._result(response) for response in responses]
+
+    def stat(self, path):
+        """
+        Возвращает словарь size/mode/mtime/isdir или None, если путь не существует.
+        """
+        return self.call('stat', path=path)
+
+    def listdir(self, path):
+        """
+        Возвращает отсортированный список имен в каталоге.
+        """
+        return self.call('listdir', path=path)
+
+    def exists(self, path):
+        return self.call('exists', path=path)
+
+    def hash(self, path, algos=('crc32',)):
+        """
+        Возвращает хэши файла за одно чтение: словарь алгоритм -> значение (crc32 - 8 hex-цифр в верхнем регистре).
+        """
+        return self.call('hash', path=path, algos=list(algos))
+
+    def manifest(self, root, files=None, algos=('crc32', 'sha256'), workers=0):
+        """
+        Строит манифест дерева файлов: каждый файл читается один раз, все хэши считаются за это чтение,
+        файлы обрабатываются параллельно.
+
+        Параметры:
+        root (str): Корневой каталог.
+        files (list): Пути файлов относительно root. По умолчанию все файлы дерева.
+        algos (tuple): Алгоритмы: crc32 и любые алгоритмы hashlib (sha256, md5, ...).
+        workers (int): Число параллельных потоков. По умолчанию по числу ядер.
+
+        Возвращает:
+        dict: Относительный путь -> словарь с размером ('size') и значениями хэшей.
+        """
+        return self.call('manifest', root=root, files=None if files is None else list(files),
+                         algos=list(algos), workers=workers)
+
+    def mkdir(self, path):
+        """
+        Создает каталог вместе с родительскими (как mkdir -p).
+        """
+        return self.call('mkdir', path=path)
+
+    def truncate(self, path, size):
+        return self.call('truncate', path=path, size=size)
+
+    def remove(self, path, contents=False):
+        """
+        Удаляет файл или каталог (как rm -rf); с contents=True удаляется только содержимое каталога.
+        """
+        return self.call('remove', path=path, contents=contents)
+
+    def close(self):
+        """
+        Завершает агент: закрывает его stdin и канал.
+        """
+        with self._lock:
+            process, self._process = self._process, None
+        if process is not None:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            process.kill()
+            process.wait()
+
+
+_agents = {}
+_agents_lock = threading.Lock()
+
+
+def get_agent(executor):
+    """
+    Возвращает агент для исполнителя, создавая его при первом обращении.
+    """
+    with _agents_lock:
+        agent = _agents.get(executor.key)
+        if agent is None:
+            agent = RemoteAgent(executor)
+            _agents[executor.key] = agent
+        return agent
+
+
+def stop_all():
+    """
+    Завершает все запущенные агенты.
+    """
+    with _agents_lock:
+        for agent in _agents.values():
+            agent.close()
+        _agents.clear()
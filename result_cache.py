@@ -0,0 +1,232 @@
+import fcntl
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import types
+
+# Кэш результатов тестов по отпечатку входных данных: если с прошлого успешного прогона не изменились
+# пакет (.deb), версия 7z и образ проверяемой машины, наборы данных и исходный код теста (а с ним и шаблоны
+# его команд), тест можно не выполнять повторно. Записи живут ttl секунд, сверх max_entries вытесняются
+# давно не использованные. В исходный код теста входят и модули репозитория, которые импортирует модуль теста
+# (напрямую или через другие модули репозитория). Процессы pytest-xdist дописывают свои изменения в общий файл под блокировкой.
+
+# Версия формата файла кэша
+SCHEMA_VERSION = 1
+
+# Маркер, отделяющий версию 7z от описания машины в выводе _PROBE_CMD
+_HOST_MARKER = '__HOST__'
+
+# Версия 7z (первые строки заставки) и признаки образа машины: machine-id, версия ОС и ядро
+_PROBE_CMD = ('7z 2>&1 | head -n 2; echo {}; cat /etc/machine-id /etc/os-release 2>/dev/null; '
+              'uname -srvm'.format(_HOST_MARKER))
+
+
+def digest(value):
+    """
+    Возвращает SHA-256 от JSON-представления значения (ключи словарей упорядочены).
+    """
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def file_sha256(path):
+    """
+    Возвращает SHA-256 локального файла или None, если файла нет.
+    """
+    if not os.path.exists(path):
+        return None
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def environment(executor, package, host, datasets):
+    """
+    Собирает общие для всех тестов входные данные отпечатка (одна команда на проверяемой машине).
+
+    Параметры:
+    executor (Executor): Исполнитель команд на проверяемой машине.
+    package (str): Путь к локальному файлу пакета (.deb).
+    host (str): Адрес проверяемой машины (ip:port или local).
+    datasets (dict): Описания наборов тестовых данных и параметры тестов, от которых зависит результат.
+
+    Возвращает:
+    dict: package (SHA-256 пакета), sevenzip (версия 7z), host (адрес и признаки образа машины), datasets.
+    """
+    out = executor.getout(_PROBE_CMD)
+    version, _, image = out.partition(_HOST_MARKER)
+    return {
+        'package': file_sha256(package),
+        'sevenzip': version.strip(),
+        'host': {'address': host, 'image': hashlib.sha256(image.strip().encode('utf-8')).hexdigest()},
+        'datasets': datasets,
+    }
+
+
+def _module_file(module, root):
+    # Файл модуля, если модуль лежит в каталоге root (не в установленных пакетах)
+    path = getattr(module, '__file__', None)
+    if not path:
+        return None
+    path = os.path.realpath(path)
+    if not path.startswith(root + os.sep) or 'site-packages' in path.split(os.sep):
+        return None
+    return path
+
+
+def repo_modules(modules, root):
+    """
+    Возвращает файлы модулей из каталога root: сами modules и все модули root, которые они импортируют
+    (import модуля или from ... import имени), рекурсивно.
+
+    Параметры:
+    modules (list): Модули, с которых начинается обход (модуль теста, conftest).
+    root (str): Корневой каталог репозитория.
+
+    Возвращает:
+    list: Упорядоченные пути к файлам модулей.
+    """
+    root = os.path.realpath(str(root))
+    seen = set()
+    files = set()
+    queue = list(modules)
+    while queue:
+        module = queue.pop()
+        if module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+        path = _module_file(module, root)
+        if path is None:
+            continue
+        files.add(path)
+        for value in list(vars(module).values()):
+            if isinstance(value, types.ModuleType):
+                queue.append(value)
+                continue
+            # Импортированные из модуля функции и классы ведут к модулю, где они определены
+            name = getattr(value, '__module__', None)
+            if isinstance(name, str) and name in sys.modules:
+                queue.append(sys.modules[name])
+    return sorted(files)
+
+
+# Путь к файлу -> SHA-256 его содержимого (файлы за время сессии не меняются)
+_file_digests = {}
+
+
+def item_fingerprint(env, item, extra_modules=()):
+    """
+    Возвращает отпечаток теста: общие входные данные, идентификатор теста, исходный код функции теста
+    (в нем шаблоны команд) и SHA-256 модулей репозитория, от которых зависит тест: модуля теста,
+    extra_modules (например, conftest с фикстурами) и всех импортируемых ими модулей репозитория.
+    """
+    sources = {}
+    for path in repo_modules([item.module] + list(extra_modules), item.config.rootpath):
+        if path not in _file_digests:
+            _file_digests[path] = file_sha256(path)
+        sources[os.path.relpath(path, str(item.config.rootpath))] = _file_digests[path]
+    return digest({'env': env, 'test': item.nodeid, 'source': inspect.getsource(item.function), 'modules': sources})
+
+
+class ResultCache:
+    """
+    Файл с отпечатками успешно пройденных тестов.
+
+    Поиск идет по загруженной в начале сессии копии; изменения сессии (новые и удаленные записи,
+    время использования) накапливаются в памяти и в save() объединяются с текущим содержимым файла.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, max_entries=1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = self._read()
+        self._stored = {}
+        self._discarded = set()
+        self._used = {}
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                content = json.load(f)
+        except ValueError:
+            # Поврежденный файл кэша равносилен пустому
+            return {}
+        if content.get('version') != SCHEMA_VERSION:
+            return {}
+        return content['entries']
+
+    def _fresh(self, entry, now):
+        return now - entry['passed'] <= self.ttl
+
+    def lookup(self, fingerprint):
+        """
+        Возвращает запись об успешном прогоне с таким отпечатком (не старше ttl) или None.
+        """
+        now = time.time()
+        entry = self.entries.get(fingerprint)
+        if entry is None or not self._fresh(entry, now):
+            return None
+        with self._lock:
+            self._used[fingerprint] = now
+        return entry
+
+    def store(self, fingerprint, test, duration):
+        """
+        Запоминает успешный прогон теста.
+        """
+        now = time.time()
+        with self._lock:
+            self._stored[fingerprint] = {'test': test, 'passed': now, 'used': now, 'duration': duration}
+            self._discarded.discard(fingerprint)
+
+    def discard(self, fingerprint):
+        """
+        Удаляет запись: тест с таким отпечатком не прошел.
+        """
+        with self._lock:
+            self._stored.pop(fingerprint, None)
+            self._discarded.add(fingerprint)
+
+    def _evict(self, entries, now):
+        entries = {fp: e for fp, e in entries.items() if self._fresh(e, now)}
+        if len(entries) > self.max_entries:
+            # Вытесняются давно не использованные записи
+            keep = sorted(entries, key=lambda fp: entries[fp]['used'], reverse=True)[:self.max_entries]
+            entries = {fp: entries[fp] for fp in keep}
+        return entries
+
+    def save(self):
+        """
+        Записывает изменения сессии в файл (под блокировкой, с удалением устаревших и лишних записей).
+        """
+        with self._lock:
+            if not (self._stored or self._discarded or self._used):
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path + '.lock', 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                entries = self._read()
+                for fp, used in self._used.items():
+                    if fp in entries:
+                        entries[fp]['used'] = max(entries[fp]['used'], used)
+                entries.update(self._stored)
+                for fp in self._discarded:
+                    entries.pop(fp, None)
+                entries = self._evict(entries, time.time())
+                tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+                with open(tmp, 'w') as f:
+                    json.dump({'version': SCHEMA_VERSION, 'entries': entries}, f, indent=1, sort_keys=True)
+                os.replace(tmp, self.path)
+            self.entries = entries
+            self._stored, self._discarded, self._used = {}, set(), {}
@@ -0,0 +1,249 @@
+import importlib
+import os
+import threading
+from collections import namedtuple
+
+# Профили SSH-подключения: тип ключа и агент для аутентификации по ключу, предпочитаемый порядок шифров,
+# MAC и обмена ключами, сжатие по видам нагрузки и файл известных ключей хостов.
+# paramiko здесь не импортируется: профили разбираются при чтении конфигурации, до первого подключения.
+
+# Профиль; списки алгоритмов задают порядок предпочтения (None - порядок paramiko по умолчанию),
+# compression - словарь вид нагрузки (exec - команды, sftp - передача файлов) -> сжатие zlib
+Profile = namedtuple('Profile', ['name', 'key_type', 'key_path', 'agent', 'ciphers', 'macs', 'kex', 'host_key_types',
+                                 'compression', 'known_hosts'])
+
+# Тип ключа -> (класс paramiko, аргументы ssh-keygen)
+KEY_TYPES = {
+    'ed25519': ('Ed25519Key', ['-t', 'ed25519']),
+    'ecdsa': ('ECDSAKey', ['-t', 'ecdsa', '-b', '256']),
+    'rsa': ('RSAKey', ['-t', 'rsa', '-b', '3072']),
+}
+
+# Виды нагрузки, для которых сжатие задается отдельно
+PAYLOADS = ('exec', 'sftp')
+
+# Порядок шифров для ciphers: auto. AES-GCM быстрее всех при аппаратной поддержке AES (AES-NI),
+# без нее - AES-CTR; chacha20-poly1305 используется, если его поддерживает установленная версия paramiko
+AUTO_CIPHERS_AES_NI = ['aes128-gcm@openssh.com', 'aes256-gcm@openssh.com', 'chacha20-poly1305@openssh.com',
+                       'aes128-ctr', 'aes256-ctr']
+AUTO_CIPHERS = ['chacha20-poly1305@openssh.com', 'aes128-ctr', 'aes256-ctr', 'aes128-gcm@openssh.com',
+                'aes256-gcm@openssh.com']
+
+# Алгоритмы подписи ключа хоста ssh-rsa
+RSA_SIGNATURES = ['rsa-sha2-512', 'rsa-sha2-256']
+
+_FIELDS = ('key_type', 'key_path', 'agent', 'ciphers', 'macs', 'kex', 'host_key_types', 'compression', 'known_hosts')
+
+# Файл известных ключей хостов по умолчанию (в рабочем каталоге, рядом с отчетами)
+KNOWN_HOSTS = 'known_hosts'
+
+
+def _paramiko():
+    return importlib.import_module('paramiko')
+
+
+def aes_ni():
+    """
+    Проверяет аппаратную поддержку AES на этой машине (флаг aes в /proc/cpuinfo).
+    """
+    try:
+        with open('/proc/cpuinfo') as f:
+            return any(line.startswith('flags') and ' aes' in line for line in f)
+    except OSError:
+        return False
+
+
+def make_profile(name, settings=None):
+    """
+    Создает профиль по настройкам из конфигурации (ключ ssh_profiles).
+
+    Параметры:
+    name (str): Имя профиля.
+    settings (dict): key_type (ed25519, ecdsa или rsa; по умолчанию ed25519), key_path (по умолчанию ~/.ssh/id_<тип>),
+                     agent (пробовать ключи ssh-agent), ciphers (список или auto), macs, kex, host_key_types,
+                     compression (true/false для всех видов нагрузки или словарь exec/sftp -> true/false),
+                     known_hosts (файл известных ключей хостов; пусто - ключи хостов не проверяются).
+
+    Возвращает:
+    Profile: Профиль.
+    При неизвестном параметре или неверном значении выбрасывается ValueError.
+    """
+    settings = dict(settings or {})
+    unknown = sorted(set(settings) - set(_FIELDS))
+    if unknown:
+        raise ValueError('профиль {}: неизвестные параметры {}'.format(name, ', '.join(unknown)))
+    key_type = settings.get('key_type') or 'ed25519'
+    if key_type not in KEY_TYPES:
+        raise ValueError('профиль {}: key_type - одно из {}, получено {!r}'.format(name, ', '.join(KEY_TYPES), key_type))
+    ciphers = settings.get('ciphers')
+    if ciphers == 'auto':
+        ciphers = AUTO_CIPHERS_AES_NI if aes_ni() else AUTO_CIPHERS
+    for field in ('ciphers', 'macs', 'kex', 'host_key_types'):
+        value = ciphers if field == 'ciphers' else settings.get(field)
+        if value is not None and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            raise ValueError('профиль {}: {} - список названий алгоритмов, получено {!r}'.format(name, field, value))
+    compression = settings.get('compression') or False
+    if isinstance(compression, bool):
+        compression = {payload: compression for payload in PAYLOADS}
+    elif isinstance(compression, dict) and set(compression) <= set(PAYLOADS):
+        compression = {payload: bool(compression.get(payload)) for payload in PAYLOADS}
+    else:
+        raise ValueError('профиль {}: compression - true/false или словарь {} -> true/false, получено {!r}'.format(
+            name, '/'.join(PAYLOADS), compression))
+    return Profile(
+        name=name,
+        key_type=key_type,
+        key_path=settings.get('key_path') or '~/.ssh/id_{}'.format(key_type),
+        agent=bool(settings.get('agent')),
+        ciphers=ciphers,
+        macs=settings.get('macs'),
+        kex=settings.get('kex'),
+        host_key_types=settings.get('host_key_types'),
+        compression=compression,
+        known_hosts=settings.get('known_hosts', KNOWN_HOSTS),
+    )
+
+
+# Профиль по умолчанию: ключ Ed25519, алгоритмы paramiko, без сжатия, ключи хостов запоминаются в KNOWN_HOSTS
+DEFAULT = make_profile('default')
+
+
+def get_profile(data, name=None):
+    """
+    Возвращает профиль name (по умолчанию - ssh_profile) из конфигурации; профиль default есть всегда.
+    """
+    name = name or data.get('ssh_profile') or 'default'
+    profiles = data.get('ssh_profiles') or {}
+    if name not in profiles:
+        if name == 'default':
+            return DEFAULT
+        raise ValueError('профиль SSH {} не описан в ssh_profiles'.format(name))
+    return make_profile(name, profiles[name])
+
+
+def ordered(preferred, supported):
+    """
+    Возвращает порядок алгоритмов: сначала поддерживаемые из preferred, затем остальные из supported
+    (запасные - если сервер не поддерживает ни одного предпочтительного). Неизвестные paramiko названия пропускаются.
+    """
+    if not preferred:
+        return tuple(supported)
+    first = [name for name in preferred if name in supported]
+    return tuple(first + [name for name in supported if name not in first])
+
+
+class HostKeyCache:
+    """
+    Известные ключи хостов в файле формата known_hosts.
+
+    Ключ нового хоста запоминается при первом подключении и сохраняется в файл (trust on first use),
+    при следующих подключениях ключ хоста должен совпадать с сохраненным - иначе подключение прерывается.
+    Ключи хранятся в памяти, файл перечитывается только при создании объекта. Ключи, которым доверяет trust(),
+    хранятся отдельно и в файл не попадают.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+        self._keys = None
+        self._trusted = None
+
+    def _load(self):
+        if self._keys is None:
+            self._keys = _paramiko().HostKeys()
+            self._trusted = _paramiko().HostKeys()
+            if os.path.exists(self.path):
+                self._keys.load(self.path)
+        return self._keys
+
+    def _lookup(self, name):
+        # Ключи хоста по типам: сохраненные в файле и доверенные в этом процессе
+        keys = dict(self._load().lookup(name) or {})
+        keys.update(self._trusted.lookup(name) or {})
+        return keys
+
+    @staticmethod
+    def hostname(host, port):
+        # Формат OpenSSH: нестандартный порт записывается как [host]:port
+        return host if port == 22 else '[{}]:{}'.format(host, port)
+
+    def key_types(self, host, port):
+        """
+        Возвращает типы сохраненных ключей хоста (их стоит предложить серверу первыми).
+        """
+        with self._lock:
+            names = list(self._lookup(self.hostname(host, port)))
+        # Ключ ssh-rsa согласуется под именами алгоритмов подписи
+        return [t for name in names for t in (RSA_SIGNATURES if name == 'ssh-rsa' else [name])]
+
+    def check(self, host, port, key):
+        """
+        Сверяет ключ хоста с сохраненным; ключ нового хоста (или нового типа) запоминается.
+        При несовпадении выбрасывается paramiko.BadHostKeyException.
+        """
+        name = self.hostname(host, port)
+        with self._lock:
+            known = self._lookup(name).get(key.get_name())
+            if known is not None:
+                if known != key:
+                    raise _paramiko().BadHostKeyException(name, key, known)
+                return
+            self._keys.add(name, key.get_name(), key)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # В файл записываются только ключи из файла и запомненные при первом подключении
+            self._keys.save(self.path)
+
+    def trust(self, host, port, key):
+        """
+        Доверяет ключу хоста только в этом процессе, не сохраняя его в файл (например, для заглушки ssh_stub).
+        """
+        with self._lock:
+            self._load()
+            self._trusted.add(self.hostname(host, port), key.get_name(), key)
+
+
+_host_keys = {}
+_host_keys_lock = threading.Lock()
+
+
+def get_host_keys(path):
+    """
+    Возвращает общий для процесса кэш известных ключей хостов для файла path.
+    """
+    path = os.path.expanduser(path)
+    with _host_keys_lock:
+        if path not in _host_keys:
+            _host_keys[path] = HostKeyCache(path)
+        return _host_keys[path]
+
+
+_keys = {}
+_keys_lock = threading.Lock()
+
+
+def load_key(profile):
+    """
+    Загружает закрытый ключ профиля (один раз за процесс); None, если файла ключа нет.
+    """
+    path = os.path.expanduser(profile.key_path)
+    with _keys_lock:
+        if path not in _keys:
+            if not os.path.exists(path):
+                return None
+            _keys[path] = getattr(_paramiko(), KEY_TYPES[profile.key_type][0])(filename=path)
+        return _keys[path]
+
+
+def auth_keys(profile):
+    """
+    Ключи для аутентификации по профилю: сначала ключи ssh-agent (при agent: true), затем ключ из файла.
+    """
+    keys = []
+    if profile.agent:
+        keys.extend(_paramiko().Agent().get_keys())
+    key = load_key(profile)
+    if key is not None:
+        keys.append(key)
+    return keys
@@ -0,0 +1,261 @@
+import os
+import signal
+import socket
+import subprocess
+import threading
+
+import paramiko
+
+# Локальная замена проверяемой машины для измерения накладных расходов обвязки (ssh_utils) без сети:
+# SSH-сервер на paramiko в том же процессе, команды выполняются через bash в каталоге-песочнице,
+# SFTP видит только содержимое песочницы.
+
+# Сколько ждать закрытия канала клиентом после завершения команды, сек
+CLOSE_TIMEOUT = 10
+
+# Ключ хоста создается один раз на процесс (генерация RSA-ключа занимает заметное время)
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def _get_host_key():
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+
+class _Server(paramiko.ServerInterface):
+    """
+    Аутентификация по паролю (user/passwd заглушки) или любым ключом, запуск команд в песочнице.
+    """
+
+    def __init__(self, stub):
+        self.stub = stub
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (self.stub.user, self.stub.passwd):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL if username == self.stub.user else paramiko.AUTH_FAILED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.stub._run, args=(channel, command.decode('utf-8')), daemon=True).start()
+        return True
+
+
+def _pump_in(channel, process):
+    # stdin канала -> stdin команды (нужно долгоживущим командам, например агенту remote_agent)
+    try:
+        while True:
+            data = channel.recv(65536)
+            if not data:
+                break
+            process.stdin.write(data)
+            process.stdin.flush()
+    except OSError:
+        pass
+    finally:
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+
+def _pump_out(source, send):
+    try:
+        while True:
+            data = os.read(source.fileno(), 65536)
+            if not data:
+                break
+            send(data)
+    except (OSError, EOFError):
+        pass
+
+
+class _SFTPInterface(paramiko.SFTPServerInterface):
+    """
+    SFTP в пределах каталога песочницы: относительные пути отсчитываются от него,
+    абсолютные пути вне песочницы запрещены.
+    """
+
+    def __init__(self, server, *args, root=None, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+
+    def _real(self, path):
+        real = os.path.realpath(os.path.join(self.root, path))
+        if real != self.root and not real.startswith(self.root + os.sep):
+            raise PermissionError(13, 'вне песочницы', path)
+        return real
+
+    @staticmethod
+    def _call(func):
+        try:
+            return func()
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def _attrs(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.stat(path), os.path.basename(path))
+
+    def canonicalize(self, path):
+        return self._real(path)
+
+    def stat(self, path):
+        return self._call(lambda: self._attrs(self._real(path)))
+
+    lstat = stat
+
+    def list_folder(self, path):
+        def listing():
+            real = self._real(path)
+            return [self._attrs(os.path.join(real, name)) for name in os.listdir(real)]
+        return self._call(listing)
+
+    def open(self, path, flags, attr):
+        def open_file():
+            fd = os.open(self._real(path), flags, 0o644)
+            if flags & os.O_WRONLY:
+                mode = 'ab' if flags & os.O_APPEND else 'wb'
+            elif flags & os.O_RDWR:
+                mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+            else:
+                mode = 'rb'
+            handle = paramiko.SFTPHandle(flags)
+            handle.filename = path
+            handle.readfile = handle.writefile = os.fdopen(fd, mode)
+            return handle
+        return self._call(open_file)
+
+    def mkdir(self, path, attr):
+        return self._call(lambda: os.mkdir(self._real(path)) or paramiko.SFTP_OK)
+
+    def rmdir(self, path):
+        return self._call(lambda: os.rmdir(self._real(path)) or paramiko.SFTP_OK)
+
+    def remove(self, path):
+        return self._call(lambda: os.remove(self._real(path)) or paramiko.SFTP_OK)
+
+    def rename(self, oldpath, newpath):
+        return self._call(lambda: os.rename(self._real(oldpath), self._real(newpath)) or paramiko.SFTP_OK)
+
+    def chattr(self, path, attr):
+        return paramiko.SFTP_OK
+
+
+class StubServer:
+    """
+    SSH/SFTP-сервер на localhost для тестов и бенчмарков обвязки.
+
+    Команды выполняются через bash в каталоге root (он же HOME), SFTP ограничен этим каталогом.
+    Песочница не изолирует команды от остальной файловой системы - это только рабочий каталог.
+
+    Параметры:
+    root (str): Каталог песочницы (создается при необходимости).
+    user (str): Имя пользователя.
+    passwd (str): Пароль.
+    host (str): Адрес для прослушивания. По умолчанию 127.0.0.1.
+    port (int): Порт; 0 - свободный порт, выбранный системой (доступен в атрибуте port после start()).
+    """
+
+    def __init__(self, root, user='user', passwd='user', host='127.0.0.1', port=0):
+        self.root = os.path.realpath(root)
+        self.user = user
+        self.passwd = passwd
+        self.host = host
+        self.port = port
+        # Ключ хоста заглушки (клиенту, проверяющему ключи хостов, нужно ему доверять)
+        self.host_key = _get_host_key()
+        self._socket = None
+        self._transports = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Начинает прием подключений в фоновом потоке и возвращает self.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        self._socket = socket.socket()
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(64)
+        self.port = self._socket.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._socket.accept()
+            except OSError:
+                # Сокет закрыт в stop()
+                return
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock):
+        # Обмен ключами каждого подключения - в своем потоке, чтобы подключения не ждали друг друга;
+        # TCP_NODELAY - чтобы в замеры не попадали задержки подтверждений на стороне заглушки
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(self.host_key)
+        transport.set_subsystem_handler('sftp', paramiko.SFTPServer, _SFTPInterface, root=self.root)
+        with self._lock:
+            self._transports.append(transport)
+        try:
+            transport.start_server(server=_Server(self))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+
+    def _run(self, channel, cmd):
+        env = dict(os.environ, HOME=self.root)
+        process = subprocess.Popen(['bash', '-c', cmd], cwd=self.root, env=env, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+        stdin = threading.Thread(target=_pump_in, args=(channel, process), daemon=True)
+        stdin.start()
+        stderr = threading.Thread(target=_pump_out, args=(process.stderr, channel.sendall_stderr))
+        stderr.start()
+        _pump_out(process.stdout, channel.sendall)
+        if channel.closed and process.poll() is None:
+            # Клиент закрыл канал, не дождавшись окончания: команда завершается вместе с дочерними процессами
+            os.killpg(process.pid, signal.SIGKILL)
+        stderr.join()
+        exit_code = process.wait()
+        try:
+            channel.send_exit_status(exit_code)
+            channel.shutdown_write()
+        except (OSError, EOFError):
+            pass
+        # Канал закрывает клиент (stdin при этом завершается): команда может закончиться раньше, чем сервер
+        # подтвердит ее запуск, и закрытие с нашей стороны клиент принял бы за отказ в запуске
+        stdin.join(CLOSE_TIMEOUT)
+        channel.close()
+
+    def stop(self):
+        """
+        Прекращает прием подключений и закрывает все открытые сессии.
+        """
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
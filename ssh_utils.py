@@ -1,40 +1,783 @@
-import paramiko
+import base64
+import codecs
+import hashlib
+import importlib
+import json
 import os
+import queue
+import select
+import shlex
+import socket
+import stat
 import subprocess
+import uuid
+import weakref
+from collections import namedtuple
+import threading
+import time
 
-def ensure_ssh_key():
+import deadline
+import ssh_profiles
+import timing
+from deadline import CommandTimeout, Watchdog
+
+class _LazyModule:
     """
-    Проверяет наличие SSH-ключа и генерирует его при отсутствии.
+    Модуль, импортируемый при первом обращении к его атрибутам.
     """
-    ssh_key_path = os.path.expanduser('~/.ssh/id_rsa')
-    if not os.path.exists(ssh_key_path):
-        print('SSH ключ не найден. Генерация нового ключа...')
-        subprocess.run(['ssh-keygen', '-t', 'rsa', '-b', '2048', '-f', ssh_key_path, '-N', ''], check=True)
-        print('SSH ключ успешно сгенерирован.')
-    else:
-        print('SSH ключ уже существует.')
 
-ensure_ssh_key()
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# paramiko загружается при первом SSH-подключении: сбор тестов и запуски с backend: local обходятся без него
+paramiko = _LazyModule('paramiko')
 
+# Проверенные за процесс пути ключей
+_ssh_keys_ready = set()
+_ssh_key_lock = threading.Lock()
 
-def upload_ssh_key(host, user, password):
+
+def ensure_ssh_key(profile=None):
     """
-    Загружает SSH-ключ на удалённый хост.
-    
+    Проверяет наличие SSH-ключа профиля и генерирует его при отсутствии (тип ключа - key_type профиля).
+    Проверка выполняется один раз за процесс.
+
+    Параметры:
+    profile (ssh_profiles.Profile): Профиль подключения. По умолчанию профиль пула.
+
+    Возвращает:
+    str: Путь к закрытому ключу.
+    """
+    profile = profile or pool.profile
+    ssh_key_path = os.path.expanduser(profile.key_path)
+    with _ssh_key_lock:
+        if ssh_key_path not in _ssh_keys_ready and not os.path.exists(ssh_key_path):
+            print('SSH ключ не найден. Генерация нового ключа ({})...'.format(profile.key_type))
+            os.makedirs(os.path.dirname(ssh_key_path), mode=0o700, exist_ok=True)
+            subprocess.run(['ssh-keygen', '-q'] + ssh_profiles.KEY_TYPES[profile.key_type][1] +
+                           ['-f', ssh_key_path, '-N', ''], check=True)
+            print('SSH ключ успешно сгенерирован.')
+        _ssh_keys_ready.add(ssh_key_path)
+    return ssh_key_path
+
+
+def upload_ssh_key(host, user, password, port=22, profile=None):
+    """
+    Добавляет открытый SSH-ключ профиля в ~/.ssh/authorized_keys на удалённом хосте (если его там еще нет),
+    подключаясь по паролю.
+
     Параметры:
     host (str): IP-адрес или доменное имя удалённого хоста.
     user (str): Имя пользователя для подключения к удалённому хосту.
     password (str): Пароль для подключения к удалённому хосту.
+    port (int): Порт для подключения по SSH. По умолчанию 22.
+    profile (ssh_profiles.Profile): Профиль подключения (открытый ключ - рядом с key_path, с расширением .pub).
+                                    По умолчанию профиль пула.
+    """
+    profile = profile or pool.profile
+    with open(os.path.expanduser(profile.key_path) + '.pub') as f:
+        public_key = shlex.quote(f.read().strip())
+    cmd = ('mkdir -p ~/.ssh && chmod 700 ~/.ssh && '
+           '{{ grep -qxF {0} ~/.ssh/authorized_keys 2>/dev/null || echo {0} >> ~/.ssh/authorized_keys; }} && '
+           'chmod 600 ~/.ssh/authorized_keys'.format(public_key))
+    exit_code, out = _exec(host, user, password, cmd, port, label='upload ssh key')
+    if exit_code != 0:
+        raise RuntimeError('не удалось загрузить SSH ключ на {}@{}: {}'.format(user, host, out))
+    print('SSH ключ загружен на {}@{}.'.format(user, host))
+
+
+class SSHPool:
+    """
+    Пул постоянных SSH-сессий.
+
+    Сессии (paramiko.Transport) хранятся по ключу (host, port, user, способ аутентификации)
+    и переиспользуются всеми функциями модуля: на живом транспорте открывается новый канал,
+    без повторного обмена ключами и аутентификации. Мертвые сессии переподключаются,
+    простаивающие (без открытых каналов) дольше idle_timeout секунд - закрываются. Каналы открываются
+    через open_session/open_sftp пула: по ним он считает открытые каналы сессии.
+
+    Подключение ограничено по времени (connect_timeout - TCP, banner_timeout - приветствие сервера,
+    auth_timeout - обмен ключами и аутентификация), по живым сессиям каждые keepalive секунд
+    отправляется keepalive-пакет, операции SFTP ждут ответа не дольше io_timeout секунд.
+
+    Ключ аутентификации, порядок алгоритмов, сжатие и проверку ключей хостов задает профиль
+    (ssh_profiles.Profile, атрибут profile); сессии разных профилей хранятся отдельно.
+    """
+
+    def __init__(self, idle_timeout=300, connect_timeout=10, banner_timeout=15, auth_timeout=30, keepalive=15,
+                 io_timeout=120, profile=None):
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.banner_timeout = banner_timeout
+        self.auth_timeout = auth_timeout
+        self.keepalive = keepalive
+        self.io_timeout = io_timeout
+        self.profile = profile or ssh_profiles.DEFAULT
+        self._sessions = {}
+        # Открытые через пул каналы каждого транспорта (закрытые и собранные сборщиком мусора выпадают сами)
+        self._channels = {}
+        # Блокировки подключения по ключам сессий: одновременные обращения к одному ключу ждут одно подключение
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _configure(self, transport, host, port, compress):
+        # Порядок алгоритмов профиля; типы уже известных ключей хоста предлагаются первыми,
+        # чтобы сервер предъявил ключ, который можно сверить с сохраненным
+        profile = self.profile
+        options = transport.get_security_options()
+        options.ciphers = ssh_profiles.ordered(profile.ciphers, options.ciphers)
+        options.digests = ssh_profiles.ordered(profile.macs, options.digests)
+        options.kex = ssh_profiles.ordered(profile.kex, options.kex)
+        key_types = profile.host_key_types or []
+        if profile.known_hosts:
+            key_types = ssh_profiles.get_host_keys(profile.known_hosts).key_types(host, port) + key_types
+        options.key_types = ssh_profiles.ordered(key_types, options.key_types)
+        transport.use_compression(compress)
+
+    def _auth(self, transport, user, passwd, use_key):
+        if not use_key:
+            transport.auth_password(user, passwd)
+            return
+        keys = ssh_profiles.auth_keys(self.profile)
+        if not keys:
+            raise paramiko.AuthenticationException('нет ключей для профиля {}: {}'.format(
+                self.profile.name, self.profile.key_path))
+        for n, key in enumerate(keys):
+            try:
+                transport.auth_publickey(user, key)
+                return
+            except paramiko.AuthenticationException:
+                # Сервер отклонил ключ - пробуем следующий
+                if n == len(keys) - 1:
+                    raise
+
+    def _connect(self, host, user, passwd, port, use_key, compress=False):
+        # Фазы подключения (TCP, обмен ключами, аутентификация) замеряются по отдельности
+        target = '{}:{}'.format(host, port)
+        with timing.recorder.timed('connect', target):
+            sock = socket.create_connection((host, port), timeout=self.connect_timeout)
+            # Запросы каналов - маленькие пакеты: без TCP_NODELAY каждый ждет подтверждения (алгоритм Нейгла)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(sock)
+        transport.banner_timeout = self.banner_timeout
+        transport.auth_timeout = self.auth_timeout
+        try:
+            self._configure(transport, host, port, compress)
+            with timing.recorder.timed('handshake', target):
+                transport.start_client(timeout=self.auth_timeout)
+            if self.profile.known_hosts:
+                ssh_profiles.get_host_keys(self.profile.known_hosts).check(host, port,
+                                                                           transport.get_remote_server_key())
+            with timing.recorder.timed('auth', target):
+                self._auth(transport, user, passwd, use_key)
+        except Exception:
+            transport.close()
+            raise
+        if self.keepalive:
+            transport.set_keepalive(self.keepalive)
+        return transport
+
+    @staticmethod
+    def _alive(transport):
+        # is_active() не замечает оборванное соединение, поэтому дополнительно шлем пакет SSH_MSG_IGNORE
+        if not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except (EOFError, OSError, paramiko.SSHException):
+            return False
+        return True
+
+    def _busy(self, transport):
+        # Открытые каналы: агент файловых операций, сборщик загрузки, долгие команды ssh_stream
+        return any(not channel.closed for channel in list(self._channels.get(transport, ())))
+
+    def _drop(self, key):
+        transport, _ = self._sessions.pop(key)
+        self._channels.pop(transport, None)
+        transport.close()
+
+    def _evict_idle(self, now):
+        for key, (transport, last_used) in list(self._sessions.items()):
+            if self._busy(transport):
+                # Сессия с открытыми каналами не простаивает
+                self._sessions[key] = (transport, now)
+            elif now - last_used > self.idle_timeout:
+                self._drop(key)
+
+    def _lookup(self, key):
+        # Вызывается под self._lock: живой транспорт ключа или None (мертвая сессия закрывается)
+        now = time.monotonic()
+        self._evict_idle(now)
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        if not self._alive(session[0]):
+            self._drop(key)
+            return None
+        self._sessions[key] = (session[0], now)
+        return session[0]
+
+    def get(self, host, user, passwd, port=22, use_key=False, payload='exec'):
+        """
+        Возвращает живой транспорт для указанного хоста, при необходимости открывая новый.
+        Подключение идет вне общей блокировки пула: обращения к другим сессиям его не ждут.
+
+        Параметры:
+        host (str): Адрес хоста для подключения по SSH.
+        user (str): Имя пользователя для подключения.
+        passwd (str): Пароль для подключения.
+        port (int): Порт для подключения по SSH. По умолчанию 22.
+        use_key (bool): Флаг использования ssh-ключа для подключения
+        payload (str): Вид нагрузки (exec - команды, sftp - передача файлов): от него зависит сжатие по профилю.
+                       Если сжатие для видов нагрузки различается, для них открываются отдельные сессии.
+
+        Возвращает:
+        paramiko.Transport: Аутентифицированный транспорт.
+        """
+        compress = self.profile.compression[payload]
+        key = (host, port, user, 'key' if use_key else 'password', self.profile.name, compress)
+        with self._lock:
+            transport = self._lookup(key)
+            if transport is not None:
+                return transport
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Пока ждали блокировку ключа, сессию мог открыть другой поток
+            with self._lock:
+                transport = self._lookup(key)
+            if transport is not None:
+                return transport
+            transport = self._connect(host, user, passwd, port, use_key, compress)
+            with self._lock:
+                self._sessions[key] = (transport, time.monotonic())
+            return transport
+
+    def open_session(self, transport, timeout=None):
+        """
+        Открывает канал на транспорте пула; пока канал открыт, сессия не считается простаивающей.
+
+        Параметры:
+        transport (paramiko.Transport): Транспорт, полученный из get.
+        timeout (float): Допустимое время открытия канала в секундах. По умолчанию как у paramiko.
+
+        Возвращает:
+        paramiko.Channel: Открытый канал.
+        """
+        channel = transport.open_session(timeout=timeout)
+        with self._lock:
+            self._channels.setdefault(transport, weakref.WeakSet()).add(channel)
+        return channel
+
+    def open_sftp(self, transport):
+        """
+        Открывает клиент SFTP на транспорте пула (канал учитывается, как в open_session).
+
+        Параметры:
+        transport (paramiko.Transport): Транспорт, полученный из get.
+
+        Возвращает:
+        paramiko.SFTPClient: Клиент SFTP.
+        """
+        channel = self.open_session(transport, self.auth_timeout)
+        channel.invoke_subsystem('sftp')
+        return paramiko.SFTPClient(channel)
+
+    def close_all(self):
+        """
+        Закрывает все сессии пула.
+        """
+        with self._lock:
+            for transport, _ in self._sessions.values():
+                transport.close()
+            self._sessions.clear()
+            self._channels.clear()
+
+
+# Общий пул сессий модуля
+pool = SSHPool()
+
+
+def _lines(chunks):
+    """
+    Собирает строки из порций (stream, text) отдельно для stdout и stderr.
+    """
+    tails = {'out': '', 'err': ''}
+    for name, text in chunks:
+        lines = (tails[name] + text).splitlines(True)
+        tails[name] = '' if lines[-1].endswith(('\n', '\r')) else lines.pop()
+        for line in lines:
+            yield line
+    for tail in tails.values():
+        if tail:
+            yield tail
+
+
+class SSHStream:
+    """
+    Потоковое чтение вывода удаленной команды.
+
+    stdout и stderr читаются одновременно порциями по мере поступления и декодируются
+    инкрементально, поэтому большой вывод не накапливается в памяти целиком, а команда,
+    заполнившая окно stderr, не блокируется, пока читается stdout.
+    Итерация по объекту возвращает строки вывода (вместе с символом перевода строки),
+    после исчерпания потока код возврата доступен в exit_code.
+    """
+
+    def __init__(self, channel, chunk_size=32768, template=None, watchdog=None, killable=False):
+        self.channel = channel
+        self.chunk_size = chunk_size
+        self.exit_code = None
+        # Срок выполнения и простоя вывода (Watchdog) и группа процессов команды для ее принудительного завершения
+        self.watchdog = watchdog
+        self.pgid = None
+        self._pgid_pending = killable
+        self._head = ''
+        # Шаблон команды для замеров времени первого байта и полного чтения (None - без замеров)
+        self.template = template
+        self._started = time.monotonic()
+        self._first_byte = False
+        self._closed = False
+
+    def _mark_first_byte(self):
+        if not self._first_byte:
+            self._first_byte = True
+            if self.template is not None:
+                timing.recorder.record('first_byte', time.monotonic() - self._started, self.template)
+
+    def _strip_pgid(self, text):
+        # Первая строка stderr команды, запущенной через _killable, - номер ее группы процессов
+        self._head += text
+        if '\n' not in self._head:
+            return ''
+        line, _, rest = self._head.partition('\n')
+        self._pgid_pending = False
+        self._head = ''
+        if line.startswith(PGID_MARKER):
+            self.pgid = int(line[len(PGID_MARKER):])
+            return rest
+        return line + '\n' + rest
+
+    def cancel(self):
+        """
+        Принудительно завершает команду: всю ее группу процессов на удаленной машине (если она известна), затем канал.
+        """
+        if self.pgid is not None:
+            _kill_group(self.channel.get_transport(), self.pgid)
+        self.close()
+
+    def _check_deadline(self):
+        if self.watchdog is None:
+            return
+        error = self.watchdog.expired()
+        if error is not None:
+            self.cancel()
+            raise error
+
+    def _wait_time(self, limit):
+        return limit if self.watchdog is None else self.watchdog.wait_time(limit)
+
+    def chunks(self):
+        """
+        Генератор порций вывода.
+
+        Если задан срок (watchdog), по его истечении или при простое вывода команда завершается
+        вместе со своей группой процессов и выбрасывается CommandTimeout.
+
+        Возвращает:
+        tuple: Пары (stream, text), где stream - 'out' или 'err', text - декодированная порция.
+        """
+        channel = self.channel
+        decoders = {'out': codecs.getincrementaldecoder('utf-8')(),
+                    'err': codecs.getincrementaldecoder('utf-8')()}
+        try:
+            while True:
+                if channel.recv_ready():
+                    self._mark_first_byte()
+                    text = decoders['out'].decode(channel.recv(self.chunk_size))
+                    if self.watchdog is not None:
+                        self.watchdog.output()
+                    if text:
+                        yield 'out', text
+                    continue
+                if channel.recv_stderr_ready():
+                    self._mark_first_byte()
+                    text = decoders['err'].decode(channel.recv_stderr(self.chunk_size))
+                    if self._pgid_pending:
+                        text = self._strip_pgid(text)
+                    elif self.watchdog is not None:
+                        self.watchdog.output()
+                    if text:
+                        yield 'err', text
+                    continue
+                if channel.closed:
+                    # Канал закрыт (в том числе нами через close()) - данных больше не будет
+                    break
+                eof = channel.eof_received
+                if eof and channel.exit_status_ready():
+                    break
+                self._check_deadline()
+                if eof:
+                    # Данные закончились, ждем только код возврата
+                    channel.status_event.wait(self._wait_time(0.1))
+                else:
+                    select.select([channel], [], [], self._wait_time(0.1))
+            if self._head:
+                # Вывод без перевода строки в конце, в котором не оказалось маркера
+                yield 'err', self._head
+            for name, decoder in decoders.items():
+                text = decoder.decode(b'', final=True)
+                if text:
+                    yield name, text
+            if channel.exit_status_ready():
+                self.exit_code = channel.recv_exit_status()
+            # Полное чтение замеряется, только если команда завершилась сама, а не была прервана через close()
+            if self.template is not None and not self._closed:
+                timing.recorder.record('read', time.monotonic() - self._started, self.template)
+        finally:
+            channel.close()
+
+    def __iter__(self):
+        return _lines(self.chunks())
+
+    def close(self):
+        self._closed = True
+        self.channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Finder:
+    """
+    Поиск подстроки в потоке порций текста без хранения всего вывода:
+    между порциями сохраняется только хвост длиной len(text) - 1.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.found = not text
+        self._tail = ''
+
+    def feed(self, chunk):
+        if not self.found:
+            window = self._tail + chunk
+            self.found = self.text in window
+            self._tail = window[max(0, len(window) - len(self.text) + 1):]
+        return self.found
+
+
+class _OutputSearch:
+    """
+    Поиск текста в выводе команды, поступающем порциями (stream, text): в каждом потоке отдельно,
+    найденным считается текст в одном из streams. Общий для синхронных и асинхронных проверок.
+    """
+
+    def __init__(self, text, streams=('out', 'err')):
+        self.streams = streams
+        self._finders = {'out': _Finder(text), 'err': _Finder(text)}
+
+    def feed(self, name, chunk):
+        self._finders[name].feed(chunk)
+
+    @property
+    def found(self):
+        return any(self._finders[name].found for name in self.streams)
+
+
+# Маркер строки с номером группы процессов команды (см. _killable)
+PGID_MARKER = '__PGID__ '
+
+
+def _kill_group(transport, pgid):
+    """
+    Завершает группу процессов pgid на удаленной машине отдельной командой в том же транспорте.
+    """
+    if transport is None or not transport.is_active():
+        return
+    try:
+        killer = transport.open_session(timeout=5)
+        killer.exec_command('kill -KILL -- -{}'.format(pgid))
+        killer.status_event.wait(5)
+        killer.close()
+    except (EOFError, OSError, paramiko.SSHException):
+        pass
+
+
+def _killable(cmd):
+    """
+    Оборачивает команду так, чтобы она выполнялась в своей группе процессов (setsid -w сохраняет код возврата),
+    а номер группы первой строкой выводился в stderr: по нему команду можно завершить вместе с дочерними процессами.
+    """
+    script = 'printf "{}%s\\n" $$ >&2; exec sh -c "$1"'.format(PGID_MARKER)
+    return 'setsid -w sh -c {} _ {}'.format(shlex.quote(script), shlex.quote(cmd))
+
+
+def ssh_stream(host, user, passwd, cmd, port=22, use_key=False, chunk_size=32768, label=None, timeout=None,
+               stall_timeout=None):
+    """
+    Функция для выполнения команды на удаленной машине через SSH с потоковым чтением вывода.
+
+    Параметры:
+    host (str): Адрес хоста для подключения по SSH.
+    user (str): Имя пользователя для подключения.
+    passwd (str): Пароль для подключения.
+    cmd (str): Команда для выполнения на удаленной машине.
+    port (int): Порт для подключения по SSH. По умолчанию 22.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+    chunk_size (int): Размер порции чтения в байтах.
+    label (str): Команда, по которой группируются замеры времени (если cmd - обертка над ней). По умолчанию cmd.
+    timeout (float): Допустимое время выполнения команды в секундах. По умолчанию без ограничения.
+    stall_timeout (float): Допустимое время без вывода в секундах. По умолчанию без ограничения.
+
+    Возвращает:
+    SSHStream: Поток вывода команды; итерация возвращает строки stdout и stderr по мере поступления.
+    При истечении timeout или stall_timeout команда завершается вместе с дочерними процессами
+    и выбрасывается CommandTimeout.
+    """
+    template = timing.command_template(label or cmd)
+    watchdog = None
+    if timeout is not None or stall_timeout is not None:
+        if timeout is not None and timeout <= 0:
+            raise CommandTimeout(label or cmd, 0.0)
+        watchdog = Watchdog(label or cmd, timeout, stall_timeout)
+        cmd = _killable(cmd)
+    transport = pool.get(host, user, passwd, port, use_key)
+    with timing.recorder.timed('exec', template):
+        channel = pool.open_session(transport, pool.auth_timeout)
+        channel.exec_command(cmd)
+    return SSHStream(channel, chunk_size, template, watchdog, killable=watchdog is not None)
+
+
+class SSHProcess:
+    """
+    Удаленная команда с доступом к stdin и stdout, интерфейс как у subprocess.Popen (stdin, stdout, kill, wait).
+    Используется для долгоживущих удаленных процессов, с которыми идет обмен по одному каналу.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.stdin = channel.makefile_stdin('wb')
+        self.stdout = channel.makefile('rb')
+
+    def kill(self):
+        self.channel.close()
+
+    def wait(self, timeout=None):
+        # recv_exit_status ждет без ограничения, поэтому код возврата ожидается через status_event
+        if not self.channel.status_event.wait(timeout) or not self.channel.exit_status_ready():
+            return None
+        return self.channel.recv_exit_status()
+
+
+def ssh_process(host, user, passwd, cmd, port=22, use_key=False):
+    """
+    Запускает команду на удаленной машине, оставляя открытыми ее stdin и stdout.
+
+    Параметры:
+    host (str): Адрес хоста для подключения по SSH.
+    user (str): Имя пользователя для подключения.
+    passwd (str): Пароль для подключения.
+    cmd (str): Команда для выполнения на удаленной машине.
+    port (int): Порт для подключения по SSH. По умолчанию 22.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+
+    Возвращает:
+    SSHProcess: Удаленный процесс.
+    """
+    channel = pool.open_session(pool.get(host, user, passwd, port, use_key))
+    channel.exec_command(cmd)
+    return SSHProcess(channel)
+
+
+def ssh_wait_for(host, user, passwd, cmd, text, port=22, use_key=False):
+    """
+    Функция для выполнения команды на удаленной машине через SSH с ожиданием текста в выводе.
+    Чтение прекращается, а канал закрывается, как только текст появился в stdout или stderr.
+
+    Параметры:
+    host (str): Адрес хоста для подключения по SSH.
+    user (str): Имя пользователя для подключения.
+    passwd (str): Пароль для подключения.
+    cmd (str): Команда для выполнения на удаленной машине.
+    text (str): Ожидаемый текст.
+    port (int): Порт для подключения по SSH. По умолчанию 22.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+
+    Возвращает:
+    True, если текст появился в выводе команды, иначе False (код возврата не проверяется).
+    """
+    finders = {'out': _Finder(text), 'err': _Finder(text)}
+    with ssh_stream(host, user, passwd, cmd, port, use_key) as stream:
+        for name, chunk in stream.chunks():
+            if finders[name].feed(chunk):
+                return True
+    return finders['out'].found or finders['err'].found
+
+
+# Маркер строки с данными о потреблении ресурсов, которую обертка with_rusage пишет в stderr
+RUSAGE_MARKER = '__RUSAGE__ '
+
+# Обертка запускает команду дочерним процессом, дожидается его через waitid(WNOWAIT),
+# читает /proc/<pid>/io еще не убранного процесса и затем забирает rusage через wait4.
+# rusage и io-счетчики процесса включают всех его завершенных потомков.
+_RUSAGE_SCRIPT = r'''
+import json, os, sys, time
+start = time.time()
+pid = os.fork()
+if pid == 0:
+    os.execv('/bin/sh', ['sh', '-c', sys.argv[1]])
+os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+io = {}
+try:
+    with open('/proc/%d/io' % pid) as f:
+        for line in f:
+            key, value = line.split(':')
+            io[key] = int(value)
+except OSError:
+    pass
+_, status, ru = os.wait4(pid, 0)
+code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 128 + os.WTERMSIG(status)
+sys.stderr.write('%s%s\n' % ('__RUSAGE__ ', json.dumps({
+    'exit_code': code, 'wall_s': time.time() - start,
+    'utime_s': ru.ru_utime, 'stime_s': ru.ru_stime, 'maxrss_kb': ru.ru_maxrss,
+    'nvcsw': ru.ru_nvcsw, 'nivcsw': ru.ru_nivcsw,
+    'rchar': io.get('rchar'), 'wchar': io.get('wchar'),
+    'read_bytes': io.get('read_bytes'), 'write_bytes': io.get('write_bytes')})))
+sys.exit(code)
+'''
+
+
+def with_rusage(cmd):
+    """
+    Оборачивает команду для учета ресурсов, потребленных ее деревом процессов на удаленной машине
+    (время, user/sys CPU, пиковый RSS, переключения контекста, байты чтения/записи).
+    Требует python3 на удаленной машине.
+    """
+    return 'python3 -c {} {}'.format(shlex.quote(_RUSAGE_SCRIPT), shlex.quote(cmd))
+
+
+def _output_chunks(stream, cmd, stats=None):
+    """
+    Генератор порций вывода потока (SSHStream или аналогичного).
+
+    Если передан список stats (команда запущена через with_rusage), строка с данными
+    о ресурсах вырезается из stderr и добавляется в stats словарем (с ключом 'cmd').
+    """
+    if stats is None:
+        yield from stream.chunks()
+        return
+    tail = ''
+    for name, chunk in stream.chunks():
+        if name == 'out':
+            yield name, chunk
+            continue
+        lines = (tail + chunk).splitlines(True)
+        tail = '' if lines[-1].endswith('\n') else lines.pop()
+        for line in lines:
+            if line.startswith(RUSAGE_MARKER):
+                usage = json.loads(line[len(RUSAGE_MARKER):])
+                usage['cmd'] = cmd
+                stats.append(usage)
+            else:
+                yield name, line
+    if tail:
+        yield 'err', tail
+
+
+def _search(stream, cmd, text, stats=None, streams=('out', 'err')):
+    """
+    Ищет текст в потоке вывода без его накопления.
+
+    Возвращает:
+    bool: Найден ли текст в выводе из streams (по умолчанию stdout или stderr).
+    """
+    search = _OutputSearch(text, streams)
+    for name, chunk in _output_chunks(stream, cmd, stats):
+        search.feed(name, chunk)
+    return search.found
+
+
+def _collect(stream, cmd, stats=None, streams=('out', 'err')):
+    """
+    Собирает полный вывод потока.
+
+    Возвращает:
+    str: Вывод команды из streams (по умолчанию stdout, затем stderr).
     """
-    ssh_copy_id_command = f'sshpass -p {remote_password} ssh-copy-id -o StrictHostKeyChecking=no {remote_user}@{remote_host}'
-    subprocess.run(ssh_copy_id_command, shell=True, check=True)
-    print(f'SSH ключ успешно загружен на {remote_user}@{remote_host}.')
+    parts = {'out': [], 'err': []}
+    for name, chunk in _output_chunks(stream, cmd, stats):
+        parts[name].append(chunk)
+    return ''.join(''.join(parts[name]) for name in streams)
 
-# Пример использования
-# upload_ssh_key('remote_host_ip', 'remote_user', 'remote_password')
+
+def _stream_check(start, cmd, text, expect_success, stats=None, streams=('out', 'err')):
+    """
+    Выполняет команду, ища текст в потоке вывода (в streams), и проверяет код возврата.
+    start(command, label) запускает команду и возвращает поток ее вывода (ssh_stream, Executor.stream).
+    """
+    stream = start(cmd if stats is None else with_rusage(cmd), cmd)
+    found = _search(stream, cmd, text, stats, streams)
+    return _matches(text if found else '', stream.exit_code, text, expect_success)
+
+
+def _stream_run(start, cmd, stats=None, label=None, streams=('out', 'err')):
+    """
+    Выполняет команду, запуская ее через start(command, label), как в _stream_check.
+
+    Возвращает:
+    tuple: Код возврата и вывод команды из streams (по умолчанию stdout и stderr) в виде строки.
+    """
+    stream = start(cmd if stats is None else with_rusage(cmd), label or cmd)
+    out = _collect(stream, cmd, stats, streams)
+    return stream.exit_code, out
 
 
-def ssh_checkout(host, user, passwd, cmd, text, port=22, use_key=False):
+def _check(host, user, passwd, cmd, text, expect_success, port=22, use_key=False, stats=None, timeout=None):
+    """
+    Выполняет команду, ища текст в потоке вывода, и проверяет код возврата.
+    """
+    return _stream_check(lambda command, label: ssh_stream(host, user, passwd, command, port, use_key, label=label,
+                                                           timeout=timeout),
+                         cmd, text, expect_success, stats)
+
+
+def _exec(host, user, passwd, cmd, port=22, use_key=False, stats=None, timeout=None, stall_timeout=None, label=None):
+    """
+    Выполняет команду в новом канале пулового транспорта.
+
+    Возвращает:
+    tuple: Код возврата и полный вывод команды (stdout и stderr) в виде строки.
+    """
+    return _stream_run(lambda command, name: ssh_stream(host, user, passwd, command, port, use_key, label=name,
+                                                        timeout=timeout, stall_timeout=stall_timeout),
+                       cmd, stats, label)
+
+
+def _matches(out, exit_code, text, expect_success):
+    """
+    Общая проверка результата команды для ssh_checkout, ssh_checkout_negative и ssh_batch.
+
+    Возвращает:
+    True, если текст найден в выводе и код возврата соответствует ожиданию
+    (0 при expect_success=True, не 0 при expect_success=False), иначе False.
+    """
+    if expect_success:
+        return text in out and exit_code == 0
+    return text in out and exit_code != 0
+
+
+def ssh_checkout(host, user, passwd, cmd, text, port=22, use_key=False, stats=None, timeout=None):
     """
     Функция для выполнения команды на удаленной машине через SSH и проверки ее вывода на наличие определенного текста.
 
@@ -46,36 +789,17 @@ def ssh_checkout(host, user, passwd, cmd, text, port=22, use_key=False):
     text (str): Текст, который должен присутствовать в выводе команды для успешного выполнения.
     port (int): Порт для подключения по SSH. По умолчанию 22.
     use_key (bool): Флаг использования ssh-ключа для подключения
+    stats (list): Если передан, в него добавляются данные о потребленных командой ресурсах (см. with_rusage).
+    timeout (float): Допустимое время выполнения в секундах (урезается до срока теста). По умолчанию без ограничения.
 
     Возвращает:
     True, если текст найден в выводе команды и команда завершилась успешно (код возврата 0), иначе False.
+    При истечении timeout команда завершается вместе с дочерними процессами и выбрасывается CommandTimeout.
     """
-    # Создаем SSH-клиент
-    client = paramiko.SSHClient()
-    # Автоматически добавляем ключи хостов
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    # Подключаемся к удаленному хосту
-    if use_key:
-        key_path = os.path.expanduser('~/.ssh/id_rsa')
-        key = paramiko.RSAKey(filename=key_path)
-        client.connect(hostname=host, username=user, pkey=key, port=port)
-    else:
-        client.connect(hostname=host, username=user, password=passwd, port=port)
-    # Выполняем команду на удаленном хосте
-    stdin, stdout, stderr = client.exec_command(cmd)
-    # Получаем код возврата команды
-    exit_code = stdout.channel.recv_exit_status()
-    # Читаем вывод команды и ошибки
-    out = (stdout.read() + stderr.read()).decode('utf-8')
-    # Закрываем SSH-соединение
-    client.close()
     # Проверяем наличие текста в выводе команды и успешное выполнение команды
-    if text in out and exit_code == 0:
-        return True
-    else:
-        return False
+    return _check(host, user, passwd, cmd, text, True, port, use_key, stats, deadline.remaining(timeout))
 
-def ssh_getout(host, user, passwd, cmd, port=22):
+def ssh_getout(host, user, passwd, cmd, port=22, use_key=False, stats=None, timeout=None):
     """
     Функция для выполнения команды на удаленной машине через SSH и возврата ее полного вывода.
 
@@ -85,77 +809,247 @@ def ssh_getout(host, user, passwd, cmd, port=22):
     passwd (str): Пароль для подключения.
     cmd (str): Команда для выполнения на удаленной машине.
     port (int): Порт для подключения по SSH. По умолчанию 22.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+    stats (list): Если передан, в него добавляются данные о потребленных командой ресурсах (см. with_rusage).
+    timeout (float): Допустимое время выполнения в секундах (урезается до срока теста). По умолчанию без ограничения.
 
     Возвращает:
     str: Полный вывод команды (stdout и stderr) в виде строки.
+    При истечении timeout команда завершается вместе с дочерними процессами и выбрасывается CommandTimeout.
     """
-    # Создаем SSH-клиент
-    client = paramiko.SSHClient()
-    # Автоматически добавляем ключи хостов
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    # Подключаемся к удаленному хосту
-    client.connect(hostname=host, username=user, password=passwd, port=port)
-    # Выполняем команду на удаленном хосте
-    stdin, stdout, stderr = client.exec_command(cmd)
-    # Читаем вывод команды и ошибки
-    out = (stdout.read() + stderr.read()).decode('utf-8')
-    # Закрываем SSH-соединение
-    client.close()
+    _, out = _exec(host, user, passwd, cmd, port, use_key, stats, deadline.remaining(timeout))
     return out
 
-def upload_files(host, user, passwd, local_path, remote_path, port=22):
+# Итог передачи файлов: количество файлов, пропущенных (уже совпадающих) файлов, переданных байт и время
+TransferStats = namedtuple('TransferStats', ['files', 'skipped', 'bytes', 'seconds'])
+
+# Размер порции чтения/записи при передаче файлов по SFTP
+SFTP_CHUNK = 256 * 1024
+
+
+def _local_sha256(path, limit=None):
+    """
+    Считает SHA-256 локального файла (или его первых limit байт).
+    """
+    digest = hashlib.sha256()
+    left = limit
+    with open(path, 'rb') as f:
+        while left is None or left > 0:
+            block = f.read(SFTP_CHUNK if left is None else min(SFTP_CHUNK, left))
+            if not block:
+                break
+            digest.update(block)
+            if left is not None:
+                left -= len(block)
+    return digest.hexdigest()
+
+
+def _remote_sha256(host, user, passwd, path, port=22, limit=None, use_key=False):
+    """
+    Считает SHA-256 удаленного файла (или его первых limit байт) на удаленной машине.
+    """
+    if limit is None:
+        cmd = 'sha256sum {}'.format(shlex.quote(path))
+    else:
+        cmd = 'head -c {} {} | sha256sum'.format(limit, shlex.quote(path))
+    exit_code, out = _exec(host, user, passwd, cmd, port, use_key)
+    return out.split()[0] if exit_code == 0 and out else None
+
+
+def _remote_size(sftp, path):
+    try:
+        return sftp.stat(path).st_size
+    except IOError:
+        return None
+
+
+def _report(action, result):
+    mb = result.bytes / 1024.0 / 1024.0
+    speed = mb / result.seconds if result.seconds > 0 else 0.0
+    print(f'{action}: файлов {result.files}, пропущено {result.skipped}, {mb:.2f} МБ за {result.seconds:.2f} с '
+          f'({speed:.2f} МБ/с)')
+
+
+def _transfer(host, user, passwd, port, pairs, worker, workers, label='sftp', use_key=False, stall_timeout=None):
+    """
+    Выполняет передачу пар файлов несколькими потоками; у каждого потока свой SFTP-клиент
+    на общем пуловом транспорте, поэтому в полете одновременно несколько файлов.
+    Ответа сервера SFTP каждый поток ждет не дольше stall_timeout (по умолчанию io_timeout пула) секунд.
+
+    Возвращает:
+    TransferStats: Итог передачи.
+    """
+    start = time.monotonic()
+    tasks = queue.Queue()
+    for pair in pairs:
+        tasks.put(pair)
+    totals = {'skipped': 0, 'bytes': 0}
+    errors = []
+    lock = threading.Lock()
+
+    def run():
+        sftp = pool.open_sftp(pool.get(host, user, passwd, port, use_key, 'sftp'))
+        # Зависший ответ сервера SFTP прерывает передачу (socket.timeout) вместо бесконечного ожидания
+        sftp.get_channel().settimeout(pool.io_timeout if stall_timeout is None else stall_timeout)
+        try:
+            while not errors:
+                try:
+                    source, target = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                with timing.recorder.timed('sftp', label):
+                    sent = worker(sftp, source, target)
+                with lock:
+                    if sent is None:
+                        totals['skipped'] += 1
+                    else:
+                        totals['bytes'] += sent
+        except Exception as e:
+            errors.append(e)
+        finally:
+            sftp.close()
+
+    threads = [threading.Thread(target=run) for _ in range(max(1, min(workers, len(pairs))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return TransferStats(len(pairs), totals['skipped'], totals['bytes'], time.monotonic() - start)
+
+
+def upload_files(host, user, passwd, local_path, remote_path, port=22, workers=4, use_key=False,
+                 stall_timeout=None):
     """
     Функция для загрузки файлов на удаленную машину через SFTP.
 
+    Файл пропускается, если на удаленной машине уже есть файл того же размера и с тем же SHA-256;
+    частично загруженный файл (совпадающее начало) дозагружается. Запись идет в конвейерном режиме,
+    каталог загружается рекурсивно в несколько потоков.
+
     Параметры:
     host (str): Адрес хоста для подключения по SSH.
     user (str): Имя пользователя для подключения.
     passwd (str): Пароль для подключения.
-    local_path (str): Путь к локальному файлу, который нужно загрузить.
+    local_path (str): Путь к локальному файлу или каталогу, который нужно загрузить.
     remote_path (str): Путь к удаленному каталогу, куда нужно загрузить файл.
     port (int): Порт для подключения по SSH. По умолчанию 22.
+    workers (int): Количество одновременно передаваемых файлов при загрузке каталога.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+    stall_timeout (float): Допустимое время ожидания ответа сервера SFTP в секундах. По умолчанию io_timeout пула.
+
+    Возвращает:
+    TransferStats: Итог передачи (в том числе для расчета достигнутой скорости).
     """
     print(f'Загружаем файл {local_path} в каталог {remote_path}')
-    # Создаем транспортное соединение
-    transport = paramiko.Transport((host, port))
-    transport.connect(None, username=user, password=passwd)
-    # Создаем SFTP-клиент
-    sftp = paramiko.SFTPClient.from_transport(transport)
-    # Загружаем файл
-    sftp.put(local_path, remote_path)
-    # Закрываем SFTP и транспортное соединение
-    if sftp:
-        sftp.close()
-    if transport:
-        transport.close()
+    if os.path.isdir(local_path):
+        pairs = []
+        sftp = pool.open_sftp(pool.get(host, user, passwd, port, use_key, 'sftp'))
+        try:
+            for folder, _, names in os.walk(local_path):
+                relative = os.path.relpath(folder, local_path)
+                target = remote_path if relative == '.' else '{}/{}'.format(remote_path, relative)
+                if _remote_size(sftp, target) is None:
+                    sftp.mkdir(target)
+                pairs.extend((os.path.join(folder, n), '{}/{}'.format(target, n)) for n in names)
+        finally:
+            sftp.close()
+    else:
+        pairs = [(local_path, remote_path)]
+
+    def upload_one(sftp, source, target):
+        size = os.path.getsize(source)
+        offset = _remote_size(sftp, target) or 0
+        if offset > size:
+            offset = 0
+        elif offset and _remote_sha256(host, user, passwd, target, port, use_key=use_key) != _local_sha256(source, offset):
+            offset = 0
+        elif offset == size:
+            return None
+        with open(source, 'rb') as local, sftp.open(target, 'ab' if offset else 'wb') as remote:
+            remote.set_pipelined(True)
+            local.seek(offset)
+            while True:
+                block = local.read(SFTP_CHUNK)
+                if not block:
+                    break
+                remote.write(block)
+        return size - offset
+
+    result = _transfer(host, user, passwd, port, pairs, upload_one, workers, 'sftp upload', use_key,
+                       stall_timeout)
+    _report('Загрузка', result)
+    return result
 
-def download_files(host, user, passwd, remote_path, local_path, port=22):
+def download_files(host, user, passwd, remote_path, local_path, port=22, workers=4, use_key=False,
+                   stall_timeout=None):
     """
     Функция для скачивания файлов с удаленной машины через SFTP.
 
+    Файл пропускается, если локально уже есть файл того же размера и с тем же SHA-256;
+    частично скачанный файл (совпадающее начало) докачивается. Чтение идет с упреждающей
+    выборкой (prefetch), каталог скачивается рекурсивно в несколько потоков.
+
     Параметры:
     host (str): Адрес хоста для подключения по SSH.
     user (str): Имя пользователя для подключения.
     passwd (str): Пароль для подключения.
-    remote_path (str): Путь к удаленному файлу, который нужно скачать.
+    remote_path (str): Путь к удаленному файлу или каталогу, который нужно скачать.
     local_path (str): Путь к локальному каталогу, куда нужно скачать файл.
     port (int): Порт для подключения по SSH. По умолчанию 22.
+    workers (int): Количество одновременно передаваемых файлов при скачивании каталога.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+    stall_timeout (float): Допустимое время ожидания ответа сервера SFTP в секундах. По умолчанию io_timeout пула.
+
+    Возвращает:
+    TransferStats: Итог передачи (в том числе для расчета достигнутой скорости).
     """
     print(f'Скачиваем файл {remote_path} в каталог {local_path}')
-    # Создаем транспортное соединение
-    transport = paramiko.Transport((host, port))
-    transport.connect(None, username=user, password=passwd)
-    # Создаем SFTP-клиент
-    sftp = paramiko.SFTPClient.from_transport(transport)
-    # Скачиваем файл
-    sftp.get(remote_path, local_path)
-    # Закрываем SFTP и транспортное соединение
-    if sftp:
+    sftp = pool.open_sftp(pool.get(host, user, passwd, port, use_key, 'sftp'))
+    try:
+        if stat.S_ISDIR(sftp.stat(remote_path).st_mode):
+            pairs = []
+            folders = [(remote_path, local_path)]
+            while folders:
+                source, target = folders.pop()
+                os.makedirs(target, exist_ok=True)
+                for attr in sftp.listdir_attr(source):
+                    pair = ('{}/{}'.format(source, attr.filename), os.path.join(target, attr.filename))
+                    if stat.S_ISDIR(attr.st_mode):
+                        folders.append(pair)
+                    else:
+                        pairs.append(pair)
+        else:
+            pairs = [(remote_path, local_path)]
+    finally:
         sftp.close()
-    if transport:
-        transport.close()
 
-def ssh_checkout_negative(host, user, passwd, cmd, text, port=22):
+    def download_one(sftp, source, target):
+        size = sftp.stat(source).st_size
+        offset = os.path.getsize(target) if os.path.exists(target) else 0
+        if offset > size:
+            offset = 0
+        elif offset and _remote_sha256(host, user, passwd, source, port, offset, use_key) != _local_sha256(target):
+            offset = 0
+        elif offset == size:
+            return None
+        with sftp.open(source, 'rb') as remote, open(target, 'ab' if offset else 'wb') as local:
+            remote.seek(offset)
+            remote.prefetch(size)
+            while True:
+                block = remote.read(SFTP_CHUNK)
+                if not block:
+                    break
+                local.write(block)
+        return size - offset
+
+    result = _transfer(host, user, passwd, port, pairs, download_one, workers, 'sftp download', use_key,
+                       stall_timeout)
+    _report('Скачивание', result)
+    return result
+
+def ssh_checkout_negative(host, user, passwd, cmd, text, port=22, use_key=False, timeout=None):
     """
     Функция для выполнения команды на удаленной машине через SSH и проверки ее вывода на наличие определенного текста,
     но ожидая, что команда завершится с ошибкой.
@@ -167,26 +1061,93 @@ def ssh_checkout_negative(host, user, passwd, cmd, text, port=22):
     cmd (str): Команда для выполнения на удаленной машине.
     text (str): Текст, который должен присутствовать в выводе команды для успешного выполнения.
     port (int): Порт для подключения по SSH. По умолчанию 22.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+    timeout (float): Допустимое время выполнения в секундах (урезается до срока теста). По умолчанию без ограничения.
 
     Возвращает:
     True, если текст найден в выводе команды и команда завершилась с ошибкой (не нулевой код возврата), иначе False.
+    При истечении timeout команда завершается вместе с дочерними процессами и выбрасывается CommandTimeout.
     """
-    # Создаем SSH-клиент
-    client = paramiko.SSHClient()
-    # Автоматически добавляем ключи хостов
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    # Подключаемся к удаленному хосту
-    client.connect(hostname=host, username=user, password=passwd, port=port)
-    # Выполняем команду на удаленном хосте
-    stdin, stdout, stderr = client.exec_command(cmd)
-    # Получаем код возврата команды
-    exit_code = stdout.channel.recv_exit_status()
-    # Читаем вывод команды и ошибки
-    out = (stdout.read() + stderr.read()).decode('utf-8')
-    # Закрываем SSH-соединение
-    client.close()
     # Проверяем наличие текста в выводе команды и что команда завершилась с ошибкой
-    if text in out and exit_code != 0:
-        return True
-    else:
-        return False
+    return _check(host, user, passwd, cmd, text, False, port, use_key, timeout=deadline.remaining(timeout))
+
+
+# Результат команды пакета: код возврата, stdout, stderr, совпадение с ожиданием
+# и elapsed - время выполнения команды на проверяемой машине в секундах
+BatchResult = namedtuple('BatchResult', ['cmd', 'exit_code', 'stdout', 'stderr', 'matched', 'elapsed'])
+
+
+def _batch_script(cmds, marker):
+    """
+    Собирает shell-скрипт, выполняющий команды по очереди в одном удаленном shell.
+
+    Каждая команда запускается в своем подшелле (cd и переменные не протекают в следующие),
+    после нее печатается строка-маркер с номером, кодом возврата и временем выполнения в наносекундах,
+    а stdout и stderr выводятся в base64, чтобы их содержимое не могло сломать разбор.
+    """
+    lines = ['__t=$(mktemp -d) || exit 1']
+    for i, cmd in enumerate(cmds):
+        lines.append('__s=$(date +%s%N)')
+        lines.append('(\n{}\n) >"$__t/o" 2>"$__t/e" </dev/null'.format(cmd))
+        lines.append("__c=$?; printf '%s %d %d %d\\n' {} {} $__c $(($(date +%s%N) - __s))".format(marker, i))
+        lines.append('base64 -w0 "$__t/o"; echo; base64 -w0 "$__t/e"; echo')
+    lines.append('rm -rf "$__t"')
+    return '\n'.join(lines)
+
+
+def ssh_batch(host, user, passwd, checks, port=22, use_key=False, timeout=None):
+    """
+    Функция для выполнения пакета команд на удаленной машине за одно SSH-обращение.
+
+    Параметры:
+    host (str): Адрес хоста для подключения по SSH.
+    user (str): Имя пользователя для подключения.
+    passwd (str): Пароль для подключения.
+    checks (list): Список кортежей (cmd, text, expect_success): команда, ожидаемый текст в выводе
+                   и ожидается ли успешное завершение (как у ssh_checkout) или ошибка (как у ssh_checkout_negative).
+    port (int): Порт для подключения по SSH. По умолчанию 22.
+    use_key (bool): Флаг использования ssh-ключа для подключения
+    timeout (float): Допустимое время выполнения всего пакета в секундах. По умолчанию без ограничения.
+
+    Возвращает:
+    list: Список BatchResult в порядке команд.
+    """
+    if not checks:
+        return []
+    marker = '__BATCH_{}__'.format(uuid.uuid4().hex)
+    cmds = [c[0] for c in checks]
+    _, out = _exec(host, user, passwd, _batch_script(cmds, marker), port, use_key, timeout=timeout,
+                   label='batch: {}'.format('; '.join(cmds)))
+    return _parse_batch(out, marker, checks)
+
+
+def _parse_batch(out, marker, checks):
+    """
+    Разбирает вывод скрипта _batch_script.
+
+    Возвращает:
+    list: Список BatchResult в порядке команд.
+    """
+    lines = out.split('\n')
+    results = [None] * len(checks)
+    for n, line in enumerate(lines):
+        if not line.startswith(marker + ' ') or n + 2 >= len(lines):
+            continue
+        # Оборванный вывод (shell завершился после маркера, нет base64) - команда считается не выполненной
+        try:
+            _, index, exit_code, elapsed = line.split()
+            index, exit_code, elapsed = int(index), int(exit_code), int(elapsed) / 1e9
+            stdout = base64.b64decode(lines[n + 1], validate=True).decode('utf-8')
+            stderr = base64.b64decode(lines[n + 2], validate=True).decode('utf-8')
+        except ValueError:
+            continue
+        if not 0 <= index < len(checks):
+            continue
+        cmd, text, expect_success = checks[index]
+        results[index] = BatchResult(cmd, exit_code, stdout, stderr,
+                                     _matches(stdout + stderr, exit_code, text, expect_success), elapsed)
+    # Команды, до которых скрипт не дошел или вывод которых оборван, считаются не выполненными
+    for index, (cmd, text, expect_success) in enumerate(checks):
+        if results[index] is None:
+            results[index] = BatchResult(cmd, None, '', '', False, None)
+    return results
@@ -0,0 +1,30 @@
+import time
+
+import pytest
+
+import async_ssh
+from deadline import CommandTimeout
+
+
+# Тесты асинхронных команд на локальной заглушке ssh_stub.py (без проверяемой машины)
+class TestAsyncSSH:
+
+    def test_stall_timeout(self, ssh_stub):
+        args = (ssh_stub.host, ssh_stub.user, ssh_stub.passwd)
+        start = time.monotonic()
+        with pytest.raises(CommandTimeout) as error:
+            async_ssh.run_all(async_ssh.ssh_run(*args, 'echo start; sleep 5; echo end', ssh_stub.port,
+                                                stall_timeout=0.5))
+        assert error.value.reason == 'stall'
+        assert time.monotonic() - start < 4
+
+    def test_check_matches_streams(self, ssh_stub):
+        args = (ssh_stub.host, ssh_stub.user, ssh_stub.passwd)
+        # Строка с номером группы процессов (команда с ограничением времени) в вывод не попадает
+        assert async_ssh.run_all(async_ssh.ssh_run(*args, 'echo out; echo err >&2', ssh_stub.port, timeout=10)) == [
+            (0, 'out\nerr\n')]
+        assert async_ssh.run_all(
+            async_ssh.ssh_check(*args, 'echo foo >&2', 'foo', True, ssh_stub.port),
+            async_ssh.ssh_check(*args, 'echo foo >&2', 'foo', True, ssh_stub.port, streams=('out',)),
+            async_ssh.ssh_checkout_negative(*args, 'echo foo; exit 3', 'foo', ssh_stub.port),
+        ) == [True, False, True]
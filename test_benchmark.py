@@ -0,0 +1,60 @@
+import pytest
+from config import get_config
+from executors import get_executor
+from benchmark import OPERATIONS, case_id, operation_cmds, metrics, update_setup
+from datasets import DatasetSpec, ensure_dataset
+
+# Общая конфигурация (config.yaml, переменные окружения, параметры хоста парка)
+data = get_config()
+# Исполнитель команд на проверяемой машине (ssh или local, ключ backend)
+ex = get_executor(data)
+
+bench = data.get('bench', {})
+
+
+def pytest_generate_tests(metafunc):
+    # Матрица: тип архива x объем данных x количество файлов x количество потоков
+    if 'bench_case' in metafunc.fixturenames:
+        cases = [(t, s, c, m)
+                 for t in bench.get('types', [data['type']])
+                 for s in bench.get('sizes_mb', [1])
+                 for c in bench.get('file_counts', [1])
+                 for m in bench.get('threads', [1])]
+        metafunc.parametrize('bench_case', cases, ids=[case_id(*case) for case in cases])
+
+
+# Бенчмарк пропускной способности 7z a/x/t/u (запускается с ключом --bench)
+@pytest.mark.bench
+class TestBenchmark:
+
+    def test_throughput(self, bench_case, bench_recorder):
+        archive_type, size_mb, file_count, threads = bench_case
+        folder = bench.get('dir', '/home/{}/bench'.format(data['user']))
+        case = case_id(*bench_case)
+        # Подготовка набора данных одним удаленным вызовом (из кэша, если он уже создан)
+        file_size = size_mb * 1024 * 1024 // file_count
+        spec = DatasetSpec(seed=data.get('dataset_seed', 1), count=file_count, size_min=file_size,
+                           size_max=file_size, compressibility=bench.get('compressibility', 0.0), depth=0)
+        ex.check('rm -rf {}'.format(folder), '')
+        ensure_dataset(ex, spec,
+                       data.get('dataset_root', '/home/{}/datasets'.format(data['user'])),
+                       data.get('dataset_budget_mb', 1024), folder + '/src')
+        regressions = []
+        cmds = operation_cmds(folder, archive_type, threads)
+        for operation in OPERATIONS:
+            changed_mb = size_mb
+            if operation == 'u':
+                # 7z u замеряется на измененных данных, показатели считаются по объему изменений
+                setup, changed_mb = update_setup(folder, file_count, file_size)
+                assert ex.check(setup, ''), '{} подготовка 7z u FAIL'.format(case)
+            stats = []
+            assert ex.check(cmds[operation], 'Everything is Ok',
+                            stats=stats), '{} {} FAIL'.format(case, operation)
+            values = metrics(stats[0], changed_mb)
+            print('{} 7z {}: {mb_s:.2f} MB/s, {cpu_s_per_mb:.3f} CPU s/MB, {maxrss_kb} KB'.format(
+                case, operation, **values))
+            regression = bench_recorder.record(case, operation, values)
+            if regression:
+                regressions.append(regression)
+        ex.check('rm -rf {}'.format(folder), '')
+        assert not regressions, 'регрессия производительности: ' + '; '.join(regressions)
@@ -0,0 +1,46 @@
+import pytest
+
+from config import ConfigError, env_overrides, validate
+
+# Обязательные ключи конфигурации
+REQUIRED = {'folder_in': '/tmp/in', 'folder_out': '/tmp/out', 'folder_ext': '/tmp/ext', 'folder_ext2': '/tmp/ext2',
+            'ip': '127.0.0.1', 'user': 'user', 'passwd': 'secret'}
+
+
+# Тесты разбора переменных окружения SEVENZIP_<КЛЮЧ> (без проверяемой машины)
+@pytest.mark.offline
+class TestEnvOverrides:
+
+    @pytest.mark.parametrize('name, key, raw', [
+        ('SEVENZIP_PASSWD', 'passwd', '123456'),
+        ('SEVENZIP_PASSWD', 'passwd', '007'),
+        ('SEVENZIP_JOURNAL_PRIORITY', 'journal_priority', '3'),
+        ('SEVENZIP_IP', 'ip', '10.0.0.5'),
+        ('SEVENZIP_USER', 'user', 'yes'),
+    ])
+    def test_numeric_looking_strings(self, name, key, raw):
+        # Строковые ключи схемы не разбираются как YAML: числа и yes/no остаются строками
+        overrides = env_overrides({name: raw})
+        assert overrides == {key: raw}
+        assert validate(dict(REQUIRED, **overrides))[key] == raw
+
+    def test_typed_values(self):
+        overrides = env_overrides({'SEVENZIP_PRT': '2222', 'SEVENZIP_USE_KEY': 'true', 'SEVENZIP_IO_TIMEOUT': '1.5',
+                                   'SEVENZIP_REQUIRED_PACKAGES': '[p7zip-full, zip]'})
+        config = validate(dict(REQUIRED, **overrides))
+        assert (config['prt'], config['use_key'], config['io_timeout']) == (2222, True, 1.5)
+        assert config['required_packages'] == ['p7zip-full', 'zip']
+
+    def test_invalid_typed_value(self):
+        with pytest.raises(ConfigError):
+            validate(dict(REQUIRED, **env_overrides({'SEVENZIP_PRT': 'ssh'})))
+
+    @pytest.mark.parametrize('value, expected', [(3, '3'), ('err', 'err'), ('0..3', '0..3')])
+    def test_journal_priority(self, value, expected):
+        # В config.yaml уровень журнала пишется и числом (journal_priority: 3), и именем; в journal.collect - строка
+        assert validate(dict(REQUIRED, journal_priority=value))['journal_priority'] == expected
+
+    @pytest.mark.parametrize('value', [True, 1.5, ['err']])
+    def test_invalid_journal_priority(self, value):
+        with pytest.raises(ConfigError):
+            validate(dict(REQUIRED, journal_priority=value))
@@ -0,0 +1,25 @@
+import pytest
+
+import cpu_sampler
+from cpu_sampler import CpuSampler
+from executors import LocalExecutor
+
+
+# Тесты сборщика загрузки процессора на локальной машине (без проверяемой машины)
+@pytest.mark.offline
+class TestCpuSampler:
+
+    def test_skips_foreign_lines_and_reports_exit(self, monkeypatch):
+        # Два замера /proc/stat, между ними сообщение оболочки в stderr; затем команда сбора завершается
+        monkeypatch.setattr(cpu_sampler, 'SAMPLER_CMD', "printf 'cpu 10 0 10 70 10 0 0 0\\n\\n'; "
+                                                        "echo 'sleep: invalid time interval' >&2; "
+                                                        "printf 'cpu 30 0 30 120 20 0 0 0\\n\\n'")
+        sampler = CpuSampler(LocalExecutor())
+        sampler.start()
+        sampler._thread.join(10)
+        stats = sampler.window_stats()
+        assert stats['samples'] == 1
+        assert stats['max'] == pytest.approx(40.0)
+        assert 'код возврата 0' in stats['error']
+        sampler.stop()
+        assert sampler.error == stats['error']
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import ssh_utils
+from benchmark import harness_case_id, measure
+from config import get_config
+
+# Общая конфигурация (config.yaml, переменные окружения, параметры хоста парка)
+data = get_config()
+
+harness = data.get('bench', {}).get('harness', {})
+
+# Операции обвязки: проверка вывода, получение вывода, пакет проверок, загрузка и скачивание по SFTP
+OPERATIONS = ('checkout', 'getout', 'batch', 'upload', 'download')
+
+
+def pytest_generate_tests(metafunc):
+    # Матрица: операция x объем полезной нагрузки x количество одновременных операций
+    if 'harness_case' in metafunc.fixturenames:
+        cases = [(o, p, c)
+                 for o in OPERATIONS
+                 for p in harness.get('payload_kb', [1, 1024])
+                 for c in harness.get('concurrency', [1, 8])]
+        metafunc.parametrize('harness_case', cases, ids=[harness_case_id(*case) for case in cases])
+
+
+def _operation(stub, operation, size, workdir):
+    """
+    Возвращает функцию одной операции (аргумент - номер операции) над заглушкой stub с нагрузкой size байт.
+    """
+    host, user, passwd, port = stub.host, stub.user, stub.passwd, stub.port
+    if operation == 'checkout':
+        cmd = 'head -c {} /dev/zero; echo Everything is Ok'.format(size)
+        return lambda i: ssh_utils.ssh_checkout(host, user, passwd, cmd, 'Everything is Ok', port)
+    if operation == 'getout':
+        cmd = 'head -c {} /dev/zero'.format(size)
+        return lambda i: ssh_utils.ssh_getout(host, user, passwd, cmd, port)
+    if operation == 'batch':
+        count = harness.get('batch_size', 10)
+        checks = [('head -c {} /dev/zero; echo ok'.format(size // count), 'ok', True)] * count
+        return lambda i: all(r.matched for r in ssh_utils.ssh_batch(host, user, passwd, checks, port))
+    source = os.path.join(workdir, 'payload.bin')
+    with open(source, 'wb') as f:
+        f.write(os.urandom(size))
+    if operation == 'upload':
+        # Каждая операция пишет в свой файл: повторная загрузка того же файла была бы пропущена
+        return lambda i: ssh_utils.upload_files(host, user, passwd, source, 'up-{}.bin'.format(i), port).files == 1
+    ssh_utils.upload_files(host, user, passwd, source, 'payload.bin', port)
+    return lambda i: ssh_utils.download_files(host, user, passwd, 'payload.bin',
+                                              os.path.join(workdir, 'down-{}.bin'.format(i)), port).files == 1
+
+
+# Бенчмарк накладных расходов обвязки ssh_utils на локальной заглушке (запускается с ключом --bench)
+@pytest.mark.bench
+class TestHarness:
+
+    def test_overhead(self, harness_case, ssh_stub, harness_recorder, tmp_path):
+        operation, payload_kb, concurrency = harness_case
+        case = harness_case_id(*harness_case)
+        size = payload_kb * 1024
+        func = _operation(ssh_stub, operation, size, str(tmp_path))
+        # Прогрев: подключение к заглушке и первый запуск не входят в замер
+        func(-1)
+        results = []
+        values = measure(lambda i: results.append(func(i)), harness.get('ops', 60), concurrency, size)
+        assert all(results), '{} FAIL'.format(case)
+        print('{}: {ops_s:.1f} ops/s, p50 {p50_ms:.1f} ms, p95 {p95_ms:.1f} ms, p99 {p99_ms:.1f} ms'.format(
+            case, **values))
+        regression = harness_recorder.record(case, operation, values, metric='ops_s')
+        assert not regression, 'регрессия накладных расходов обвязки: ' + regression
@@ -1,130 +1,125 @@
-from ssh_utils import ssh_checkout_negative, ssh_checkout, ssh_getout, upload_files
-import yaml
+from executors import get_executor
+from cpu_sampler import get_sampler
+from journal import collector as journal
+from corrupt import DEFAULT_VARIANTS, check_variants, summarize
+import os
+import pytest
+from config import get_config
 from datetime import datetime
 
-# Чтение конфигурационного файла config.yaml
-with open('config.yaml') as f:
-    data = yaml.safe_load(f)
+# Общая конфигурация (config.yaml, переменные окружения, параметры хоста парка)
+data = get_config()
+# Исполнитель команд на проверяемой машине (ssh или local, ключ backend)
+ex = get_executor(data)
 
 
 class Testneg:
     def save_log(self, starttime, name):
         """
-        Сохраняет лог с указанного времени в файл.
+        Сохраняет в сжатый файл новые записи журнала (с указанного времени либо с курсора предыдущего сбора).
 
         Параметры:
         starttime (str): Время начала логирования.
-        name (str): Имя файла для сохранения лога.
+        name (str): Имя файла для сохранения лога (к нему добавляется расширение .gz).
         """
-        with open(name, 'w') as f:
-            f.write(ssh_getout(data['ip'], data['user'], data['passwd'], 'journalctl --since "{}"'.format(starttime)))
-
-    def check_and_install_p7zip(self):
-        """
-        Проверяет наличие пакета p7zip-full и устанавливает его при необходимости.
-        """
-        if not ssh_checkout(data['ip'], data['user'], data['passwd'], 'dpkg -s p7zip-full',
-                            'Status: install ok installed'):
-            ssh_checkout(data['ip'], data['user'], data['passwd'],
-                         'echo "{}" | sudo -S apt-get update'.format(data['passwd']), '')
-            ssh_checkout(data['ip'], data['user'], data['passwd'],
-                         "echo '{}' | sudo -S apt-get install -y p7zip-full".format(data['passwd']), '')
-
-    def check_and_install_sysstat(self):
-        """
-        Проверяет наличие пакета sysstat и устанавливает его при необходимости.
-        """
-        if not ssh_checkout(data['ip'], data['user'], data['passwd'], 'dpkg -s sysstat',
-                            'Status: install ok installed'):
-            ssh_checkout(data['ip'], data['user'], data['passwd'],
-                         "echo '{}' | sudo -S apt-get update".format(data['passwd']), '')
-            ssh_checkout(data['ip'], data['user'], data['passwd'],
-                         "echo '{}' | sudo -S apt-get install -y sysstat".format(data['passwd']), '')
+        journal.collect(ex, starttime, os.path.join(data.get('log_dir', '.'), name + '.gz'),
+                        units=data.get('journal_units'), priority=data.get('journal_priority'))
 
     def get_max_cpu_usage(self):
         """
         Возвращает максимальную загрузку процессора за время теста.
         """
-        usage = ssh_getout(data['ip'], data['user'], data['passwd'],
-                           "grep 'all' /tmp/mpstat.log | awk '{print $3}' | sort -nr | head -1")
-        return usage.strip()
+        usage = get_sampler(ex).window_stats()['max']
+        return 'n/a' if usage is None else '{:.1f}'.format(usage)
 
-    def start_cpu_monitoring(self):
-        """
-        Запускает мониторинг загрузки процессора.
-        """
-        ssh_checkout(data['ip'], data['user'], data['passwd'], 'mpstat -P ALL 1 > /tmp/mpstat.log &', '')
-
-    def stop_cpu_monitoring(self):
-        """
-        Останавливает мониторинг загрузки процессора.
-        """
-        ssh_checkout(data['ip'], data['user'], data['passwd'], 'pkill mpstat', '')
-
-    def test_nstep1(self, make_folders, make_files, make_bad_arx, start_time):
+    def test_nstep1(self, workspace, required_packages, make_folders, make_files, make_bad_arx, start_time):
         """
         Тест негативного сценария 1:
         Пытаемся извлечь поврежденный архив и проверяем, что возникает ошибка.
 
         Параметры:
+        required_packages (list): Пакеты, установленные перед тестом.
         make_folders (str): Путь к каталогу, в который будут помещены извлеченные файлы.
         make_files (list): Список созданных файлов.
         make_bad_arx (str): Имя поврежденного архива.
         start_time (str): Время начала теста.
         """
-        # self.start_cpu_monitoring()
-        self.check_and_install_p7zip()
-        command = 'cd {}; 7z e {}.{} -o{} -y'.format(data['folder_out'], make_bad_arx, data['type'], data['folder_ext'])
-        result = ssh_checkout_negative(data['ip'], data['user'], data['passwd'], command, 'ERROR:')
-        # self.stop_cpu_monitoring()
+        command = 'cd {}; 7z e {}.{} -o{} -y'.format(workspace['folder_out'], make_bad_arx, data['type'], workspace['folder_ext'])
+        result = ex.check_negative(command, 'ERROR:')
         self.save_log(start_time, 'log1_neg.txt')
         max_cpu_usage = self.get_max_cpu_usage()
         assert result, 'test1 FAIL'
         print(f'Максимальная загрузка процессора во время нег.теста 1: {max_cpu_usage}%')
 
-    def test_nstep2(self, make_files, make_bad_arx, start_time):
+    def test_nstep2(self, workspace, required_packages, make_files, make_bad_arx, start_time):
         """
         Тест негативного сценария 2:
         Пытаемся проверить целостность поврежденного архива и проверяем, что возникает ошибка.
 
         Параметры:
+        required_packages (list): Пакеты, установленные перед тестом.
         make_files (list): Список созданных файлов.
         make_bad_arx (str): Имя поврежденного архива.
         start_time (str): Время начала теста.
         """
-        # self.start_cpu_monitoring()
-        self.check_and_install_p7zip()
-        command = 'cd {}; 7z t {}.{}'.format(data['folder_out'], make_bad_arx, data['type'])
-        result = ssh_checkout_negative(data['ip'], data['user'], data['passwd'], command, 'ERROR:')
-        # self.stop_cpu_monitoring()
+        command = 'cd {}; 7z t {}.{}'.format(workspace['folder_out'], make_bad_arx, data['type'])
+        result = ex.check_negative(command, 'ERROR:')
         self.save_log(start_time, 'log2_neg.txt')
         max_cpu_usage = self.get_max_cpu_usage()
         assert result, 'test2 FAIL'
         print(f'Максимальная загрузка процессора во время нег.теста 2: {max_cpu_usage}%')
 
-    def test_nstep3(self, start_time):
+    @pytest.mark.xdist_group('package')
+    @pytest.mark.changes_packages
+    def test_nstep3(self, required_packages, start_time):
         """
         Тест негативного сценария 3:
         Пытаемся удалить и проверить удаление пакета.
 
         Параметры:
+        required_packages (list): Пакеты, установленные перед тестом.
         start_time (str): Время начала теста.
         """
-        # self.start_cpu_monitoring()
-        self.check_and_install_p7zip()
         res = []
-        res.append(ssh_checkout(
-            data['ip'], data['user'], data['passwd'],
+        res.append(ex.check(
             "echo '{}' | sudo -S dpkg -r {}".format(data['passwd'], data['pkgname']),
             "Удаляется"
         ))
-        res.append(ssh_checkout(
-            data['ip'], data['user'], data['passwd'],
+        res.append(ex.check(
             "echo '{}' | sudo -S dpkg -s {}".format(data['passwd'], data['pkgname']),
             'Status: deinstall ok'
         ))
-        # self.stop_cpu_monitoring()
         self.save_log(start_time, 'log3_neg.txt')
         max_cpu_usage = self.get_max_cpu_usage()
         assert all(res), 'test3 FAIL'
         print(f'Максимальная загрузка процессора во время нег.теста 3: {max_cpu_usage}%')
+
+    def test_nstep4(self, workspace, required_packages, make_folders, make_files, corrupt_archives, start_time,
+                    record_property):
+        """
+        Тест негативного сценария 4:
+        Проверяем, что 7z t и 7z e обнаруживают повреждения всех классов (обрезка, инверсия бита, порча CRC
+        в заголовке, данных и конечном заголовке архива). Проверки выполняются параллельными пакетами.
+
+        Параметры:
+        required_packages (list): Пакеты, установленные перед тестом.
+        make_folders (str): Каталоги рабочего пространства.
+        make_files (list): Список созданных файлов.
+        corrupt_archives (dict): Поврежденные варианты архива.
+        start_time (str): Время начала теста.
+        record_property: Сохранение сводки обнаружения в свойствах теста.
+        """
+        detections = check_variants(ex, DEFAULT_VARIANTS, corrupt_archives,
+                                    '{}/corrupt'.format(workspace['folder_ext']),
+                                    batches=data.get('corrupt_batches', 4))
+        summary = summarize(detections)
+        record_property('corruption', summary)
+        for name, ops in sorted(summary.items()):
+            print('{:<18} {}'.format(name, '  '.join(
+                '7z {}: {} {:.3f}s'.format(op, 'обнаружено' if r['detected'] else 'НЕ обнаружено', r['latency'])
+                for op, r in sorted(ops.items()))))
+        self.save_log(start_time, 'log4_neg.txt')
+        max_cpu_usage = self.get_max_cpu_usage()
+        missed = ['{} (7z {})'.format(d.name, d.op) for d in detections if not d.detected]
+        assert not missed, 'test4 FAIL: не обнаружены {}'.format(', '.join(missed))
+        print(f'Максимальная загрузка процессора во время нег.теста 4: {max_cpu_usage}%')
@@ -1,63 +1,60 @@
-import yaml
+import os
+import pytest
+from config import get_config
 from utils import getout
-from ssh_utils import ssh_checkout, upload_files, ssh_getout
+from executors import get_executor
+from journal import collector as journal
+from cpu_sampler import get_sampler
+from archive_index import load_index
+from manifest import hash_cmd, parse_7z_hashes, compare_manifests
+from tree_diff import diff_remote, format_diff
 
-# Загружаем конф. файл
-with open('config.yaml') as f:
-    data = yaml.safe_load(f)
+# Общая конфигурация (config.yaml, переменные окружения, параметры хоста парка)
+data = get_config()
+# Исполнитель команд на проверяемой машине (ssh или local, ключ backend)
+ex = get_executor(data)
 
 
 # Определяем класс содержащий полоэительные тесты
 class TestPositive:
 
-    def check_and_install_sysstat(self):
-        """
-        Проверяет наличие пакета sysstat и устанавливает его при необходимости.
-        """
-        if not ssh_checkout(data['ip'], data['user'], data['passwd'], 'dpkg -s sysstat',
-                            'Status: install ok installed'):
-            ssh_checkout(data['ip'], data['user'], data['passwd'],
-                         'echo "{}" | sudo -S apt-get update'.format(data['passwd']), '')
-            ssh_checkout(data['ip'], data['user'], data['passwd'],
-                         'echo "{}" | sudo -S apt-get install -y sysstat'.format(data['passwd']), '')
-
     # опредезяем метод для сохранения логов в файл
     def save_log(self, starttime, name):
         """
-        Сохраняет лог с указанного времени в файл.
+        Сохраняет в сжатый файл новые записи журнала (с указанного времени либо с курсора предыдущего сбора).
 
         Параметры:
         starttime (str): Время начала логирования.
-        name (str): Имя файла для сохранения лога.
+        name (str): Имя файла для сохранения лога (к нему добавляется расширение .gz).
         """
-        with open(name, 'w') as f:
-            f.write(ssh_getout(data['ip'], data['user'], data['passwd'], 'journalctl --since "{}"'.format(starttime)))
+        journal.collect(ex, starttime, os.path.join(data.get('log_dir', '.'), name + '.gz'),
+                        units=data.get('journal_units'), priority=data.get('journal_priority'))
 
     def get_max_cpu_usage(self):
         """
         Возвращает максимальную загрузку процессора за время теста.
         """
-        usage = ssh_getout(data['ip'], data['user'], data['passwd'],
-                           "grep 'all' /tmp/mpstat.log | awk '{print $3}' | sort -nr | head -1")
-        return usage.strip()
+        usage = get_sampler(ex).window_stats()['max']
+        return 'n/a' if usage is None else '{:.1f}'.format(usage)
 
     # Тест 1. Загрузка пакета и проверка установки
+    @pytest.mark.xdist_group('package')
+    @pytest.mark.changes_packages
     def test_step1(self, start_time):
         res = []
         # Загрузка пакета на удаленный хост
-        upload_files(data['ip'], data['user'], data['passwd'], data['pkgname'] + '.deb',
-                     '/home/{}/{}.deb'.format(data['user'], data['pkgname']))
+        ex.put(data['pkgname'] + '.deb', '/home/{}/{}.deb'.format(data['user'], data['pkgname']))
         # Установка пакета на удаленном хосте и проверка успеха
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'echo "{}" | sudo -S dpkg -i'
-                                                                          ' /home/{}/{}.deb'.format(data['passwd'],
-                                                                                                    data['user'],
-                                                                                                    data['pkgname']),
-                                'Настраивается пакет'))
+        res.append(ex.check('echo "{}" | sudo -S dpkg -i'
+                            ' /home/{}/{}.deb'.format(data['passwd'],
+                                                      data['user'],
+                                                      data['pkgname']),
+                            'Настраивается пакет'))
         # Проверка статуса пакета (установлен)
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'echo "{}" | '
-                                                                          'sudo -S dpkg -s {}'.format(data['passwd'],
-                                                                                                      data['pkgname']),
-                                'Status: install ok installed'))
+        res.append(ex.check('echo "{}" | '
+                            'sudo -S dpkg -s {}'.format(data['passwd'],
+                                                        data['pkgname']),
+                            'Status: install ok installed'))
         # Сохранение лога в файл
         self.save_log(start_time, 'log1.txt')
         max_cpu_usage = self.get_max_cpu_usage()
@@ -65,14 +62,14 @@ class TestPositive:
         print(f'Максимальная загрузка процессора во время теста 1: {max_cpu_usage}%')
 
     # Тест 2. Упаковка папки и проверка архива
-    def test_step2(self, make_folders, clear_folders, make_files, start_time):
+    def test_step2(self, workspace, make_folders, clear_folders, make_files, start_time, proc_stats):
         # Создание архива определенной папки
-        res1 = ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {};'
-                                                                      ' 7z a {}/arx2'.format(data['folder_in'],
-                                                                                             data['folder_out']),
-                            'Everything is Ok')
+        res1 = ex.check('cd {};'
+                        ' 7z a {}/arx2'.format(workspace['folder_in'],
+                                               workspace['folder_out']),
+                        'Everything is Ok', stats=proc_stats)
         # Проверка создания файла архива
-        res2 = ssh_checkout(data['ip'], data['user'], data['passwd'], 'ls {}'.format(data['folder_out']), 'arx2.7z')
+        res2 = ex.check('ls {}'.format(workspace['folder_out']), 'arx2.7z')
         # Сохранение лога в файл
         self.save_log(start_time, 'log2.txt')
         max_cpu_usage = self.get_max_cpu_usage()
@@ -80,61 +77,63 @@ class TestPositive:
         print(f'Максимальная загрузка процессора во время теста 2: {max_cpu_usage}%')
 
     # Тест 3. Распаковка архива и проверка распакованных файлов
-    def test_step3(self, clear_folders, make_files, start_time):
+    def test_step3(self, workspace, clear_folders, make_files, start_time, proc_stats):
         res = []
         # Создание архива определенной папки
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z a '
-                                                                          '{}/arx2'.format(data['folder_in'],
-                                                                                           data['folder_out']),
-                                'Everything is Ok'))
+        res.append(ex.check('cd {}; 7z a '
+                            '{}/arx2'.format(workspace['folder_in'],
+                                             workspace['folder_out']),
+                            'Everything is Ok', stats=proc_stats))
         # Распаковка архива в определенную папку
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z e '
-                                                                          'arx2.7z -o{} -y'.format(data['folder_out'],
-                                                                                                   data['folder_ext']),
-                                'Everything is Ok'))
-        # Проверка файлов в папке
-        for item in make_files:
-            res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'ls {}'.format(data['folder_ext']), item))
+        res.append(ex.check('cd {}; 7z e '
+                            'arx2.7z -o{} -y'.format(workspace['folder_out'],
+                                                     workspace['folder_ext']),
+                            'Everything is Ok', stats=proc_stats))
+        # Сравнение распакованного дерева с исходным: состав, размеры и содержимое файлов
+        diff = diff_remote(ex, workspace['folder_in'], workspace['folder_ext'])
+        res.append(not any(diff))
         max_cpu_usage = self.get_max_cpu_usage()
         # Сохранение лога в файл
         self.save_log(start_time, 'log3.txt')
-        assert all(res), 'test3 FAIL'
+        assert all(res), 'test3 FAIL: {}'.format(format_diff(diff))
         print(f'Максимальная загрузка процессора во время теста 3: {max_cpu_usage}%')
 
     # Тест 4. Проверка целостности архива
-    def test_step4(self, start_time):
+    def test_step4(self, workspace, arx2, start_time, proc_stats):
         # Сохранение лога в файл
         self.save_log(start_time, 'log4.txt')
         max_cpu_usage = self.get_max_cpu_usage()
-        assert ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z t'
-                                                                      ' arx2.7z'.format(data['folder_out']),
-                            'Everything is Ok'), 'test4 FAIL'
+        assert ex.check('cd {}; 7z t'
+                        ' {}'.format(workspace['folder_out'], arx2),
+                        'Everything is Ok', stats=proc_stats), 'test4 FAIL'
         print(f'Максимальная загрузка процессора во время теста 3: {max_cpu_usage}%')
 
     # Тест 5. Обновление архива
-    def test_step5(self, start_time):
+    def test_step5(self, workspace, arx2, start_time, proc_stats):
         # Сохранение лога в файл
         self.save_log(start_time, 'log5.txt')
         max_cpu_usage = self.get_max_cpu_usage()
-        assert ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z u'
-                                                                      ' arx2.7z'.format(data['folder_in']),
-                            'Everything is Ok'), 'test5 FAIL'
+        assert ex.check('cd {}; 7z u'
+                        ' {}'.format(workspace['folder_in'], arx2),
+                        'Everything is Ok', stats=proc_stats), 'test5 FAIL'
         print(f'Максимальная загрузка процессора во время теста 5: {max_cpu_usage}%')
 
     # Тест 6. Листинг архива и проверка файлов
-    def test_step6(self, clear_folders, make_files, start_time):
+    def test_step6(self, workspace, agent, clear_folders, make_files, start_time):
         res = []
         # Создание архива определенной папки
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z a '
-                                                                          '{}/arx2'.format(data['folder_in'],
-                                                                                           data['folder_out']),
-                                'Everything is Ok'))
-        # Проверка файлов в папке
+        res.append(ex.check('cd {}; 7z a '
+                            '{}/arx2'.format(workspace['folder_in'],
+                                             workspace['folder_out']),
+                            'Everything is Ok'))
+        # Листинг архива получается и разбирается один раз; наличие файлов, их размер и CRC
+        # проверяются по индексу элементов, а не поиском подстроки в выводе
+        index = load_index(ex, '{}/arx2.7z'.format(workspace['folder_out']))
+        expected = agent.manifest(workspace['folder_in'], make_files, algos=('crc32',))
         for item in make_files:
-            res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z l'
-                                                                              ' arx2.7z'.format(data['folder_out'],
-                                                                                                data['folder_ext']),
-                                    item))
+            entry = index.get(item)
+            res.append(entry is not None and entry.size == expected[item]['size']
+                       and entry.crc == expected[item]['crc32'])
         # Сохранение лога в файл
         self.save_log(start_time, 'log6.txt')
         max_cpu_usage = self.get_max_cpu_usage()
@@ -142,72 +141,64 @@ class TestPositive:
         print(f'Максимальная загрузка процессора во время теста 6: {max_cpu_usage}%')
 
     # Тест 7. Создание архива и извлечение в подпапку, проверка файлов
-    def test_step7(self, clear_folders, make_files, make_subfolder, start_time):
+    def test_step7(self, workspace, clear_folders, make_files, make_subfolder, start_time, proc_stats):
         res = []
         # Создание архива определенной папки
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z a '
-                                                                          '{}/arx'.format(data['folder_in'],
-                                                                                          data['folder_out']),
-                                'Everything is Ok'))
+        res.append(ex.check('cd {}; 7z a '
+                            '{}/arx'.format(workspace['folder_in'],
+                                            workspace['folder_out']),
+                            'Everything is Ok', stats=proc_stats))
         # Извлечение в определенную папку
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {};'
-                                                                          ' 7z x arx.7z -o{} -y'.format(
-            data['folder_out'], data['folder_ext2']), 'Everything is Ok'))
-        # Проверка файлов в папке и их содержания
-        for item in make_files:
-            res.append(
-                ssh_checkout(data['ip'], data['user'], data['passwd'], 'ls {}'.format(data['folder_ext2']), item))
-
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'ls {}'.format(data['folder_ext2']),
-                                make_subfolder[0]))
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'ls {}/{}'.format(data['folder_ext2'],
-                                                                                            make_subfolder[0]),
-                                make_subfolder[1]))
+        res.append(ex.check('cd {};'
+                            ' 7z x arx.7z -o{} -y'.format(workspace['folder_out'],
+                                                          workspace['folder_ext2']),
+                            'Everything is Ok', stats=proc_stats))
+        # Сравнение распакованного дерева с исходным (файлы, подкаталог и его содержимое)
+        diff = diff_remote(ex, workspace['folder_in'], workspace['folder_ext2'])
+        res.append(not any(diff))
         # Сохранение лога в файл
         self.save_log(start_time, 'log7.txt')
         max_cpu_usage = self.get_max_cpu_usage()
-        assert all(res), 'test7 FAIL'
+        assert all(res), 'test7 FAIL: {}'.format(format_diff(diff))
         print(f'Максимальная загрузка процессора во время теста 7: {max_cpu_usage}%')
 
     # Тест 8. Удаление файла из архива
-    def test_step8(self, start_time):
+    def test_step8(self, workspace, arx, start_time):
         # Сохранение лога в файл
         self.save_log(start_time, 'log8.txt')
         max_cpu_usage = self.get_max_cpu_usage()
-        assert ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z d arx.7z'.format(data['folder_out']),
-                            'Everything is Ok'), 'test8 FAIL'
+        assert ex.check('cd {}; 7z d {}'.format(workspace['folder_out'],
+                                                arx),
+                        'Everything is Ok'), 'test8 FAIL'
         print(f'Максимальная загрузка процессора во время теста 8: {max_cpu_usage}%')
 
     # Тест 9. Подсчет и проверка хэша файлов
-    def test_step9(self, clear_folders, make_files, start_time):
+    def test_step9(self, workspace, agent, clear_folders, make_files, start_time):
         # Сохранение лога в файл
         self.save_log(start_time, 'log9.txt')
-        res = []
-        for item in make_files:
-            res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z h {}'.format(data['folder_in'],
-                                                                                                      item),
-                                    'Everything is Ok'))
-            hash_f = ssh_getout(data['ip'], data['user'], data['passwd'], 'cd {}; '
-                                                                          'crc32 {}'.format(data['folder_in'],
-                                                                                            item)).upper()
-            res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'cd {}; 7z h {}'.format(data['folder_in'],
-                                                                                                      item), hash_f))
+        # Хэши всех файлов одним запуском 7z h
+        out = ex.getout('cd {}; {}'.format(workspace['folder_in'], hash_cmd(make_files)))
+        # Эталонный манифест: каждый файл читается на удаленной машине один раз (CRC32 и SHA-256 за одно чтение)
+        expected = agent.manifest(workspace['folder_in'], make_files)
+        problems = compare_manifests(expected, parse_7z_hashes(out))
         max_cpu_usage = self.get_max_cpu_usage()
-        assert all(res), 'test9 FAIL'
+        assert 'Everything is Ok' in out and not problems, 'test9 FAIL: {}'.format('; '.join(problems))
         print(f'Максимальная загрузка процессора во время теста 9: {max_cpu_usage}%')
 
     # Тест 10. Удаление пакета
+    @pytest.mark.xdist_group('package')
+    @pytest.mark.changes_packages
     def test_step10(self, start_time):
         res = []
         # Удаление пакета
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'echo "{}" | sudo -S dpkg -r'
-                                                                          ' {}'.format(data['passwd'], data['pkgname']),
-                                'Удаляется'))
+        res.append(ex.check('echo "{}" | sudo -S dpkg -r'
+                            ' {}'.format(data['passwd'], data['pkgname']),
+                            'Удаляется'))
         # Проверка статуса
-        res.append(ssh_checkout(data['ip'], data['user'], data['passwd'], 'echo "{}" | '
-                                                                          'sudo -S dpkg -s {}'.format(data['passwd'],
-                                                                                                      data['pkgname']),
-                                'Status: deinstall ok'))
+        res.append(ex.check('echo "{}" | '
+                            'sudo -S dpkg -s {}'.format(data['passwd'],
+                                                        data['pkgname']),
+                            'Status: deinstall ok'))
         # Сохранение лога в файл
         self.save_log(start_time, 'log10.txt')
         max_cpu_usage = self.get_max_cpu_usage()
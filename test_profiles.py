@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+import ssh_utils
+from benchmark import measure
+from config import get_config
+from ssh_utils import SSHPool, pool
+
+# Общая конфигурация (config.yaml, переменные окружения, параметры хоста парка)
+data = get_config()
+
+profiles_bench = data.get('bench', {}).get('profiles', {})
+
+# Операции передачи: поток вывода команды (сжимаемые данные), загрузка и скачивание по SFTP (случайные данные)
+TRANSFERS = ('exec', 'upload', 'download')
+
+
+def pytest_generate_tests(metafunc):
+    # Профили из bench.profiles.names, по умолчанию - default и все профили ssh_profiles
+    if 'profile_name' in metafunc.fixturenames:
+        names = profiles_bench.get('names') or ['default'] + sorted(set(data['ssh_profiles']) - {'default'})
+        metafunc.parametrize('profile_name', names)
+
+
+def _negotiated(transport):
+    """
+    Возвращает согласованные с сервером алгоритмы транспорта.
+    """
+    return {
+        'cipher': transport.local_cipher,
+        'mac': transport.local_mac,
+        'host_key': transport.host_key_type,
+        'compression': transport.local_compression,
+    }
+
+
+# Бенчмарк профилей SSH на проверяемой машине (запускается с ключом --bench): время подключения
+# (TCP, обмен ключами, аутентификация) и пропускная способность передачи данных для каждого профиля
+@pytest.mark.bench
+class TestProfiles:
+
+    @pytest.fixture(autouse=True)
+    def _ssh_only(self):
+        if data['backend'] != 'ssh':
+            pytest.skip('бенчмарк профилей SSH: нужен backend: ssh')
+
+    def test_handshake(self, profile_name, ssh_profile, profile_recorder):
+        profile = ssh_profile(profile_name)
+        # Отдельный пул: каждое подключение новое, общий пул и его сессии не затрагиваются
+        probe = SSHPool(connect_timeout=pool.connect_timeout, banner_timeout=pool.banner_timeout,
+                        auth_timeout=pool.auth_timeout, keepalive=0, profile=profile)
+        negotiated = {}
+
+        def connect(i):
+            transport = probe._connect(data['ip'], data['user'], data['passwd'], data['prt'], data['use_key'],
+                                       profile.compression['exec'])
+            negotiated.update(_negotiated(transport))
+            transport.close()
+
+        connect(-1)
+        values = measure(connect, profiles_bench.get('connects', 10), 1)
+        values.update(negotiated)
+        print('{}: подключение p50 {p50_ms:.1f} ms, p95 {p95_ms:.1f} ms; {cipher}, {mac}, {host_key}, '
+              'сжатие {compression}'.format(profile_name, **values))
+        regression = profile_recorder.record(profile_name, 'handshake', values, metric='ops_s')
+        assert not regression, 'регрессия подключения: ' + regression
+
+    @pytest.mark.parametrize('transfer', TRANSFERS)
+    def test_throughput(self, profile_name, transfer, ssh_profile, profile_recorder, tmp_path):
+        ssh_profile(profile_name)
+        size = profiles_bench.get('payload_mb', 16) * 1024 * 1024
+        host, user, passwd, port, use_key = data['ip'], data['user'], data['passwd'], data['prt'], data['use_key']
+        folder = '{}/profiles'.format(data['bench']['dir'])
+        ssh_utils.ssh_getout(host, user, passwd, 'rm -rf {0}; mkdir -p {0}'.format(folder), port, use_key=use_key)
+        if transfer == 'exec':
+            cmd = 'head -c {} /dev/zero'.format(size)
+
+            def func(i):
+                assert len(ssh_utils.ssh_getout(host, user, passwd, cmd, port, use_key=use_key)) == size
+        else:
+            source = os.path.join(str(tmp_path), 'payload.bin')
+            with open(source, 'wb') as f:
+                f.write(os.urandom(size))
+            ssh_utils.upload_files(host, user, passwd, source, folder + '/payload.bin', port, use_key=use_key)
+
+            # Каждая операция пишет в свой файл: повторная передача того же файла была бы пропущена
+            def func(i):
+                if transfer == 'upload':
+                    target = '{}/up-{}.bin'.format(folder, i)
+                    assert ssh_utils.upload_files(host, user, passwd, source, target, port,
+                                                  use_key=use_key).bytes == size
+                else:
+                    target = os.path.join(str(tmp_path), 'down-{}.bin'.format(i))
+                    assert ssh_utils.download_files(host, user, passwd, folder + '/payload.bin', target, port,
+                                                    use_key=use_key).bytes == size
+
+        values = measure(func, profiles_bench.get('repeats', 3), 1, size)
+        ssh_utils.ssh_getout(host, user, passwd, 'rm -rf {}'.format(folder), port, use_key=use_key)
+        print('{} {}: {mb_s:.1f} МБ/с'.format(profile_name, transfer, **values))
+        regression = profile_recorder.record(profile_name, transfer, values)
+        assert not regression, 'регрессия пропускной способности: ' + regression
@@ -0,0 +1,108 @@
+import base64
+import threading
+import time
+
+import paramiko
+import pytest
+
+import ssh_utils
+from ssh_profiles import HostKeyCache
+from ssh_utils import BatchResult, SSHPool
+
+
+def _read_all(channel):
+    out = b''
+    while True:
+        data = channel.recv(32768)
+        if not data:
+            return out
+        out += data
+
+
+# Тесты пула SSH-сессий на локальной заглушке ssh_stub.py (без проверяемой машины)
+class TestSSHPool:
+
+    def test_eviction_keeps_busy_sessions(self, ssh_stub):
+        # idle_timeout=0: при каждом обращении к пулу все сессии без открытых каналов считаются простаивающими
+        pool = SSHPool(idle_timeout=0)
+        args = (ssh_stub.host, ssh_stub.user, ssh_stub.passwd, ssh_stub.port)
+        try:
+            transport = pool.get(*args)
+            channel = pool.open_session(transport)
+            channel.exec_command('sleep 0.5; echo done')
+            time.sleep(0.05)
+            # Проход вытеснения не закрывает сессию, пока канал открыт
+            assert pool.get(*args) is transport
+            assert _read_all(channel) == b'done\n'
+            assert channel.recv_exit_status() == 0
+            channel.close()
+            time.sleep(0.05)
+            # Без открытых каналов простаивающая сессия закрывается и заменяется новой
+            assert pool.get(*args) is not transport
+            assert not transport.is_active()
+        finally:
+            pool.close_all()
+
+    def test_connect_outside_pool_lock(self, ssh_stub):
+        # Зависшее подключение к одному хосту не блокирует получение сессий других хостов
+        pool = SSHPool()
+        args = (ssh_stub.host, ssh_stub.user, ssh_stub.passwd, ssh_stub.port)
+        connect = pool._connect
+        release = threading.Event()
+
+        def slow_connect(host, *rest):
+            if host == 'stalled':
+                release.wait(10)
+                raise OSError('отключено')
+            return connect(host, *rest)
+
+        pool._connect = slow_connect
+        stalled = threading.Thread(target=lambda: pytest.raises(OSError, pool.get, 'stalled', *args[1:]))
+        stalled.start()
+        try:
+            time.sleep(0.05)
+            start = time.monotonic()
+            assert pool.get(*args).is_active()
+            assert time.monotonic() - start < 5
+        finally:
+            release.set()
+            stalled.join()
+            pool.close_all()
+
+
+# Тесты файла известных ключей хостов (без проверяемой машины)
+@pytest.mark.offline
+class TestHostKeyCache:
+
+    def test_trusted_keys_are_not_saved(self, tmp_path):
+        path = str(tmp_path / 'known_hosts')
+        learned, trusted = paramiko.ECDSAKey.generate(), paramiko.ECDSAKey.generate()
+        cache = HostKeyCache(path)
+        cache.trust('127.0.0.1', 2200, trusted)
+        # Доверенный ключ принимается, но запоминание нового ключа (TOFU) записывает в файл только его
+        cache.check('127.0.0.1', 2200, trusted)
+        cache.check('10.0.0.5', 22, learned)
+        saved = paramiko.HostKeys(path)
+        assert saved.lookup('[127.0.0.1]:2200') is None
+        assert saved.lookup('10.0.0.5')[learned.get_name()] == learned
+        # Новый процесс ключу заглушки не доверяет: другой ключ того же хоста запоминается при первом подключении
+        HostKeyCache(path).check('127.0.0.1', 2200, learned)
+        with pytest.raises(paramiko.BadHostKeyException):
+            cache.check('10.0.0.5', 22, trusted)
+
+
+# Тесты разбора вывода пакета команд ssh_batch (без проверяемой машины)
+@pytest.mark.offline
+class TestSSHBatch:
+
+    def test_truncated_output(self):
+        marker = '__BATCH_test__'
+        checks = [('echo a', 'a', True), ('echo b', 'b', True), ('echo c', 'c', True), ('echo d', 'd', True)]
+        ok = base64.b64encode(b'a\n').decode()
+        # Команда 0 выполнена; у 1 нет base64 stderr, у 2 вместо base64 - сообщение shell, 3 - маркер оборван
+        out = '\n'.join([marker + ' 0 0 1000', ok, '', marker + ' 1 0 1000', ok,
+                         marker + ' 2 0 1000', 'sh: base64: not found', 'x', marker + ' 3 0'])
+        results = ssh_utils._parse_batch(out, marker, checks)
+        assert results[0] == BatchResult('echo a', 0, 'a\n', '', True, 1e-6)
+        assert [r.exit_code for r in results[1:]] == [None, None, None]
+        assert not any(r.matched for r in results[1:])
@@ -0,0 +1,18 @@
+import pytest
+
+from utils import checkout, getout
+
+
+# Тесты локальных помощников utils.py (без проверяемой машины): как и subprocess.run(stdout=PIPE),
+# они работают только с stdout
+@pytest.mark.offline
+class TestUtils:
+
+    def test_checkout_ignores_stderr(self):
+        assert checkout('echo foo', 'foo')
+        assert not checkout('echo foo >&2', 'foo')
+        assert not checkout('echo foo; exit 1', 'foo')
+
+    def test_getout_stdout_only(self):
+        assert getout('echo out; echo err >&2') == 'out\n'
+        assert getout('echo out; echo err >&2', stderr=True) == 'out\nerr\n'
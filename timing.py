@@ -0,0 +1,162 @@
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+
+from cpu_sampler import _percentile
+
+# Фазы удаленных операций в порядке выполнения
+# (rpc - запрос к агенту файловых операций remote_agent)
+PHASES = ('connect', 'handshake', 'auth', 'exec', 'first_byte', 'read', 'sftp', 'rpc')
+
+# Перцентили в отчетах
+QUANTILES = (50, 95, 99)
+
+# Пароль, передаваемый sudo через stdin (echo <пароль> | sudo -S): без кавычек он не попал бы под _QUOTED
+_SUDO_PASSWORD = re.compile(r"\becho\s+\S+(\s*\|\s*sudo\s+-S\b)")
+_QUOTED = re.compile(r"(?:'[^']*'|\"(?:[^\"\\]|\\.)*\")+")
+_PATH = re.compile(r"~?/[^\s;|&'\"<>]*")
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def command_template(cmd, limit=80):
+    """
+    Возвращает шаблон команды для группировки замеров: строки в кавычках (в том числе пароли
+    и тексты скриптов), пути и числа заменяются заполнителями.
+    """
+    text = _SUDO_PASSWORD.sub(r'echo <str>\1', cmd)
+    text = _QUOTED.sub('<str>', text)
+    text = _PATH.sub('<path>', text)
+    text = _NUMBER.sub('<n>', text)
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+
+def _stats(values):
+    result = {'count': len(values), 'total': sum(values), 'max': max(values)}
+    result['mean'] = result['total'] / len(values)
+    for q in QUANTILES:
+        result['p{}'.format(q)] = _percentile(values, q)
+    return result
+
+
+class Timings:
+    """
+    Накопитель длительностей фаз удаленных операций.
+
+    Замеры хранятся компактно (array) по ключу (тест, фаза, шаблон команды); текущий тест задается
+    хуком pytest_runtest_protocol в conftest, замеры фоновых потоков относятся к тесту, который выполняется в это время.
+    """
+
+    def __init__(self):
+        self.test = None
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase, seconds, template=''):
+        """
+        Сохраняет длительность фазы операции.
+
+        Параметры:
+        phase (str): Фаза (одна из PHASES).
+        seconds (float): Длительность в секундах.
+        template (str): Шаблон команды (см. command_template) или описание операции.
+        """
+        key = (self.test or '', phase, template)
+        with self._lock:
+            series = self._samples.get(key)
+            if series is None:
+                series = self._samples[key] = array('d')
+            series.append(seconds)
+
+    @contextmanager
+    def timed(self, phase, template=''):
+        """
+        Контекстный менеджер: сохраняет длительность блока как фазу phase.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(phase, time.monotonic() - start, template)
+
+    def __bool__(self):
+        return bool(self._samples)
+
+    def _group(self, key):
+        groups = {}
+        with self._lock:
+            for sample_key, series in self._samples.items():
+                groups.setdefault(key(sample_key), array('d')).extend(series)
+        return groups
+
+    def by_phase(self):
+        """
+        Возвращает статистику по фазам: фаза -> count/total/mean/max/p50/p95/p99.
+        """
+        return {phase: _stats(values) for phase, values in self._group(lambda k: k[1]).items()}
+
+    def by_template(self):
+        """
+        Возвращает статистику по парам (фаза, шаблон команды), отсортированную по суммарному времени.
+        """
+        rows = [dict(_stats(values), phase=phase, template=template)
+                for (phase, template), values in self._group(lambda k: (k[1], k[2])).items()]
+        return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+    def by_test(self):
+        """
+        Возвращает статистику по тестам: тест -> фаза -> count/total/mean/max/p50/p95/p99.
+        """
+        result = {}
+        for (test, phase), values in self._group(lambda k: (k[0], k[1])).items():
+            result.setdefault(test, {})[phase] = _stats(values)
+        return result
+
+    def save(self, results_dir, suffix=''):
+        """
+        Сохраняет отчет в JSON и в текстовый файл для Prometheus (node_exporter textfile collector).
+
+        Возвращает:
+        tuple: Пути к файлу JSON и к файлу .prom.
+        """
+        os.makedirs(results_dir, exist_ok=True)
+        name = 'timing{}'.format('-' + suffix if suffix else '')
+        json_path = os.path.join(results_dir, name + '.json')
+        report = {'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'phases': self.by_phase(),
+                  'templates': self.by_template(), 'tests': self.by_test()}
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+        prom_path = os.path.join(results_dir, name + '.prom')
+        with open(prom_path + '.tmp', 'w') as f:
+            f.write(prometheus_text(report['templates']))
+        # Коллектор может прочитать файл в любой момент, поэтому он подменяется атомарно
+        os.replace(prom_path + '.tmp', prom_path)
+        return json_path, prom_path
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(rows, metric='sevenzip_remote_operation_seconds'):
+    """
+    Возвращает статистику по шаблонам команд в текстовом формате Prometheus (метрика типа summary).
+    """
+    lines = ['# HELP {} Duration of remote operation phases.'.format(metric),
+             '# TYPE {} summary'.format(metric)]
+    for row in rows:
+        labels = 'phase="{}",template="{}"'.format(_label(row['phase']), _label(row['template']))
+        for q in QUANTILES:
+            lines.append('{}{{{},quantile="{}"}} {:.6f}'.format(metric, labels, q / 100.0, row['p{}'.format(q)]))
+        lines.append('{}_sum{{{}}} {:.6f}'.format(metric, labels, row['total']))
+        lines.append('{}_count{{{}}} {}'.format(metric, labels, row['count']))
+    return '\n'.join(lines) + '\n'
+
+
+# Общий накопитель замеров процесса
+recorder = Timings()
@@ -0,0 +1,124 @@
+import json
+import shlex
+from collections import namedtuple
+
+# Элемент манифеста дерева: путь относительно корня, тип ('f' - файл, 'd' - каталог, 'l' - ссылка),
+# размер, права доступа (восьмеричная строка) и SHA-256 содержимого (для ссылки - цели ссылки)
+TreeEntry = namedtuple('TreeEntry', ['path', 'kind', 'size', 'mode', 'sha256'])
+
+# Результат сравнения деревьев: missing - есть только в исходном дереве, extra - только в проверяемом,
+# changed - тройки (путь, поле, (значение в исходном, значение в проверяемом))
+TreeDiff = namedtuple('TreeDiff', ['missing', 'extra', 'changed'])
+
+# Обход выполняется на проверяемой машине одним вызовом python3. Элементы каталога выводятся
+# по отсортированным именам, каталог - перед своим содержимым, по одной JSON-строке на элемент,
+# поэтому манифест можно читать потоком и сравнивать слиянием без накопления.
+_MANIFEST_SCRIPT = r'''
+import hashlib, json, os, stat, sys
+root = sys.argv[1]
+def walk(rel):
+    path = os.path.join(root, rel) if rel else root
+    for name in sorted(os.listdir(path)):
+        child = os.path.join(rel, name) if rel else name
+        full = os.path.join(root, child)
+        st = os.lstat(full)
+        mode = oct(stat.S_IMODE(st.st_mode))
+        if stat.S_ISLNK(st.st_mode):
+            digest = hashlib.sha256(os.readlink(full).encode('utf-8', 'surrogateescape')).hexdigest()
+            print(json.dumps([child, 'l', None, mode, digest]))
+        elif stat.S_ISDIR(st.st_mode):
+            print(json.dumps([child, 'd', None, mode, None]))
+            walk(child)
+        else:
+            digest = hashlib.sha256()
+            with open(full, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            print(json.dumps([child, 'f', st.st_size, mode, digest.hexdigest()]))
+walk('')
+'''
+
+# Поля, которые сравниваются по умолчанию: права доступа после распаковки зависят от umask,
+# поэтому mode сравнивается только по явному запросу
+DEFAULT_FIELDS = ('kind', 'size', 'sha256')
+
+
+def stream_manifest(executor, root):
+    """
+    Генератор манифеста дерева на проверяемой машине: элементы TreeEntry читаются по мере вывода.
+
+    Параметры:
+    executor (Executor): Исполнитель команд на проверяемой машине.
+    root (str): Корневой каталог дерева.
+    """
+    stream = executor.stream('python3 -c {} {}'.format(shlex.quote(_MANIFEST_SCRIPT), shlex.quote(root)),
+                             label='tree manifest {}'.format(root))
+    errors = []
+    with stream:
+        for line in stream:
+            if line.startswith('['):
+                yield TreeEntry(*json.loads(line))
+            else:
+                errors.append(line)
+    if stream.exit_code != 0:
+        raise RuntimeError('не удалось построить манифест {}: {}'.format(root, ''.join(errors[-5:]).strip()))
+
+
+def _key(entry):
+    return tuple(entry.path.split('/'))
+
+
+def diff_trees(source, target, fields=DEFAULT_FIELDS):
+    """
+    Сравнивает два манифеста слиянием: оба должны быть упорядочены так, как их выводит stream_manifest.
+
+    Параметры:
+    source (iterable): Манифест исходного дерева (TreeEntry).
+    target (iterable): Манифест проверяемого дерева (TreeEntry).
+    fields (tuple): Сравниваемые поля TreeEntry.
+
+    Возвращает:
+    TreeDiff: Отсутствующие, лишние и отличающиеся элементы.
+    """
+    missing, extra, changed = [], [], []
+    source, target = iter(source), iter(target)
+    left, right = next(source, None), next(target, None)
+    while left is not None or right is not None:
+        if right is None or (left is not None and _key(left) < _key(right)):
+            missing.append(left.path)
+            left = next(source, None)
+        elif left is None or _key(right) < _key(left):
+            extra.append(right.path)
+            right = next(target, None)
+        else:
+            for field in fields:
+                if getattr(left, field) != getattr(right, field):
+                    changed.append((left.path, field, (getattr(left, field), getattr(right, field))))
+            left, right = next(source, None), next(target, None)
+    return TreeDiff(missing, extra, changed)
+
+
+def diff_remote(executor, source, target, fields=DEFAULT_FIELDS):
+    """
+    Сравнивает два дерева на проверяемой машине. Манифесты строятся одним удаленным вызовом на дерево,
+    оба читаются параллельно и сравниваются по мере поступления.
+
+    Возвращает:
+    TreeDiff: Отсутствующие, лишние и отличающиеся элементы.
+    """
+    return diff_trees(stream_manifest(executor, source), stream_manifest(executor, target), fields)
+
+
+def format_diff(diff, limit=10):
+    """
+    Возвращает краткое текстовое описание расхождений (не больше limit элементов каждого вида).
+    """
+    parts = []
+    if diff.missing:
+        parts.append('нет: {}'.format(', '.join(diff.missing[:limit])))
+    if diff.extra:
+        parts.append('лишние: {}'.format(', '.join(diff.extra[:limit])))
+    if diff.changed:
+        parts.append('отличаются: {}'.format(', '.join('{} ({})'.format(path, field)
+                                                       for path, field, _ in diff.changed[:limit])))
+    return '; '.join(parts)
@@ -1,10 +1,15 @@
-import subprocess
+from executors import LocalExecutor
+
+# Локальные проверки выполняются тем же исполнителем, что и при backend: local
+_local = LocalExecutor()
+
+# Как и subprocess.run(stdout=PIPE): текст ищется и вывод возвращается только из stdout
+_STDOUT = ('out',)
+
+
 def checkout(cmd, text):
-    result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, encoding='utf-8')
-    if text in result.stdout and result.returncode == 0:
-        return True
-    else:
-        return False
-
-def getout(cmd):
-    return subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, encoding='utf-8').stdout
\ No newline at end of file
+    return _local.check(cmd, text, streams=_STDOUT)
+
+def getout(cmd, stderr=False):
+    # stderr=True - вывод stdout, затем stderr
+    return _local.getout(cmd, streams=('out', 'err') if stderr else _STDOUT)